@@ -0,0 +1,14 @@
+from django.contrib import admin
+
+from analytics.models import EngagementRollup, RollupCheckpoint
+
+
+@admin.register(EngagementRollup)
+class EngagementRollupAdmin(admin.ModelAdmin):
+    list_display = ("metric", "granularity", "bucket", "author", "count")
+    list_filter = ("metric", "granularity")
+
+
+@admin.register(RollupCheckpoint)
+class RollupCheckpointAdmin(admin.ModelAdmin):
+    list_display = ("source", "last_id", "updated")
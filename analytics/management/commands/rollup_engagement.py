@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand
+
+from analytics.rollups import DEFAULT_BATCH_SIZE, run_rollups
+from motion.nplusone import detect_n_plus_one
+
+
+class Command(BaseCommand):
+    help = "Incrementally update the hourly/daily engagement rollup tables"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE)
+
+    @detect_n_plus_one("rollup_engagement")
+    def handle(self, *args, **options):
+        def progress(metric, processed):
+            self.stdout.write(f"{metric}: {processed} events rolled up")
+
+        totals = run_rollups(options["batch_size"], progress=progress)
+        self.stdout.write(
+            self.style.SUCCESS(
+                ", ".join(f"{metric}: {count}" for metric, count in totals.items())
+            )
+        )
@@ -0,0 +1,40 @@
+# Generated by Django 6.0 on 2026-10-19 22:40
+
+from django.db import migrations
+from django.db.models import Max
+
+# Like and follow rollups now read the change log instead of their tables
+SOURCES = {"likes": ("post", "Like"), "follows": ("follow", "Follow")}
+
+
+def _move_checkpoints(apps, model_for):
+    """Point each checkpoint at the last row of its new source written before it ran."""
+    RollupCheckpoint = apps.get_model("analytics", "RollupCheckpoint")
+    checkpoints = RollupCheckpoint.objects.filter(source__in=SOURCES, last_id__gt=0)
+    for checkpoint in checkpoints:
+        model = model_for(checkpoint.source)
+        last_id = model.objects.filter(created__lte=checkpoint.updated).aggregate(
+            last_id=Max("id")
+        )["last_id"]
+        RollupCheckpoint.objects.filter(pk=checkpoint.pk).update(last_id=last_id or 0)
+
+
+def to_change_log(apps, schema_editor):
+    _move_checkpoints(apps, lambda source: apps.get_model("post", "ChangeEvent"))
+
+
+def to_tables(apps, schema_editor):
+    _move_checkpoints(apps, lambda source: apps.get_model(*SOURCES[source]))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("analytics", "0001_initial"),
+        ("follow", "0001_initial"),
+        ("post", "0006_changeevent"),
+    ]
+
+    operations = [
+        migrations.RunPython(to_change_log, to_tables),
+    ]
@@ -0,0 +1,57 @@
+from django.db import models
+from django.db.models import Q
+
+from user.models import User
+
+
+class EngagementRollup(models.Model):
+    """
+    Pre-aggregated event counts per time bucket, per author and globally
+    (author is NULL). Maintained by analytics.rollups.run_rollups().
+    """
+
+    HOUR = "hour"
+    DAY = "day"
+    GRANULARITIES = [(HOUR, "Hour"), (DAY, "Day")]
+
+    POSTS = "posts"
+    LIKES = "likes"
+    FOLLOWS = "follows"
+    METRICS = [(POSTS, "Posts created"), (LIKES, "Likes received"), (FOLLOWS, "New followers")]
+
+    metric = models.CharField(max_length=10, choices=METRICS)
+    granularity = models.CharField(max_length=5, choices=GRANULARITIES)
+    bucket = models.DateTimeField()
+    author = models.ForeignKey(
+        User, null=True, blank=True, on_delete=models.CASCADE, related_name="+"
+    )
+    count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["metric", "granularity", "author", "bucket"],
+                condition=Q(author__isnull=False),
+                name="unique_author_rollup_bucket",
+            ),
+            models.UniqueConstraint(
+                fields=["metric", "granularity", "bucket"],
+                condition=Q(author__isnull=True),
+                name="unique_global_rollup_bucket",
+            ),
+        ]
+
+    def __str__(self):
+        scope = self.author_id or "all"
+        return f"{self.metric}/{self.granularity} {self.bucket:%Y-%m-%d %H:00} [{scope}]: {self.count}"
+
+
+class RollupCheckpoint(models.Model):
+    """High-water mark (last processed id) of one rollup source table."""
+
+    source = models.CharField(max_length=20, primary_key=True)
+    last_id = models.BigIntegerField(default=0)
+    updated = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.source} up to #{self.last_id}"
@@ -0,0 +1,160 @@
+"""
+Incremental engagement rollups.
+
+Each source is read in id order from its high-water mark
+(RollupCheckpoint.last_id). Every batch is aggregated into hourly and daily
+buckets (UTC), per author and globally, and added to EngagementRollup in the same
+transaction that advances the checkpoint, so a batch is counted exactly once
+no matter when the job is interrupted.
+
+Posts are read from the post table, where deleted posts stay as tombstones
+until they are purged. Likes and follows are read from the change log
+(post/changes.py), which keeps a ``like_added`` or ``follow_added`` event
+after the like or follow is undone, so those are counted too.
+
+Ids are handed out when rows are inserted, not when they commit, so a row
+could commit behind a checkpoint that already passed it. A batch therefore
+stops at the first row younger than ROLLUP_SETTLE_SECONDS, and later rows
+wait for the next run.
+
+Rollups count events as they happen: unlikes, unfollows and deleted posts do
+not decrement them. The change log outlives the accounts it refers to, so
+the events of an author purged (motion/purge.py) before they were rolled up
+only count in the global buckets.
+"""
+
+from collections import Counter
+from datetime import UTC, timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from analytics.models import EngagementRollup, RollupCheckpoint
+from motion import nplusone
+from post.models import ChangeEvent, Post
+from user.models import User
+
+DEFAULT_BATCH_SIZE = 5000
+
+
+def truncate(moment, granularity):
+    """Start of the UTC hour or day containing ``moment``."""
+    moment = moment.astimezone(UTC)
+    moment = moment.replace(minute=0, second=0, microsecond=0)
+    if granularity == EngagementRollup.DAY:
+        moment = moment.replace(hour=0)
+    return moment
+
+
+def _post_events(last_id, limit):
+    """(id, happened_at, author_id) of posts created after ``last_id``."""
+    return list(
+        Post._base_manager.filter(id__gt=last_id)
+        .order_by("id")
+        .values_list("id", "created", "user__user_id")[:limit]
+    )
+
+
+def _like_events(last_id, limit):
+    """Likes are credited to the author of the liked post."""
+    return list(
+        ChangeEvent.objects.filter(id__gt=last_id, kind=ChangeEvent.LIKE_ADDED)
+        .order_by("id")
+        .values_list("id", "created", "subject")[:limit]
+    )
+
+
+def _follow_events(last_id, limit):
+    """New followers are credited to the followed user."""
+    return list(
+        ChangeEvent.objects.filter(id__gt=last_id, kind=ChangeEvent.FOLLOW_ADDED)
+        .order_by("id")
+        .values_list("id", "created", "subject")[:limit]
+    )
+
+
+SOURCES = {
+    EngagementRollup.POSTS: _post_events,
+    EngagementRollup.LIKES: _like_events,
+    EngagementRollup.FOLLOWS: _follow_events,
+}
+
+
+def _settled(events):
+    """The events up to the first one younger than ROLLUP_SETTLE_SECONDS."""
+    cutoff = timezone.now() - timedelta(seconds=settings.ROLLUP_SETTLE_SECONDS)
+    for index, (_, happened_at, _) in enumerate(events):
+        if happened_at > cutoff:
+            return events[:index]
+    return events
+
+
+def _apply(metric, counts):
+    """Add ``{(granularity, bucket, author_id): n}`` to the stored rollups."""
+    buckets = {bucket for _, bucket, _ in counts}
+    existing = {
+        (row.granularity, row.bucket, row.author_id): row
+        for row in EngagementRollup.objects.filter(metric=metric, bucket__in=buckets)
+    }
+    to_update, to_create = [], []
+    for (granularity, bucket, author_id), count in counts.items():
+        row = existing.get((granularity, bucket, author_id))
+        if row is None:
+            to_create.append(
+                EngagementRollup(
+                    metric=metric,
+                    granularity=granularity,
+                    bucket=bucket,
+                    author_id=author_id,
+                    count=count,
+                )
+            )
+        else:
+            row.count += count
+            to_update.append(row)
+    EngagementRollup.objects.bulk_update(to_update, ["count"])
+    EngagementRollup.objects.bulk_create(to_create)
+
+
+def roll_up_batch(metric, batch_size=DEFAULT_BATCH_SIZE):
+    """Process one batch of ``metric``'s source; returns the number of events."""
+    with transaction.atomic():
+        # Row lock: concurrent runs of the job serialize per source
+        checkpoint, _ = RollupCheckpoint.objects.select_for_update().get_or_create(
+            source=metric
+        )
+        events = _settled(SOURCES[metric](checkpoint.last_id, batch_size))
+        if not events:
+            return 0
+
+        authors = set(
+            User.all_objects.filter(
+                pk__in={author_id for _, _, author_id in events}
+            ).values_list("pk", flat=True)
+        )
+        counts = Counter()
+        for _, happened_at, author_id in events:
+            for granularity, _ in EngagementRollup.GRANULARITIES:
+                bucket = truncate(happened_at, granularity)
+                if author_id in authors:
+                    counts[(granularity, bucket, author_id)] += 1
+                counts[(granularity, bucket, None)] += 1
+        _apply(metric, counts)
+
+        checkpoint.last_id = events[-1][0]
+        checkpoint.save(update_fields=["last_id", "updated"])
+    return len(events)
+
+
+def run_rollups(batch_size=DEFAULT_BATCH_SIZE, progress=None):
+    """Bring every rollup up to date; returns ``{metric: events processed}``."""
+    totals = {}
+    for metric in SOURCES:
+        totals[metric] = 0
+        while processed := roll_up_batch(metric, batch_size):
+            nplusone.checkpoint()
+            totals[metric] += processed
+            if progress is not None:
+                progress(metric, totals[metric])
+    return totals
@@ -0,0 +1,69 @@
+from django.test import TestCase, override_settings
+from rest_framework.test import APIClient
+
+from analytics.models import EngagementRollup, RollupCheckpoint
+from analytics.rollups import run_rollups
+from motion.purge import purge, request_deletion
+from post.models import Post
+from user.models import User
+
+
+class RollupTests(TestCase):
+    def setUp(self):
+        self.author = User.objects.create_user(
+            username="author", email="author@example.com", password="x"
+        )
+        self.post = Post.objects.create(user=self.author.profile, content="hi")
+        fan = User.objects.create_user(
+            username="fan", email="fan@example.com", password="x"
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(fan)
+
+    def toggle_like(self):
+        self.client.post(f"/backend/api/posts/toggle-like/{self.post.pk}/")
+
+    def likes(self):
+        return sum(
+            EngagementRollup.objects.filter(
+                metric=EngagementRollup.LIKES,
+                granularity=EngagementRollup.DAY,
+                author=self.author,
+            ).values_list("count", flat=True)
+        )
+
+    @override_settings(ROLLUP_SETTLE_SECONDS=0)
+    def test_undone_like_is_counted(self):
+        self.toggle_like()
+        self.toggle_like()
+        run_rollups()
+        self.assertEqual(self.likes(), 1)
+
+    def test_recent_events_wait_for_the_next_run(self):
+        self.toggle_like()
+        self.assertEqual(run_rollups()[EngagementRollup.LIKES], 0)
+        self.assertFalse(
+            RollupCheckpoint.objects.filter(
+                source=EngagementRollup.LIKES, last_id__gt=0
+            ).exists()
+        )
+        with override_settings(ROLLUP_SETTLE_SECONDS=0):
+            self.assertEqual(run_rollups()[EngagementRollup.LIKES], 1)
+
+    @override_settings(ROLLUP_SETTLE_SECONDS=0)
+    def test_events_of_a_purged_author_count_globally(self):
+        self.toggle_like()
+        self.client.post(f"/backend/api/followers/toggle-follow/{self.author.pk}/")
+        purge(request_deletion(self.author))
+        totals = run_rollups()
+        self.assertEqual(totals[EngagementRollup.LIKES], 1)
+        self.assertEqual(totals[EngagementRollup.FOLLOWS], 1)
+        global_follows = EngagementRollup.objects.get(
+            metric=EngagementRollup.FOLLOWS,
+            granularity=EngagementRollup.DAY,
+            author__isnull=True,
+        )
+        self.assertEqual(global_follows.count, 1)
+        self.assertFalse(
+            EngagementRollup.objects.filter(author_id=self.author.pk).exists()
+        )
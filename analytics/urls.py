@@ -0,0 +1,7 @@
+from django.urls import path
+
+from analytics.views import EngagementSeriesAPIView
+
+urlpatterns = [
+    path("<str:metric>/", EngagementSeriesAPIView.as_view()),
+]
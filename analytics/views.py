@@ -0,0 +1,111 @@
+from datetime import datetime, time, timedelta
+
+from django.http import Http404
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+from rest_framework.exceptions import ValidationError
+from rest_framework.permissions import IsAuthenticated
+from rest_framework.views import APIView, Response
+
+from analytics.models import EngagementRollup
+from analytics.rollups import truncate
+
+WEEK = "week"
+STEPS = {
+    EngagementRollup.HOUR: timedelta(hours=1),
+    EngagementRollup.DAY: timedelta(days=1),
+    WEEK: timedelta(weeks=1),
+}
+DEFAULT_RANGES = {
+    EngagementRollup.HOUR: timedelta(days=2),
+    EngagementRollup.DAY: timedelta(days=30),
+    WEEK: timedelta(weeks=12),
+}
+MAX_POINTS = 1000
+
+
+def _parse_moment(value, name):
+    moment = parse_datetime(value)
+    if moment is None:
+        day = parse_date(value)
+        if day is None:
+            raise ValidationError({name: "Expected an ISO 8601 date or datetime."})
+        moment = datetime.combine(day, time.min)
+    if timezone.is_naive(moment):
+        moment = timezone.make_aware(moment)
+    return moment
+
+
+def _week_start(moment):
+    day = truncate(moment, EngagementRollup.DAY)
+    return day - timedelta(days=day.weekday())
+
+
+class EngagementSeriesAPIView(APIView):
+    """
+    GET: Counts of a metric (posts, likes, follows) per bucket, zero-filled.
+    ?granularity=hour|day|week (default day), ?author=<user id> (default: all
+    users), ?since= / ?until= as ISO dates or datetimes.
+    """
+
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request, metric):
+        if metric not in dict(EngagementRollup.METRICS):
+            raise Http404
+        params = request.query_params
+        granularity = params.get("granularity", EngagementRollup.DAY)
+        if granularity not in STEPS:
+            raise ValidationError({"granularity": f"One of {', '.join(STEPS)}."})
+        author = params.get("author")
+        if author is not None and not author.isdigit():
+            raise ValidationError({"author": "Expected a user id."})
+
+        until = (
+            _parse_moment(params["until"], "until")
+            if "until" in params
+            else timezone.now()
+        )
+        since = (
+            _parse_moment(params["since"], "since")
+            if "since" in params
+            else until - DEFAULT_RANGES[granularity]
+        )
+        step = STEPS[granularity]
+        if since > until:
+            raise ValidationError({"since": "Must not be after until."})
+        if (until - since) / step > MAX_POINTS:
+            raise ValidationError(
+                {"since": f"At most {MAX_POINTS} {granularity} buckets per request."}
+            )
+
+        # Weeks are summed from the daily rollup
+        stored = EngagementRollup.DAY if granularity == WEEK else granularity
+        align = _week_start if granularity == WEEK else (lambda m: truncate(m, stored))
+        start = align(since)
+        rows = EngagementRollup.objects.filter(
+            metric=metric,
+            granularity=stored,
+            author_id=author,
+            bucket__gte=start,
+            bucket__lte=until,
+        ).values_list("bucket", "count")
+
+        counts = {}
+        for bucket, count in rows:
+            key = align(bucket)
+            counts[key] = counts.get(key, 0) + count
+
+        results = []
+        bucket = start
+        while bucket <= until:
+            results.append({"bucket": bucket, "count": counts.get(bucket, 0)})
+            bucket += step
+        return Response(
+            {
+                "metric": metric,
+                "granularity": granularity,
+                "author": int(author) if author else None,
+                "results": results,
+            }
+        )
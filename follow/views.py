@@ -1,27 +1,35 @@
+from django.db import transaction
 from rest_framework.generics import ListAPIView
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.views import APIView, Response
 
 from follow.models import Follow
+from motion import pubsub, sse
+from notification import inbox
+from notification.models import Notification
+from post import changes
+from post.models import ChangeEvent
 from user.models import User
 from user.serializers import UserSerializer
+from user.views import UserListingMixin
+from user_profile import counters
 
 
 # Create your views here.
-class FollowersListAPIView(ListAPIView):
+class FollowersListAPIView(UserListingMixin, ListAPIView):
     serializer_class = UserSerializer
     permission_classes = [IsAuthenticated]
 
     def get_queryset(self):
-        return [f.follower for f in self.request.user.followers.all()]
+        return User.objects.filter(following__following=self.request.user)
 
 
-class FollowingListAPIView(ListAPIView):
+class FollowingListAPIView(UserListingMixin, ListAPIView):
     serializer_class = UserSerializer
     permission_classes = [IsAuthenticated]
 
     def get_queryset(self):
-        return [f.following for f in self.request.user.following.all()]
+        return User.objects.filter(followers__follower=self.request.user)
 
 
 class ToggleFollowAPIView(APIView):
@@ -31,12 +39,33 @@ class ToggleFollowAPIView(APIView):
         follower = request.user
         following = User.objects.get(id=user_id)
 
-        relation, created = Follow.objects.get_or_create(
-            follower=follower, following=following
-        )
+        with transaction.atomic():
+            # The follower's open event stream picks up the new followees
+            transaction.on_commit(
+                lambda: pubsub.publish(
+                    sse.viewer_channel(follower.pk), {"event": "follows"}
+                )
+            )
+            relation, created = Follow.objects.get_or_create(
+                follower=follower, following=following
+            )
 
-        if not created:
-            relation.delete()
-            return Response({"status": "unfollowed"})
+            if not created:
+                # Only count the unfollow that actually removed the row
+                deleted, _ = Follow.objects.filter(pk=relation.pk).delete()
+                if deleted:
+                    counters.record_follow(follower.pk, following.pk, -1)
+                    changes.record(
+                        ChangeEvent.FOLLOW_REMOVED, following.pk, follower.pk
+                    )
+                    inbox.withdraw(
+                        following.pk, Notification.FOLLOW, follower.pk, relation.created
+                    )
+                return Response({"status": "unfollowed"})
 
-        return Response({"status": "followed"})
+            counters.record_follow(follower.pk, following.pk, 1)
+            changes.record(ChangeEvent.FOLLOW_ADDED, following.pk, follower.pk)
+            inbox.notify(
+                following.pk, Notification.FOLLOW, follower.pk, relation.created
+            )
+            return Response({"status": "followed"})
@@ -0,0 +1,26 @@
+# Gunicorn picks this file up automatically from the working directory,
+# so the command-line flags in Dockerfile / docker-compose / Procfile still apply.
+import os
+import shutil
+
+# Threaded (gthread) workers: a request waiting on the password hashing pool
+# (motion/hashing.py) no longer blocks the whole worker.
+threads = int(os.environ.get("GUNICORN_THREADS", "4"))
+
+# prometheus_client reads this when it is first imported in a worker, so it has
+# to be in the environment before the master forks.
+prometheus_multiproc_dir = os.environ.setdefault(
+    "PROMETHEUS_MULTIPROC_DIR", "/tmp/motion-metrics"
+)
+
+
+def on_starting(server):
+    # Samples from a previous run would otherwise be merged into the new ones
+    shutil.rmtree(prometheus_multiproc_dir, ignore_errors=True)
+    os.makedirs(prometheus_multiproc_dir, exist_ok=True)
+
+
+def child_exit(server, worker):
+    from prometheus_client import multiprocess
+
+    multiprocess.mark_process_dead(worker.pid)
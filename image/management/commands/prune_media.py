@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+
+from image.storage import prune_orphans
+from motion.nplusone import detect_n_plus_one
+
+
+class Command(BaseCommand):
+    help = (
+        "Delete uploaded files no ImageBlob refers to, older than "
+        "IMAGE_ORPHAN_GRACE_SECONDS"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=1000)
+
+    @detect_n_plus_one("prune_media")
+    def handle(self, *args, **options):
+        deleted = prune_orphans(options["batch_size"])
+        self.stdout.write(self.style.SUCCESS(f"Deleted {deleted} orphaned file(s)"))
@@ -3,10 +3,44 @@ from django.db import models
 from post.models import Post
 
 
+class ImageBlob(models.Model):
+    """
+    An uploaded image file, stored once per distinct content (keyed by its
+    SHA-256), with resized variants generated in the background.
+    """
+
+    PENDING = "pending"
+    READY = "ready"
+    FAILED = "failed"
+    STATUSES = [(PENDING, "Pending"), (READY, "Ready"), (FAILED, "Failed")]
+
+    sha256 = models.CharField(max_length=64, unique=True)
+    original = models.FileField()
+    content_type = models.CharField(max_length=50)
+    size = models.PositiveBigIntegerField()
+    width = models.PositiveIntegerField()
+    height = models.PositiveIntegerField()
+    # {"thumbnail": {"name": ..., "width": ..., "height": ...}, ...}
+    variants = models.JSONField(default=dict, blank=True)
+    status = models.CharField(max_length=10, choices=STATUSES, default=PENDING)
+    created = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"{self.sha256[:12]} ({self.width}x{self.height})"
+
+
 # Create your models here.
 class Image(models.Model):
     post = models.ForeignKey(Post, on_delete=models.CASCADE, related_name="images")
-    image = models.URLField()
+    # External image URL, or empty for uploaded images (see blob)
+    image = models.URLField(blank=True)
+    blob = models.ForeignKey(
+        ImageBlob,
+        null=True,
+        blank=True,
+        on_delete=models.PROTECT,
+        related_name="images",
+    )
 
     def __str__(self):
         return f"Image for Post {self.post.id}"
@@ -0,0 +1,67 @@
+"""
+Resized variants of uploaded images, rendered on a process pool.
+
+Decoding and resampling are CPU bound and hold the GIL, so the job that
+generates variants hands the work to IMAGE_PROCESSING_WORKERS processes and
+only waits for the result. ``render_variants`` runs in those processes and
+touches nothing but the file system.
+"""
+
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+import PIL.Image
+import PIL.ImageOps
+from django.conf import settings
+
+VARIANT_FORMAT = "WEBP"
+VARIANT_EXTENSION = "webp"
+
+
+def render_variants(source, media_root, sha256, sizes, quality):
+    """
+    Write one WebP per ``{name: max_side}`` in ``sizes`` next to the other
+    variants of ``sha256``; returns ``{name: {"name", "width", "height"}}``.
+    Variants are never upscaled.
+    """
+    variants = {}
+    with PIL.Image.open(source) as img:
+        img = PIL.ImageOps.exif_transpose(img)
+        if img.mode not in ("RGB", "RGBA"):
+            img = img.convert("RGBA" if "transparency" in img.info else "RGB")
+        for variant, max_side in sorted(sizes.items(), key=lambda item: -item[1]):
+            resized = img.copy()
+            resized.thumbnail((max_side, max_side), PIL.Image.Resampling.LANCZOS)
+            name = (
+                f"variants/{sha256[:2]}/{sha256[2:4]}/"
+                f"{sha256}-{max_side}.{VARIANT_EXTENSION}"
+            )
+            path = Path(media_root) / name
+            path.parent.mkdir(parents=True, exist_ok=True)
+            resized.save(path, VARIANT_FORMAT, quality=quality, method=4)
+            variants[variant] = {
+                "name": name,
+                "width": resized.width,
+                "height": resized.height,
+            }
+    return variants
+
+
+_pool = None
+_pool_pid = None
+_pool_lock = threading.Lock()
+
+
+def get_pool():
+    """The process pool of the current process (re-created after a fork)."""
+    global _pool, _pool_pid
+    if _pool is None or _pool_pid != os.getpid():
+        with _pool_lock:
+            if _pool is None or _pool_pid != os.getpid():
+                _pool = ProcessPoolExecutor(
+                    max_workers=settings.IMAGE_PROCESSING_WORKERS
+                )
+                _pool_pid = os.getpid()
+    return _pool
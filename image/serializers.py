@@ -1,9 +1,38 @@
-from rest_framework.serializers import ModelSerializer
+from rest_framework.serializers import ModelSerializer, SerializerMethodField
 
-from image.models import Image
+from image.models import Image, ImageBlob
 
 
 class ImageSerializer(ModelSerializer):
+    variants = SerializerMethodField()
+    # See motion/sparse.py
+    sparse_requires = {"image": ["blob"], "variants": ["blob"]}
+
     class Meta:
         model = Image
-        fields = ["id", "image"]
+        fields = ["id", "image", "variants"]
+
+    def _absolute(self, url):
+        request = self.context.get("request")
+        return request.build_absolute_uri(url) if request is not None else url
+
+    def to_representation(self, instance):
+        data = super().to_representation(instance)
+        if "image" in data and instance.blob is not None:
+            data["image"] = self._absolute(instance.blob.original.url)
+        return data
+
+    def get_variants(self, obj) -> dict:
+        """Resized copies by name (e.g. thumbnail), once they have been generated"""
+        blob = obj.blob
+        if blob is None or blob.status != ImageBlob.READY:
+            return {}
+        storage = blob.original.storage
+        return {
+            name: {
+                "url": self._absolute(storage.url(variant["name"])),
+                "width": variant["width"],
+                "height": variant["height"],
+            }
+            for name, variant in blob.variants.items()
+        }
@@ -0,0 +1,180 @@
+"""
+Content-addressed storage of uploaded images under MEDIA_ROOT.
+
+Uploads are copied to the media store chunk by chunk while being hashed, so
+memory use does not depend on the file size. The file is then moved to
+``images/<aa>/<bb>/<sha256>.<ext>``: identical uploads end up as one file and
+one ``ImageBlob``, and only the first one queues variant generation.
+
+A file is moved into place before its ImageBlob row commits, so an upload
+whose request fails leaves a file no row refers to, and an interrupted one
+leaves a file in ``tmp/``. ``manage.py prune_media`` deletes those once they
+are older than IMAGE_ORPHAN_GRACE_SECONDS.
+"""
+
+import hashlib
+import os
+import tempfile
+import time
+from itertools import islice
+from pathlib import Path
+
+import PIL.Image
+from django.conf import settings
+from django.db import transaction
+from rest_framework.exceptions import ValidationError
+
+from image.models import ImageBlob
+from jobs.queue import enqueue
+from motion import nplusone
+
+# Pillow format name -> (file extension, content type)
+FORMATS = {
+    "JPEG": ("jpg", "image/jpeg"),
+    "PNG": ("png", "image/png"),
+    "GIF": ("gif", "image/gif"),
+    "WEBP": ("webp", "image/webp"),
+}
+
+
+def media_path(name):
+    return Path(settings.MEDIA_ROOT) / name
+
+
+def _write_chunks(uploaded_file, directory):
+    """Copy the upload into ``directory``; returns (path, sha256, size)."""
+    digest = hashlib.sha256()
+    size = 0
+    with tempfile.NamedTemporaryFile(dir=directory, delete=False) as out:
+        try:
+            for chunk in uploaded_file.chunks(settings.IMAGE_UPLOAD_CHUNK_SIZE):
+                size += len(chunk)
+                if size > settings.IMAGE_UPLOAD_MAX_BYTES:
+                    raise ValidationError(
+                        "Images may be at most "
+                        f"{settings.IMAGE_UPLOAD_MAX_BYTES} bytes."
+                    )
+                digest.update(chunk)
+                out.write(chunk)
+        except BaseException:
+            out.close()
+            os.unlink(out.name)
+            raise
+    return Path(out.name), digest.hexdigest(), size
+
+
+def _too_large():
+    return ValidationError(
+        f"Images may have at most {PIL.Image.MAX_IMAGE_PIXELS} pixels."
+    )
+
+
+def _identify(path):
+    """
+    Format and dimensions from the image header (no full decode), or
+    (None, 0, 0) if it is not a valid image. Images with more pixels than
+    Pillow's MAX_IMAGE_PIXELS, too large to decode for the variants, are
+    rejected.
+    """
+    try:
+        with PIL.Image.open(path) as img:
+            img.verify()
+            image_format, width, height = img.format, img.width, img.height
+    except PIL.Image.DecompressionBombError:
+        raise _too_large()
+    except (PIL.UnidentifiedImageError, OSError, SyntaxError, ValueError):
+        # Pillow reports some corrupt files as SyntaxError or ValueError
+        return None, 0, 0
+    if width * height > PIL.Image.MAX_IMAGE_PIXELS:
+        raise _too_large()
+    return image_format, width, height
+
+
+def store_upload(uploaded_file):
+    """Store an uploaded image file and return its (possibly existing) ImageBlob."""
+    tmp_dir = media_path("tmp")
+    tmp_dir.mkdir(parents=True, exist_ok=True)
+    tmp_path, sha256, size = _write_chunks(uploaded_file, tmp_dir)
+
+    existing = ImageBlob.objects.filter(sha256=sha256).first()
+    if existing is not None:
+        tmp_path.unlink()
+        return existing
+
+    try:
+        image_format, width, height = _identify(tmp_path)
+    except ValidationError:
+        tmp_path.unlink()
+        raise
+    if image_format not in FORMATS:
+        tmp_path.unlink()
+        raise ValidationError(
+            f"Unsupported image; upload one of {', '.join(sorted(FORMATS))}."
+        )
+    extension, content_type = FORMATS[image_format]
+    name = f"images/{sha256[:2]}/{sha256[2:4]}/{sha256}.{extension}"
+    final_path = media_path(name)
+    final_path.parent.mkdir(parents=True, exist_ok=True)
+    # Atomic; a concurrent identical upload would write the same bytes
+    os.replace(tmp_path, final_path)
+
+    with transaction.atomic():
+        blob, created = ImageBlob.objects.get_or_create(
+            sha256=sha256,
+            defaults={
+                "original": name,
+                "content_type": content_type,
+                "size": size,
+                "width": width,
+                "height": height,
+            },
+        )
+        if created:
+            enqueue(
+                "image.tasks.generate_variants",
+                {"blob_id": blob.pk},
+                queue="images",
+                idempotency_key=f"image-variants:{sha256}",
+            )
+    return blob
+
+
+def _delete_orphans(directory, paths, cutoff):
+    """Delete the files among ``paths`` no ImageBlob refers to; returns how many."""
+    if directory != "tmp":
+        known = set(
+            ImageBlob.objects.filter(
+                sha256__in=[path.name[:64] for path in paths]
+            ).values_list("sha256", flat=True)
+        )
+        paths = [path for path in paths if path.name[:64] not in known]
+    deleted = 0
+    for path in paths:
+        try:
+            # Not if an identical upload has just moved a new copy into place
+            if path.stat().st_mtime < cutoff:
+                path.unlink()
+                deleted += 1
+        except FileNotFoundError:
+            pass
+    return deleted
+
+
+def prune_orphans(batch_size=1000):
+    """
+    Delete the originals and variants that no ImageBlob refers to and the
+    temporary files of interrupted uploads, once they are older than
+    IMAGE_ORPHAN_GRACE_SECONDS; returns the number of files deleted.
+    """
+    cutoff = time.time() - settings.IMAGE_ORPHAN_GRACE_SECONDS
+    deleted = 0
+    for directory in ("tmp", "images", "variants"):
+        old = (
+            path
+            for path in media_path(directory).rglob("*")
+            if path.is_file() and path.stat().st_mtime < cutoff
+        )
+        while batch := list(islice(old, batch_size)):
+            deleted += _delete_orphans(directory, batch, cutoff)
+            nplusone.checkpoint()
+    return deleted
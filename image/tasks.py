@@ -0,0 +1,28 @@
+from django.conf import settings
+
+from image.models import ImageBlob
+from image.processing import get_pool, render_variants
+from image.storage import media_path
+from jobs.queue import task
+
+
+@task(queue="images", max_attempts=3)
+def generate_variants(blob_id):
+    """Render the IMAGE_VARIANTS of an uploaded image on the process pool."""
+    blob = ImageBlob.objects.get(pk=blob_id)
+    future = get_pool().submit(
+        render_variants,
+        str(media_path(blob.original.name)),
+        str(settings.MEDIA_ROOT),
+        blob.sha256,
+        settings.IMAGE_VARIANTS,
+        settings.IMAGE_VARIANT_QUALITY,
+    )
+    try:
+        blob.variants = future.result()
+    except Exception:
+        blob.status = ImageBlob.FAILED
+        blob.save(update_fields=["status"])
+        raise
+    blob.status = ImageBlob.READY
+    blob.save(update_fields=["variants", "status"])
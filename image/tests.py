@@ -1,3 +1,72 @@
-from django.test import TestCase
+import io
+import os
+import tempfile
+from pathlib import Path
+from unittest import mock
 
-# Create your tests here.
+import PIL.Image
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import TestCase, override_settings
+from rest_framework.test import APIClient
+
+from image.models import ImageBlob
+from image.storage import prune_orphans
+from user.models import User
+
+
+def png(size):
+    data = io.BytesIO()
+    PIL.Image.new("RGB", size).save(data, "PNG")
+    return data.getvalue()
+
+
+class ImageUploadTests(TestCase):
+    def setUp(self):
+        media = tempfile.TemporaryDirectory()
+        self.addCleanup(media.cleanup)
+        self.media_root = Path(media.name)
+        settings_override = override_settings(MEDIA_ROOT=media.name)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        user = User.objects.create_user(
+            username="poster", email="poster@example.com", password="x"
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(user)
+
+    def upload(self, data):
+        return self.client.post(
+            "/backend/api/posts/",
+            {"content": "pic", "uploads": SimpleUploadedFile("a.png", data)},
+            format="multipart",
+        )
+
+    def test_invalid_image_is_rejected(self):
+        self.assertEqual(self.upload(b"\x89PNG\r\n\x1a\nnot really").status_code, 400)
+
+    def test_decompression_bomb_is_rejected(self):
+        with mock.patch.object(PIL.Image, "MAX_IMAGE_PIXELS", 100):
+            # Over twice the limit Pillow refuses to open it, under it only warns
+            self.assertEqual(self.upload(png((20, 20))).status_code, 400)
+            self.assertEqual(self.upload(png((11, 11))).status_code, 400)
+        self.assertFalse(ImageBlob.objects.exists())
+        self.assertEqual(list((self.media_root / "tmp").iterdir()), [])
+
+    @override_settings(IMAGE_ORPHAN_GRACE_SECONDS=60)
+    def test_prune_deletes_old_unreferenced_files(self):
+        self.assertEqual(self.upload(png((4, 4))).status_code, 201)
+        blob = ImageBlob.objects.get()
+        kept = self.media_root / blob.original.name
+        orphan = kept.with_name("f" * 64 + ".png")
+        recent = kept.with_name("e" * 64 + ".png")
+        stale_tmp = self.media_root / "tmp" / "upload"
+        for path in (orphan, recent, stale_tmp):
+            path.write_bytes(b"x")
+        for path in (kept, orphan, stale_tmp):
+            os.utime(path, (0, 0))
+
+        self.assertEqual(prune_orphans(), 2)
+        self.assertTrue(kept.exists())
+        self.assertTrue(recent.exists())
+        self.assertFalse(orphan.exists())
+        self.assertFalse(stale_tmp.exists())
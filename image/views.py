@@ -1,3 +1,13 @@
-from django.shortcuts import render
+from django.conf import settings
+from django.views.static import serve
 
-# Create your views here.
+
+def serve_media(request, path):
+    """
+    Uploaded images and their variants. File names contain the content hash,
+    so a file never changes and clients may cache it forever. In production
+    the host nginx serves /media/ from disk and requests never get here.
+    """
+    response = serve(request, path, document_root=settings.MEDIA_ROOT)
+    response["Cache-Control"] = "public, max-age=31536000, immutable"
+    return response
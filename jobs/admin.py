@@ -0,0 +1,19 @@
+from django.contrib import admin
+from django.utils import timezone
+
+from jobs.models import Job
+
+
+@admin.register(Job)
+class JobAdmin(admin.ModelAdmin):
+    list_display = ("id", "name", "queue", "status", "attempts", "run_after", "created")
+    list_filter = ("queue", "status", "name")
+    search_fields = ("name", "idempotency_key")
+    readonly_fields = [field.name for field in Job._meta.fields]
+    actions = ["retry_now"]
+
+    @admin.action(description="Retry selected jobs now")
+    def retry_now(self, request, queryset):
+        queryset.exclude(status=Job.RUNNING).update(
+            status=Job.QUEUED, attempts=0, run_after=timezone.now(), finished=None
+        )
@@ -0,0 +1,14 @@
+from django.apps import AppConfig
+from django.utils.module_loading import autodiscover_modules
+
+
+class JobsConfig(AppConfig):
+    name = "jobs"
+
+    def ready(self):
+        from jobs.queue import QueueDepthCollector
+        from motion.metrics import register_scrape_collector
+
+        register_scrape_collector(QueueDepthCollector())
+        # Register the @task functions defined in every app's tasks.py
+        autodiscover_modules("tasks")
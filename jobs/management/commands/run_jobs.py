@@ -0,0 +1,75 @@
+import os
+import signal
+import socket
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from jobs import queue
+from motion import metrics
+
+# How often an idle worker deletes old finished jobs
+PRUNE_INTERVAL = 300
+
+
+class Command(BaseCommand):
+    help = "Run queued background jobs"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--queue",
+            action="append",
+            dest="queues",
+            help="Only run jobs of this queue (repeatable; default: all queues)",
+        )
+        parser.add_argument(
+            "--once", action="store_true", help="Exit when no job is due"
+        )
+        parser.add_argument("--max-jobs", type=int, default=0)
+        parser.add_argument("--sleep", type=float, default=None)
+        parser.add_argument(
+            "--metrics-port",
+            type=int,
+            default=None,
+            help="Serve Prometheus metrics on this port (default: JOB_METRICS_PORT)",
+        )
+
+    def handle(self, *args, **options):
+        worker = f"{socket.gethostname()}:{os.getpid()}"
+        sleep = options["sleep"] or settings.JOB_POLL_INTERVAL
+        self.stopping = False
+
+        def stop(signum, frame):
+            # Let the current job finish, then exit
+            self.stopping = True
+
+        signal.signal(signal.SIGTERM, stop)
+        signal.signal(signal.SIGINT, stop)
+
+        metrics_port = options["metrics_port"]
+        if metrics_port is None:
+            metrics_port = settings.JOB_METRICS_PORT
+        if metrics_port:
+            metrics.start_server(metrics_port)
+
+        processed = 0
+        last_prune = 0.0
+        while not self.stopping:
+            close_old_connections()
+            job = queue.claim(worker, options["queues"])
+            if job is not None:
+                outcome = queue.run(job)
+                processed += 1
+                self.stdout.write(f"{job.name} #{job.pk}: {outcome}")
+                if options["max_jobs"] and processed >= options["max_jobs"]:
+                    break
+                continue
+            if options["once"]:
+                break
+            if time.monotonic() - last_prune > PRUNE_INTERVAL:
+                queue.prune()
+                last_prune = time.monotonic()
+            time.sleep(sleep)
+        self.stdout.write(self.style.SUCCESS(f"Worker {worker} ran {processed} job(s)"))
@@ -0,0 +1,232 @@
+"""
+A small job queue stored in the application database.
+
+Tasks are plain functions registered with ``@task`` in an app's ``tasks.py``
+and enqueued with keyword arguments that must be JSON serializable::
+
+    @task(queue="maintenance", max_attempts=3)
+    def send_digest(user_id):
+        ...
+
+    send_digest.enqueue(user_id=user.pk, idempotency_key=f"digest:{user.pk}")
+
+Enqueueing inside a transaction is atomic with the rest of it: the job only
+becomes visible to workers if the transaction commits. ``python manage.py
+run_jobs`` claims due jobs one at a time, with ``SELECT ... FOR UPDATE SKIP
+LOCKED`` where the database supports it (PostgreSQL) and a conditional
+UPDATE otherwise (SQLite), so concurrent workers never run the same job.
+Failed jobs are retried with exponential backoff until ``max_attempts``; a
+job whose worker died is picked up again after JOB_LOCK_TIMEOUT seconds.
+"""
+
+import logging
+import random
+import traceback
+from datetime import timedelta
+from time import perf_counter
+
+from django.conf import settings
+from django.db import IntegrityError, connection, transaction
+from django.db.models import Count, F, Min, Q
+from django.utils import timezone
+from prometheus_client.core import GaugeMetricFamily
+
+from jobs.models import Job
+from motion import metrics
+from motion.instrumentation import untracked
+from motion.nplusone import detect_n_plus_one
+
+logger = logging.getLogger(__name__)
+
+_registry = {}
+
+
+class Task:
+    def __init__(self, func, name, queue, max_attempts):
+        self.func = func
+        self.name = name
+        self.queue = queue
+        self.max_attempts = max_attempts
+
+    def __call__(self, *args, **kwargs):
+        return self.func(*args, **kwargs)
+
+    def enqueue(self, *, idempotency_key=None, delay=None, **payload):
+        return enqueue(
+            self.name,
+            payload,
+            queue=self.queue,
+            idempotency_key=idempotency_key,
+            delay=delay,
+            max_attempts=self.max_attempts,
+        )
+
+
+def task(func=None, *, name=None, queue="default", max_attempts=None):
+    """Register ``func`` as a task (usable with or without arguments)."""
+
+    def register(func):
+        registered = Task(
+            func, name or f"{func.__module__}.{func.__name__}", queue, max_attempts
+        )
+        _registry[registered.name] = registered
+        return registered
+
+    return register(func) if func is not None else register
+
+
+def enqueue(
+    name,
+    payload=None,
+    *,
+    queue="default",
+    idempotency_key=None,
+    delay=None,
+    max_attempts=None,
+):
+    """
+    Store a job for task ``name``. With an ``idempotency_key`` that was
+    already used, the existing job is returned and nothing is enqueued.
+    """
+    fields = {
+        "name": name,
+        "queue": queue,
+        "payload": payload or {},
+        "max_attempts": max_attempts or settings.JOB_MAX_ATTEMPTS,
+        "run_after": timezone.now() + (delay or timedelta(0)),
+    }
+    if idempotency_key is None:
+        return Job.objects.create(**fields)
+    try:
+        with transaction.atomic():
+            return Job.objects.create(idempotency_key=idempotency_key, **fields)
+    except IntegrityError:
+        return Job.objects.get(idempotency_key=idempotency_key)
+
+
+def backoff(attempts):
+    """Delay before retry number ``attempts``: doubling, capped, with jitter."""
+    delay = min(
+        settings.JOB_RETRY_BACKOFF * 2 ** (attempts - 1),
+        settings.JOB_RETRY_BACKOFF_MAX,
+    )
+    return timedelta(seconds=delay * random.uniform(0.5, 1.0))
+
+
+def _claimable(queues, now):
+    due = Q(status=Job.QUEUED, run_after__lte=now)
+    abandoned = Q(
+        status=Job.RUNNING,
+        locked_at__lt=now - timedelta(seconds=settings.JOB_LOCK_TIMEOUT),
+    )
+    jobs = Job.objects.filter(due | abandoned)
+    if queues:
+        jobs = jobs.filter(queue__in=queues)
+    return jobs.order_by("run_after", "id")
+
+
+def claim(worker, queues=None):
+    """Lock the next due job for ``worker`` and return it, or None."""
+    now = timezone.now()
+    if connection.features.has_select_for_update_skip_locked:
+        with transaction.atomic():
+            job = _claimable(queues, now).select_for_update(skip_locked=True).first()
+            if job is None:
+                return None
+            job.status = Job.RUNNING
+            job.locked_at = now
+            job.locked_by = worker
+            job.attempts += 1
+            job.save(update_fields=["status", "locked_at", "locked_by", "attempts"])
+            return job
+
+    # No SKIP LOCKED (SQLite): writes are serialized, so the conditional
+    # UPDATE succeeds for exactly one of the workers racing for a job.
+    candidates = _claimable(queues, now)
+    for job_id in candidates.values_list("pk", flat=True)[:10]:
+        claimed = candidates.filter(pk=job_id).update(
+            status=Job.RUNNING,
+            locked_at=now,
+            locked_by=worker,
+            attempts=F("attempts") + 1,
+        )
+        if claimed:
+            return Job.objects.get(pk=job_id)
+    return None
+
+
+def run(job):
+    """Run a claimed job and record its outcome; returns the outcome."""
+    started = perf_counter()
+    try:
+        registered = _registry.get(job.name)
+        if registered is None:
+            raise LookupError(f"No task registered as {job.name!r}")
+        # Like a request, each job is checked for N+1 queries on its own
+        with detect_n_plus_one(f"job {job.name}"):
+            registered.func(**job.payload)
+    except Exception:  # noqa: BLE001 - any task error is recorded on the job
+        job.last_error = traceback.format_exc()
+        if job.attempts >= job.max_attempts:
+            outcome = Job.FAILED
+            job.status = Job.FAILED
+            job.finished = timezone.now()
+            logger.error("%s failed for good:\n%s", job, job.last_error)
+        else:
+            outcome = "retry"
+            job.status = Job.QUEUED
+            job.run_after = timezone.now() + backoff(job.attempts)
+            logger.warning("%s failed, retrying at %s", job, job.run_after)
+    else:
+        outcome = Job.DONE
+        job.status = Job.DONE
+        job.finished = timezone.now()
+    job.locked_at = None
+    job.save(
+        update_fields=["status", "run_after", "finished", "locked_at", "last_error"]
+    )
+    metrics.jobs_processed.labels(job.queue, job.name, outcome).inc()
+    metrics.job_duration.labels(job.queue, job.name).observe(perf_counter() - started)
+    return outcome
+
+
+def prune(older_than=None, batch_size=1000):
+    """Delete finished jobs older than JOB_RETENTION_DAYS; failed ones stay."""
+    cutoff = timezone.now() - (
+        older_than or timedelta(days=settings.JOB_RETENTION_DAYS)
+    )
+    ids = Job.objects.filter(status=Job.DONE, finished__lt=cutoff).values_list(
+        "pk", flat=True
+    )[:batch_size]
+    deleted, _ = Job.objects.filter(pk__in=list(ids)).delete()
+    return deleted
+
+
+class QueueDepthCollector:
+    """Queue depth and age of the oldest due job, read at scrape time."""
+
+    def collect(self):
+        depth = GaugeMetricFamily(
+            "motion_job_queue_depth",
+            "Jobs waiting or running, by queue and status.",
+            labels=["queue", "status"],
+        )
+        lag = GaugeMetricFamily(
+            "motion_job_queue_lag_seconds",
+            "How long the oldest due job of each queue has been waiting.",
+            labels=["queue"],
+        )
+        now = timezone.now()
+        with untracked():
+            rows = (
+                Job.objects.filter(status__in=[Job.QUEUED, Job.RUNNING])
+                .values("queue", "status")
+                .annotate(jobs=Count("*"), oldest=Min("run_after"))
+            )
+            for row in rows:
+                depth.add_metric([row["queue"], row["status"]], row["jobs"])
+                if row["status"] == Job.QUEUED:
+                    waiting = max((now - row["oldest"]).total_seconds(), 0)
+                    lag.add_metric([row["queue"]], waiting)
+        yield depth
+        yield lag
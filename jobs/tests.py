@@ -0,0 +1,141 @@
+from datetime import timedelta
+from io import StringIO
+from unittest import mock
+
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.utils import timezone
+
+from jobs import queue
+from jobs.models import Job
+from jobs.queue import task
+
+calls = []
+
+
+@task(name="jobs.tests.record", max_attempts=3)
+def record(value):
+    calls.append(value)
+
+
+@task(name="jobs.tests.fail", max_attempts=2)
+def fail():
+    raise RuntimeError("boom")
+
+
+class StaleCandidates:
+    """The candidate ids a worker listed before another worker claimed one."""
+
+    def __init__(self, candidates, ids):
+        self.candidates = candidates
+        self.ids = ids
+
+    def values_list(self, *args, **kwargs):
+        return self.ids
+
+    def filter(self, *args, **kwargs):
+        return self.candidates.filter(*args, **kwargs)
+
+
+@override_settings(JOB_RETRY_BACKOFF=10, JOB_RETRY_BACKOFF_MAX=60)
+class QueueTests(TestCase):
+    def setUp(self):
+        calls.clear()
+
+    def claim_paths(self):
+        """Both ways of claiming: SKIP LOCKED and the conditional UPDATE."""
+        for skip_locked in (True, False):
+            with (
+                self.subTest(skip_locked=skip_locked),
+                mock.patch.object(
+                    connection.features,
+                    "has_select_for_update_skip_locked",
+                    skip_locked,
+                ),
+            ):
+                Job.objects.all().delete()
+                yield
+
+    def test_each_job_is_claimed_by_one_worker(self):
+        for _ in self.claim_paths():
+            first = record.enqueue(value=1)
+            second = record.enqueue(value=2)
+            claimed = queue.claim("a")
+            self.assertEqual(claimed.pk, first.pk)
+            self.assertEqual(
+                (claimed.status, claimed.locked_by, claimed.attempts),
+                (Job.RUNNING, "a", 1),
+            )
+            self.assertEqual(queue.claim("b").pk, second.pk)
+            self.assertIsNone(queue.claim("c"))
+
+    def test_job_claimed_by_another_worker_meanwhile_is_skipped(self):
+        first = record.enqueue(value=1)
+        second = record.enqueue(value=2)
+        listed = queue._claimable(None, timezone.now())
+        stale = StaleCandidates(listed, [first.pk, second.pk])
+        self.assertEqual(queue.claim("a").pk, first.pk)
+        with mock.patch.object(queue, "_claimable", return_value=stale):
+            self.assertEqual(queue.claim("b").pk, second.pk)
+        self.assertEqual(Job.objects.get(pk=first.pk).locked_by, "a")
+
+    def test_failures_are_retried_with_backoff_then_given_up(self):
+        job = fail.enqueue()
+        claimed = queue.claim("a")
+        with self.assertLogs("jobs.queue", "WARNING"):
+            self.assertEqual(queue.run(claimed), "retry")
+        job.refresh_from_db()
+        self.assertEqual(job.status, Job.QUEUED)
+        self.assertIn("RuntimeError: boom", job.last_error)
+        delay = (job.run_after - timezone.now()).total_seconds()
+        self.assertTrue(4 <= delay <= 10, delay)
+        # Not due before its backoff has passed
+        self.assertIsNone(queue.claim("a"))
+
+        Job.objects.filter(pk=job.pk).update(run_after=timezone.now())
+        claimed = queue.claim("a")
+        self.assertEqual(claimed.attempts, 2)
+        with self.assertLogs("jobs.queue", "ERROR"):
+            self.assertEqual(queue.run(claimed), Job.FAILED)
+        job.refresh_from_db()
+        self.assertEqual(job.status, Job.FAILED)
+        self.assertIsNone(queue.claim("a"))
+
+    def test_backoff_doubles_up_to_the_cap(self):
+        for attempts, low, high in ((1, 5, 10), (2, 10, 20), (3, 20, 40), (9, 30, 60)):
+            delay = queue.backoff(attempts).total_seconds()
+            self.assertTrue(low <= delay <= high, (attempts, delay))
+
+    @override_settings(JOB_LOCK_TIMEOUT=600)
+    def test_job_of_a_dead_worker_is_claimed_again_after_the_lock_timeout(self):
+        job = record.enqueue(value=1)
+        queue.claim("dead")
+        self.assertIsNone(queue.claim("b"))
+        Job.objects.filter(pk=job.pk).update(
+            locked_at=timezone.now() - timedelta(seconds=601)
+        )
+        claimed = queue.claim("b")
+        self.assertEqual((claimed.pk, claimed.attempts), (job.pk, 2))
+        self.assertEqual(queue.run(claimed), Job.DONE)
+        self.assertEqual(calls, [1])
+
+    def test_idempotency_key_enqueues_once(self):
+        first = record.enqueue(value=1, idempotency_key="once")
+        self.assertEqual(record.enqueue(value=2, idempotency_key="once").pk, first.pk)
+        self.assertEqual(Job.objects.count(), 1)
+
+
+class RunJobsCommandTests(TransactionTestCase):
+    def setUp(self):
+        calls.clear()
+
+    def test_runs_due_jobs_and_exits_when_idle(self):
+        record.enqueue(value=1)
+        record.enqueue(value=2)
+        record.enqueue(value=3, delay=timedelta(hours=1))
+        out = StringIO()
+        call_command("run_jobs", "--once", stdout=out)
+        self.assertEqual(calls, [1, 2])
+        self.assertIn("ran 2 job(s)", out.getvalue())
+        self.assertEqual(Job.objects.filter(status=Job.DONE).count(), 2)
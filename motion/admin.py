@@ -0,0 +1,27 @@
+from django.contrib import admin
+
+from motion.models import DeletionRequest, SlowQuery
+
+
+@admin.register(SlowQuery)
+class SlowQueryAdmin(admin.ModelAdmin):
+    list_display = ("created", "duration_ms", "view", "database", "fingerprint")
+    list_filter = ("view", "database")
+    search_fields = ("fingerprint", "view")
+    readonly_fields = [field.name for field in SlowQuery._meta.fields]
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+
+@admin.register(DeletionRequest)
+class DeletionRequestAdmin(admin.ModelAdmin):
+    list_display = ("id", "target_type", "target_id", "status", "created", "finished")
+    list_filter = ("target_type", "status")
+    readonly_fields = [field.name for field in DeletionRequest._meta.fields]
+
+    def has_add_permission(self, request):
+        return False
@@ -0,0 +1,18 @@
+from django.apps import AppConfig
+from django.conf import settings
+
+
+class MotionConfig(AppConfig):
+    default_auto_field = "django.db.models.BigAutoField"
+    name = "motion"
+
+    def ready(self):
+        from motion import instrumentation
+
+        # The execute wrapper is a no-op unless something is listening, so it
+        # is always installed; serializer timing only feeds Server-Timing.
+        instrumentation.install(time_serializers=settings.PERFORMANCE_INSTRUMENTATION)
+        if settings.SLOW_QUERY_THRESHOLD_MS > 0:
+            from motion import slow_queries
+
+            slow_queries.install()
@@ -13,4 +13,14 @@ from django.core.asgi import get_asgi_application
 
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "motion.settings")
 
-application = get_asgi_application()
+django_application = get_asgi_application()
+
+# Imported once Django is set up
+from motion import sse
+
+
+async def application(scope, receive, send):
+    # Event streams bypass Django, so idle connections stay cheap (see motion/sse.py)
+    if scope["type"] == "http" and scope["path"] == sse.PATH:
+        return await sse.feed_events(scope, receive, send)
+    return await django_application(scope, receive, send)
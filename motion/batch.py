@@ -0,0 +1,182 @@
+"""
+Batched API calls: one HTTP request carrying several sub-requests.
+
+``POST /backend/api/batch/`` takes up to BATCH_MAX_REQUESTS relative GET and
+POST requests. The batch is authenticated once and every sub-request runs
+as that user (DRF's forced authentication, so no second token decode or
+user lookup), dispatched in-process through the URL resolver to the same
+views, permissions and throttles as a direct call. Middleware does not run
+again for sub-requests, so only the DRF API views under API_PREFIX can be
+reached: the admin, ``/metrics`` and other plain Django views rely on the
+session, CSRF or address checks of the middleware and answer 404 here.
+
+Sub-requests run in order, except that consecutive GETs run concurrently on
+a pool of BATCH_WORKERS threads; a POST waits for everything before it, and
+everything after it waits for the POST. One failing sub-request does not
+fail the batch: each gets its own status, headers and body. GETs to
+REPLICA_READ_APPS may read from a replica, and only successful POSTs pin the
+user to the primary.
+"""
+
+import contextvars
+import json
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+from urllib.parse import urlsplit
+
+from django.conf import settings
+from django.db import close_old_connections
+from django.http import HttpRequest, QueryDict
+from django.urls import Resolver404, resolve
+from rest_framework import status
+from rest_framework.views import APIView
+
+from motion import db_router, metrics
+
+logger = logging.getLogger(__name__)
+
+API_PREFIX = "/backend/api/"
+
+# Request headers that describe the batch's own body
+_BODY_META = {"CONTENT_TYPE", "CONTENT_LENGTH", "HTTP_CONTENT_ENCODING", "wsgi.input"}
+
+_executor = None
+
+
+def get_executor():
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(
+            max_workers=settings.BATCH_WORKERS, thread_name_prefix="batch"
+        )
+    return _executor
+
+
+def _sub_request(request, method, url, body):
+    """A Django request for ``url``, authenticated as ``request``'s user."""
+    parts = urlsplit(url)
+    payload = b"" if body is None else json.dumps(body).encode()
+    sub = HttpRequest()
+    sub.method = method
+    sub.path = sub.path_info = parts.path
+    sub.META = {
+        key: value for key, value in request.META.items() if key not in _BODY_META
+    }
+    sub.META.update(
+        REQUEST_METHOD=method,
+        PATH_INFO=parts.path,
+        QUERY_STRING=parts.query,
+        CONTENT_TYPE="application/json",
+        CONTENT_LENGTH=str(len(payload)),
+    )
+    sub.GET = QueryDict(parts.query)
+    sub.COOKIES = request.COOKIES
+    sub._stream = BytesIO(payload)
+    sub._read_started = False
+    # Picked up by rest_framework.request.Request instead of the authenticators
+    sub.user = sub._force_auth_user = request.user
+    sub._force_auth_token = request.auth
+    return sub
+
+
+def _response_body(response):
+    if hasattr(response, "data"):
+        return response.data
+    if hasattr(response, "render"):
+        response.render()
+    try:
+        return json.loads(response.content)
+    except ValueError:
+        return response.content.decode(response.charset, errors="replace")
+
+
+def _error(status_code, detail):
+    return {"status": status_code, "headers": {}, "body": {"detail": detail}}
+
+
+def _is_api_view(path, match):
+    view_class = getattr(match.func, "cls", None)
+    return (
+        path.startswith(API_PREFIX)
+        and isinstance(view_class, type)
+        and issubclass(view_class, APIView)
+    )
+
+
+def dispatch(request, method, url, body=None):
+    """Run one sub-request and return its ``{status, headers, body}``."""
+    sub = _sub_request(request, method, url, body)
+    try:
+        match = resolve(sub.path_info)
+    except Resolver404:
+        return _error(status.HTTP_404_NOT_FOUND, "Not found.")
+    if not _is_api_view(sub.path_info, match):
+        return _error(status.HTTP_404_NOT_FOUND, "Not found.")
+    if match.func is request.resolver_match.func:
+        return _error(status.HTTP_400_BAD_REQUEST, "Batches cannot be nested.")
+    sub.resolver_match = match
+    if settings.DATABASE_REPLICAS:
+        db_router.route_reads(sub, match.func)
+    try:
+        response = match.func(sub, *match.args, **match.kwargs)
+        if settings.DATABASE_REPLICAS:
+            db_router.pin_writer(sub, response)
+        result = {
+            "status": response.status_code,
+            "headers": {
+                name: value
+                for name, value in response.items()
+                if name not in ("Content-Type", "Content-Length")
+            },
+            "body": _response_body(response),
+        }
+    except Exception:
+        # DRF has already turned API errors into responses
+        logger.exception("Batched %s %s failed", method, url)
+        result = _error(status.HTTP_500_INTERNAL_SERVER_ERROR, "Server error.")
+    metrics.batch_subrequests.labels(method, match.route, str(result["status"])).inc()
+    return result
+
+
+def _dispatch_in_thread(context, request, subrequest):
+    # Pool threads keep their connections; recycle them like request_finished does
+    close_old_connections()
+    try:
+        return context.run(dispatch, request, **subrequest)
+    finally:
+        close_old_connections()
+
+
+def run(request, subrequests):
+    """Responses to ``subrequests`` (dicts of method, url, body), in order."""
+    responses = []
+    reads = []
+    # Only the writes among the sub-requests pin the user to the primary
+    request._request.replica_pins_handled = True
+
+    def flush():
+        if len(reads) == 1:
+            responses.append(
+                contextvars.copy_context().run(dispatch, request, **reads[0])
+            )
+        elif reads:
+            futures = [
+                get_executor().submit(
+                    _dispatch_in_thread, contextvars.copy_context(), request, read
+                )
+                for read in reads
+            ]
+            responses.extend(future.result() for future in futures)
+        reads.clear()
+
+    for subrequest in subrequests:
+        if subrequest["method"] == "GET":
+            reads.append(subrequest)
+            continue
+        flush()
+        responses.append(
+            contextvars.copy_context().run(dispatch, request, **subrequest)
+        )
+    flush()
+    return responses
@@ -0,0 +1,188 @@
+"""
+Read replicas with read-your-writes stickiness.
+
+ReplicaRoutingMiddleware marks GET/HEAD/OPTIONS requests to views of the
+REPLICA_READ_APPS as replica reads; ReplicaRouter then sends their reads to
+one replica, picked at random once per request so the request sees a single
+snapshot. Everything else (writes, reads inside a transaction, other views,
+management commands and jobs) uses the primary.
+
+After a successful write the user is pinned to the primary for
+REPLICA_PIN_SECONDS, so they read their own writes while the replicas catch
+up. Pins live in a SQLite file shared by the workers of the host
+(REPLICA_PIN_DB). A replica that cannot be connected to is skipped for
+REPLICA_RETRY_SECONDS, falling back to another replica or the primary.
+
+Settings:
+    DATABASE_REPLICA_URLS  comma-separated replica URLs (aliases replica_1, ...)
+    REPLICA_READ_APPS      apps whose views may read from a replica
+    REPLICA_PIN_SECONDS    primary-only window after a user writes
+    REPLICA_RETRY_SECONDS  how long an unreachable replica is skipped
+    REPLICA_PIN_DB         path of the pin store
+"""
+
+import logging
+import random
+import time
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import DEFAULT_DB_ALIAS, DatabaseError, connections
+from rest_framework.permissions import SAFE_METHODS
+from rest_framework_simplejwt.exceptions import InvalidToken
+from rest_framework_simplejwt.settings import api_settings as jwt_settings
+
+from motion import metrics
+from motion.authentication import JWTAuthenticationWithoutBearer
+from motion.localstore import LocalStore, store_getter
+from motion.middleware import view_path
+
+logger = logging.getLogger(__name__)
+
+_routing = ContextVar("motion_replica_routing", default=None)
+
+# alias -> time.monotonic() until which the replica is skipped
+_unavailable = {}
+
+
+class PinStore(LocalStore):
+    """Users who recently wrote, with the time their pin to the primary ends."""
+
+    schema = "CREATE TABLE IF NOT EXISTS pin (user_id INTEGER PRIMARY KEY, until REAL)"
+    prune_sql = "DELETE FROM pin WHERE until < ?"
+
+    def pin(self, user_id, seconds):
+        now = time.time()
+        self.connection().execute(
+            "INSERT INTO pin (user_id, until) VALUES (?, ?) "
+            "ON CONFLICT (user_id) DO UPDATE SET until = excluded.until",
+            (user_id, now + seconds),
+        )
+        self.maybe_prune(now)
+
+    def is_pinned(self, user_id):
+        row = (
+            self.connection()
+            .execute("SELECT until FROM pin WHERE user_id = ?", (user_id,))
+            .fetchone()
+        )
+        return row is not None and row[0] > time.time()
+
+
+get_pin_store = store_getter(PinStore, "REPLICA_PIN_DB")
+
+
+def _token_user_id(request):
+    """The user id in the request's access token, without a database query."""
+    authentication = JWTAuthenticationWithoutBearer()
+    header = authentication.get_header(request)
+    raw_token = header and authentication.get_raw_token(header)
+    if not raw_token:
+        return None
+    try:
+        token = authentication.get_validated_token(raw_token)
+    except InvalidToken:
+        # DRF rejects the request later; it reads from wherever it likes
+        return None
+    return token.get(jwt_settings.USER_ID_CLAIM)
+
+
+def mark_unavailable(alias):
+    _unavailable[alias] = time.monotonic() + settings.REPLICA_RETRY_SECONDS
+
+
+def choose_replica():
+    """A reachable replica, or the primary when there is none."""
+    now = time.monotonic()
+    candidates = [
+        alias
+        for alias in settings.DATABASE_REPLICAS
+        if _unavailable.get(alias, 0) <= now
+    ]
+    random.shuffle(candidates)
+    for alias in candidates:
+        try:
+            connections[alias].ensure_connection()
+        except DatabaseError:
+            logger.warning("Replica %s is unavailable, skipping it", alias)
+            mark_unavailable(alias)
+            continue
+        return alias
+    return DEFAULT_DB_ALIAS
+
+
+class ReplicaReads:
+    """Routing state of one request whose reads may go to a replica."""
+
+    __slots__ = ("alias", "request")
+
+    def __init__(self, request):
+        self.request = request
+        self.alias = None
+
+    def resolve(self):
+        if self.alias is None:
+            user_id = _token_user_id(self.request)
+            if user_id is not None and get_pin_store().is_pinned(user_id):
+                self.alias, reason = DEFAULT_DB_ALIAS, "pinned"
+            else:
+                self.alias = choose_replica()
+                reason = "replica" if self.alias != DEFAULT_DB_ALIAS else "fallback"
+            metrics.replica_reads.labels(self.alias, reason).inc()
+        return self.alias
+
+
+def pin_writer(request, response):
+    """Pin the user of a successful write to the primary for REPLICA_PIN_SECONDS."""
+    if request.method not in SAFE_METHODS and response.status_code < 400:
+        # DRF sets the authenticated user on the underlying request
+        user = getattr(request, "user", None)
+        if user is not None and user.is_authenticated:
+            get_pin_store().pin(user.pk, settings.REPLICA_PIN_SECONDS)
+
+
+def route_reads(request, view_func):
+    """Let a safe request to a REPLICA_READ_APPS view read from a replica."""
+    app = view_path(view_func).split(".")[0]
+    if request.method in SAFE_METHODS and app in settings.REPLICA_READ_APPS:
+        _routing.set(ReplicaReads(request))
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        reads = _routing.get()
+        # Reads inside a transaction must see its writes
+        if reads is None or connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return DEFAULT_DB_ALIAS
+        return reads.resolve()
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Every alias holds the same data
+        return True
+
+
+class ReplicaRoutingMiddleware:
+    """Routes safe-method reads of REPLICA_READ_APPS views to the replicas."""
+
+    def __init__(self, get_response):
+        if not settings.DATABASE_REPLICAS:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        token = _routing.set(None)
+        try:
+            response = self.get_response(request)
+        finally:
+            _routing.reset(token)
+        # Batches pin for each of their writes instead (see motion/batch.py)
+        if not getattr(request, "replica_pins_handled", False):
+            pin_writer(request, response)
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        route_reads(request, view_func)
@@ -0,0 +1,146 @@
+"""
+Password hashing on a bounded worker pool.
+
+Hashing and verifying passwords is deliberately slow. Running it on a small
+pool (threads by default: hashlib, argon2 and bcrypt release the GIL) caps
+how many request threads a burst of logins or registrations can tie up.
+When the pool and its queue are full the request fails immediately with 503
+instead of queueing behind the storm, so other endpoints keep their latency.
+
+Settings:
+    PASSWORD_HASHING_EXECUTOR  "thread" (default) or "process"
+    PASSWORD_HASHING_WORKERS   concurrent hash computations per worker process
+    PASSWORD_HASHING_QUEUE     extra hash requests allowed to wait for a slot
+    PASSWORD_HASHING_TIMEOUT   seconds to wait for a queued hash
+    PASSWORD_HASH_ITERATIONS   PBKDF2 iterations (TunablePBKDF2PasswordHasher)
+"""
+
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FuturesTimeoutError
+
+from django.conf import settings
+from django.contrib.auth import get_user_model, hashers
+from django.contrib.auth.backends import ModelBackend
+from rest_framework import status
+from rest_framework.exceptions import APIException
+
+
+class HashingPoolSaturated(APIException):
+    status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+    default_detail = "Too many sign-in attempts in progress, please retry shortly."
+    default_code = "hashing_pool_saturated"
+
+
+class TunablePBKDF2PasswordHasher(hashers.PBKDF2PasswordHasher):
+    """
+    PBKDF2-SHA256 with the iteration count taken from PASSWORD_HASH_ITERATIONS.
+    Same algorithm name as Django's hasher, so existing hashes keep working and
+    are re-hashed with the new count on the next successful login.
+    """
+
+    @property
+    def iterations(self):
+        return (
+            getattr(settings, "PASSWORD_HASH_ITERATIONS", None)
+            or hashers.PBKDF2PasswordHasher.iterations
+        )
+
+
+def _init_process_worker():
+    import django
+
+    os.environ.setdefault("DJANGO_SETTINGS_MODULE", "motion.settings")
+    django.setup()
+
+
+class PasswordHashingPool:
+    def __init__(self, workers, queue_size, executor="thread"):
+        if executor == "process":
+            self.executor = ProcessPoolExecutor(
+                max_workers=workers,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_init_process_worker,
+            )
+        else:
+            self.executor = ThreadPoolExecutor(
+                max_workers=workers, thread_name_prefix="password-hashing"
+            )
+        # One slot per running or waiting hash; no slot means fail fast
+        self._slots = threading.BoundedSemaphore(workers + queue_size)
+
+    def run(self, func, *args):
+        if not self._slots.acquire(blocking=False):
+            raise HashingPoolSaturated()
+        try:
+            future = self.executor.submit(func, *args)
+        except BaseException:
+            self._slots.release()
+            raise
+        future.add_done_callback(lambda _: self._slots.release())
+        try:
+            return future.result(timeout=settings.PASSWORD_HASHING_TIMEOUT)
+        except FuturesTimeoutError:
+            raise HashingPoolSaturated()
+
+
+_pool = None
+_pool_pid = None
+_pool_lock = threading.Lock()
+
+
+def get_pool():
+    """The pool of the current process (re-created after a fork)."""
+    global _pool, _pool_pid
+    if _pool is None or _pool_pid != os.getpid():
+        with _pool_lock:
+            if _pool is None or _pool_pid != os.getpid():
+                _pool = PasswordHashingPool(
+                    settings.PASSWORD_HASHING_WORKERS,
+                    settings.PASSWORD_HASHING_QUEUE,
+                    settings.PASSWORD_HASHING_EXECUTOR,
+                )
+                _pool_pid = os.getpid()
+    return _pool
+
+
+def make_password(password):
+    return get_pool().run(hashers.make_password, password)
+
+
+def check_password(password, encoded):
+    return get_pool().run(hashers.check_password, password, encoded)
+
+
+def check_user_password(user, password):
+    """Verify on the pool and upgrade the stored hash if the settings changed."""
+    if not check_password(password, user.password):
+        return False
+    preferred = hashers.get_hasher()
+    current = hashers.identify_hasher(user.password)
+    if current.algorithm != preferred.algorithm or preferred.must_update(user.password):
+        user.password = make_password(password)
+        user.save(update_fields=["password"])
+    return True
+
+
+class PooledModelBackend(ModelBackend):
+    """ModelBackend that hashes and verifies passwords on the hashing pool."""
+
+    def authenticate(self, request, username=None, password=None, **kwargs):
+        UserModel = get_user_model()
+        if username is None:
+            username = kwargs.get(UserModel.USERNAME_FIELD)
+        if username is None or password is None:
+            return None
+        try:
+            user = UserModel._default_manager.get_by_natural_key(username)
+        except UserModel.DoesNotExist:
+            # Hash anyway so unknown accounts take as long as known ones
+            make_password(password)
+            return None
+        if check_user_password(user, password) and self.user_can_authenticate(user):
+            return user
+        return None
@@ -0,0 +1,187 @@
+"""
+Per-request performance bookkeeping.
+
+A single execute wrapper is installed on every database connection when it is
+created. It only does work while a request (or another caller) has activated
+a ``RequestMetrics`` object or a query observer is registered, so the cost
+outside of instrumented code paths is one context variable lookup per query.
+"""
+
+import re
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import lru_cache
+from time import perf_counter
+
+from django.db import connections
+from django.db.backends.signals import connection_created
+
+_current_metrics = ContextVar("motion_request_metrics", default=None)
+_untracked = ContextVar("motion_untracked_queries", default=False)
+
+# Callables invoked as observer(sql, params, many, duration, context) after
+# every successful query; context is Django's execute wrapper context and
+# holds the "connection" the query ran on.
+_query_observers = []
+
+
+class RequestMetrics:
+    """Timings collected while handling one request."""
+
+    __slots__ = (
+        "_serializing",
+        "query_count",
+        "render_time",
+        "serialize_time",
+        "sql_time",
+        "started",
+        "view_name",
+    )
+
+    def __init__(self):
+        self.view_name = ""
+        self.query_count = 0
+        self.sql_time = 0.0
+        self.serialize_time = 0.0
+        self.render_time = 0.0
+        self.started = perf_counter()
+        self._serializing = False
+
+    def activate(self):
+        """Make these metrics the target for queries on the current context."""
+        return _current_metrics.set(self)
+
+    @staticmethod
+    def deactivate(token):
+        _current_metrics.reset(token)
+
+
+def current_metrics():
+    """Return the active ``RequestMetrics`` or ``None``."""
+    return _current_metrics.get()
+
+
+@contextmanager
+def untracked():
+    """Run our own bookkeeping queries without them being measured."""
+    token = _untracked.set(True)
+    try:
+        yield
+    finally:
+        _untracked.reset(token)
+
+
+def is_untracked():
+    return _untracked.get()
+
+
+def add_query_observer(observer):
+    """Register ``observer(sql, params, many, duration, context)``."""
+    if observer not in _query_observers:
+        _query_observers.append(observer)
+
+
+def remove_query_observer(observer):
+    if observer in _query_observers:
+        _query_observers.remove(observer)
+
+
+_IN_LIST = re.compile(r"\bIN\s*\((?:\s*%s\s*,?)+\)", re.IGNORECASE)
+_STRING_LITERAL = re.compile(r"'(?:[^']|'')*'")
+_NUMBER_LITERAL = re.compile(r"\b\d+(?:\.\d+)?\b")
+_WHITESPACE = re.compile(r"\s+")
+
+
+@lru_cache(maxsize=2048)
+def fingerprint_sql(sql):
+    """
+    Normalize a statement to its shape: literals become ``?`` and ``IN`` lists
+    of any length collapse, so the same ORM query always fingerprints the same.
+    """
+    sql = _STRING_LITERAL.sub("?", sql)
+    sql = _NUMBER_LITERAL.sub("?", sql)
+    sql = _IN_LIST.sub("IN (...)", sql)
+    return _WHITESPACE.sub(" ", sql).strip()
+
+
+def instrumented_execute(execute, sql, params, many, context):
+    """Database execute wrapper that accounts query count and SQL time."""
+    metrics = _current_metrics.get()
+    if (metrics is None and not _query_observers) or _untracked.get():
+        return execute(sql, params, many, context)
+
+    start = perf_counter()
+    succeeded = False
+    try:
+        result = execute(sql, params, many, context)
+        succeeded = True
+        return result
+    finally:
+        duration = perf_counter() - start
+        if metrics is not None:
+            metrics.query_count += 1
+            metrics.sql_time += duration
+        if succeeded:
+            for observer in _query_observers:
+                observer(sql, params, many, duration, context)
+
+
+# Further execute wrappers installed next to instrumented_execute
+_extra_wrappers = []
+
+
+def add_execute_wrapper(wrapper):
+    """Install ``wrapper`` on every current and future connection."""
+    if wrapper not in _extra_wrappers:
+        _extra_wrappers.append(wrapper)
+    for connection in connections.all(initialized_only=True):
+        install_execute_wrapper(connection=connection)
+
+
+def install_execute_wrapper(sender=None, connection=None, **kwargs):
+    """Attach our execute wrappers to a connection (idempotent)."""
+    for wrapper in (instrumented_execute, *_extra_wrappers):
+        if wrapper not in connection.execute_wrappers:
+            connection.execute_wrappers.append(wrapper)
+
+
+def install(time_serializers=True):
+    """Instrument current and future connections (and DRF serializers)."""
+    connection_created.connect(
+        install_execute_wrapper, dispatch_uid="motion.instrumentation"
+    )
+    for connection in connections.all(initialized_only=True):
+        install_execute_wrapper(connection=connection)
+    if time_serializers:
+        _patch_serializer_data()
+
+
+def _timed_data(prop):
+    fget = prop.fget
+
+    def data(self):
+        metrics = _current_metrics.get()
+        # Nested serializers call to_representation directly, but guard anyway
+        # so the outermost .data access is the only one that is counted.
+        if metrics is None or metrics._serializing:
+            return fget(self)
+
+        metrics._serializing = True
+        start = perf_counter()
+        try:
+            return fget(self)
+        finally:
+            metrics.serialize_time += perf_counter() - start
+            metrics._serializing = False
+
+    data._motion_timed = True
+    return property(data, doc=prop.__doc__)
+
+
+def _patch_serializer_data():
+    from rest_framework.serializers import ListSerializer, Serializer
+
+    for cls in (Serializer, ListSerializer):
+        prop = cls.__dict__["data"]
+        if not getattr(prop.fget, "_motion_timed", False):
+            cls.data = _timed_data(prop)
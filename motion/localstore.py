@@ -0,0 +1,64 @@
+"""
+Small SQLite databases for state shared by the worker processes of one host,
+such as rate limit buckets (motion/throttling.py) and read-your-writes pins
+(motion/db_router.py). WAL mode lets readers proceed while a process writes,
+single statements are atomic across processes, and nothing needs a server.
+"""
+
+import os
+import sqlite3
+import threading
+import time
+
+# Expired rows are deleted at most this often (seconds) per process
+PRUNE_INTERVAL = 60
+
+
+class LocalStore:
+    """A SQLite file with ``schema``; one connection per thread and process."""
+
+    schema = ""
+    prune_sql = None
+
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+        self._last_prune = 0.0
+
+    def connection(self):
+        # sqlite3 connections belong to one thread and must not cross a fork
+        local = self._local
+        if getattr(local, "pid", None) != os.getpid():
+            connection = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            connection.execute(self.schema)
+            local.connection, local.pid = connection, os.getpid()
+        return local.connection
+
+    def maybe_prune(self, now=None):
+        """Run ``prune_sql`` (with the current time) every PRUNE_INTERVAL."""
+        now = time.time() if now is None else now
+        if self.prune_sql and now - self._last_prune > PRUNE_INTERVAL:
+            self._last_prune = now
+            self.connection().execute(self.prune_sql, (now,))
+
+
+def store_getter(store_class, setting):
+    """A function returning the process-wide ``store_class`` at ``setting``."""
+    from django.conf import settings
+
+    state = {"store": None}
+    lock = threading.Lock()
+
+    def get_store():
+        path = getattr(settings, setting)
+        store = state["store"]
+        if store is None or store.path != path:
+            with lock:
+                store = state["store"]
+                if store is None or store.path != path:
+                    store = state["store"] = store_class(path)
+        return store
+
+    return get_store
@@ -0,0 +1,92 @@
+import multiprocessing
+import os
+import statistics
+import tempfile
+import time
+
+from django.core.management.base import BaseCommand
+from rest_framework.throttling import SimpleRateThrottle
+
+from motion.throttling import TokenBucketStore
+
+
+def _hammer(path, keys, checks, capacity, duration, results):
+    store = TokenBucketStore(path)
+    timings = []
+    allowed = 0
+    for i in range(checks):
+        start = time.perf_counter()
+        wait = store.take(f"bench_{i % keys}", capacity, duration)
+        timings.append(time.perf_counter() - start)
+        allowed += wait == 0
+    results.put((timings, allowed))
+
+
+class Command(BaseCommand):
+    help = (
+        "Measure the cost of a shared rate limit check with several processes "
+        "hitting the same bucket store"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--processes", type=int, default=4)
+        parser.add_argument("--checks", type=int, default=10000, help="Per process")
+        parser.add_argument("--keys", type=int, default=1, help="Distinct buckets")
+        parser.add_argument("--rate", default="1000/s")
+        parser.add_argument(
+            "--db", default=None, help="Bucket file (default: a temporary file)"
+        )
+
+    def handle(self, *args, **options):
+        # parse_rate does not use the instance, which needs a configured scope
+        capacity, duration = SimpleRateThrottle.parse_rate(None, options["rate"])
+        path = options["db"] or os.path.join(tempfile.mkdtemp(), "throttle.sqlite3")
+        TokenBucketStore(path).reset()
+
+        context = multiprocessing.get_context("fork")
+        results = context.Queue()
+        workers = [
+            context.Process(
+                target=_hammer,
+                args=(
+                    path,
+                    options["keys"],
+                    options["checks"],
+                    capacity,
+                    duration,
+                    results,
+                ),
+            )
+            for _ in range(options["processes"])
+        ]
+        started = time.perf_counter()
+        for worker in workers:
+            worker.start()
+        collected = [results.get() for _ in workers]
+        for worker in workers:
+            worker.join()
+        elapsed = time.perf_counter() - started
+
+        timings = sorted(t for worker_timings, _ in collected for t in worker_timings)
+        allowed = sum(count for _, count in collected)
+        # A bucket never hands out more than it holds plus what refills meanwhile
+        ceiling = options["keys"] * (capacity + capacity / duration * elapsed)
+
+        def percentile(p):
+            return timings[min(len(timings) - 1, int(len(timings) * p))] * 1e6
+
+        self.stdout.write(
+            f"{len(timings)} checks in {elapsed:.2f}s "
+            f"({len(timings) / elapsed:,.0f}/s over {len(workers)} processes)"
+        )
+        self.stdout.write(
+            f"per check: mean {statistics.fmean(timings) * 1e6:.0f}us, "
+            f"p50 {percentile(0.5):.0f}us, p99 {percentile(0.99):.0f}us, "
+            f"max {timings[-1] * 1e6:.0f}us"
+        )
+        message = f"allowed {allowed} (at most {ceiling:.0f})"
+        self.stdout.write(
+            self.style.SUCCESS(message)
+            if allowed <= ceiling
+            else self.style.ERROR(message)
+        )
@@ -0,0 +1,10 @@
+from django.core.management.base import BaseCommand
+
+from motion.profiling import make_token
+
+
+class Command(BaseCommand):
+    help = "Print a signed X-Profile-Token header value for profiling a request"
+
+    def handle(self, *args, **options):
+        self.stdout.write(make_token())
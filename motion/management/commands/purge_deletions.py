@@ -0,0 +1,33 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from motion import nplusone
+from motion.nplusone import detect_n_plus_one
+from motion.purge import purge_pending
+
+
+class Command(BaseCommand):
+    help = "Purge the rows of deleted users and posts in small batches"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=None)
+        parser.add_argument(
+            "--watch",
+            action="store_true",
+            help="Keep polling for new deletion requests",
+        )
+        parser.add_argument("--interval", type=float, default=5.0)
+
+    @detect_n_plus_one("purge_deletions")
+    def handle(self, *args, **options):
+        while True:
+            processed = purge_pending(options["batch_size"])
+            if processed:
+                self.stdout.write(
+                    self.style.SUCCESS(f"Purged {processed} deletion request(s)")
+                )
+            if not options["watch"]:
+                break
+            nplusone.checkpoint()
+            time.sleep(options["interval"])
@@ -0,0 +1,163 @@
+"""
+Prometheus metrics shared by every gunicorn worker.
+
+When PROMETHEUS_MULTIPROC_DIR is set (see gunicorn.conf.py) prometheus_client
+keeps each worker's samples in mmap'ed files in that directory and the
+``/metrics`` view merges them at scrape time, so recording a sample is a
+couple of memory writes and never touches the network or the database.
+Other processes, such as the job worker (``manage.py run_jobs``), keep their
+samples in memory and serve them on a port of their own (``start_server``).
+"""
+
+import os
+
+from django.db import connections
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    REGISTRY,
+    CollectorRegistry,
+    Counter,
+    Gauge,
+    Histogram,
+    generate_latest,
+    multiprocess,
+    start_http_server,
+)
+
+_multiproc_dir = os.environ.get("PROMETHEUS_MULTIPROC_DIR")
+if _multiproc_dir:
+    # Only gunicorn's on_starting creates it; samples are written from import on
+    os.makedirs(_multiproc_dir, exist_ok=True)
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+http_requests = Counter(
+    "motion_http_requests_total",
+    "HTTP requests by method, URL route and status code.",
+    ["method", "route", "status"],
+)
+http_request_duration = Histogram(
+    "motion_http_request_duration_seconds",
+    "End-to-end request latency by URL route.",
+    ["method", "route"],
+    buckets=LATENCY_BUCKETS,
+)
+db_queries_per_request = Histogram(
+    "motion_db_queries_per_request",
+    "Number of SQL queries executed per request.",
+    ["route"],
+    buckets=(0, 1, 2, 3, 5, 10, 20, 50, 100, 250),
+)
+db_time_per_request = Histogram(
+    "motion_db_time_seconds",
+    "Total SQL time spent per request.",
+    ["route"],
+    buckets=LATENCY_BUCKETS,
+)
+cache_lookups = Counter(
+    "motion_cache_lookups_total",
+    "Cache lookups by cache name and result (hit or miss).",
+    ["cache", "result"],
+)
+db_connections_open = Gauge(
+    "motion_db_connections_open",
+    "Open database connections per alias, summed over live workers.",
+    ["alias"],
+    multiprocess_mode="livesum",
+)
+db_pool_connections = Gauge(
+    "motion_db_pool_connections",
+    "Connection pool size and idle connections per alias (pooled backends only).",
+    ["alias", "state"],
+    multiprocess_mode="livesum",
+)
+jobs_processed = Counter(
+    "motion_jobs_processed_total",
+    "Background jobs run, by queue, task and outcome (done, retry, failed).",
+    ["queue", "task", "outcome"],
+)
+job_duration = Histogram(
+    "motion_job_duration_seconds",
+    "Background job run time by queue and task.",
+    ["queue", "task"],
+    buckets=LATENCY_BUCKETS + (60, 300),
+)
+replica_reads = Counter(
+    "motion_replica_reads_total",
+    "Requests eligible for replica reads by database alias and reason "
+    "(replica, pinned after a write, fallback when no replica is reachable).",
+    ["alias", "reason"],
+)
+batch_subrequests = Counter(
+    "motion_batch_subrequests_total",
+    "Sub-requests of /backend/api/batch/ by method, URL route and status code.",
+    ["method", "route", "status"],
+)
+notification_writes = Counter(
+    "motion_notification_writes_total",
+    "Notification rows written by operation: opened (new row), merged (event added "
+    "to an unread row), withdrawn, removed and read.",
+    ["op"],
+)
+sse_connections = Gauge(
+    "motion_sse_connections",
+    "Open event stream connections, summed over live workers.",
+    multiprocess_mode="livesum",
+)
+throttle_checks = Counter(
+    "motion_throttle_checks_total",
+    "Rate limit checks by throttle scope and result (allowed or throttled).",
+    ["scope", "result"],
+)
+throttle_check_duration = Histogram(
+    "motion_throttle_check_duration_seconds",
+    "Time spent checking one rate limit bucket.",
+    buckets=(0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.05),
+)
+
+# Collectors that compute their samples when /metrics is scraped (e.g. from
+# the database) instead of being updated by the workers
+_scrape_registry = CollectorRegistry()
+
+
+def register_scrape_collector(collector):
+    _scrape_registry.register(collector)
+
+
+def record_cache_lookup(cache_name, hit, count=1):
+    """Count cache hits or misses; hit ratio = hits / (hits + misses)."""
+    if count:
+        cache_lookups.labels(cache_name, "hit" if hit else "miss").inc(count)
+
+
+def record_connection_state():
+    """Sample the connection (and pool) state of the calling worker."""
+    for connection in connections.all(initialized_only=True):
+        alias = connection.alias
+        db_connections_open.labels(alias).set(0 if connection.connection is None else 1)
+        pool = getattr(connection, "pool", None)
+        if pool is not None:
+            stats = pool.get_stats()
+            db_pool_connections.labels(alias, "size").set(stats.get("pool_size", 0))
+            db_pool_connections.labels(alias, "idle").set(
+                stats.get("pool_available", 0)
+            )
+
+
+def _registry():
+    if _multiproc_dir:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry, path=_multiproc_dir)
+        return registry
+    return REGISTRY
+
+
+def render_latest():
+    """Return ``(payload, content_type)`` for all workers' metrics."""
+    payload = generate_latest(_registry()) + generate_latest(_scrape_registry)
+    return payload, CONTENT_TYPE_LATEST
+
+
+def start_server(port, addr="0.0.0.0"):
+    """Serve this process's metrics over HTTP, for processes without /metrics."""
+    start_http_server(port, addr, registry=_registry())
@@ -0,0 +1,132 @@
+import json
+import logging
+from time import perf_counter
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+
+from motion.instrumentation import RequestMetrics
+
+performance_logger = logging.getLogger("motion.performance")
+
+
+def view_path(view_func):
+    """Dotted path of the view class (or function) handling a request."""
+    view = getattr(view_func, "view_class", view_func)
+    return f"{view.__module__}.{view.__name__}"
+
+
+class ServerTimingMiddleware:
+    """
+    Records query count, SQL time, serialization time and render time for each
+    request and reports them in a ``Server-Timing`` header and a JSON log line.
+
+    Should be first in MIDDLEWARE so that "total" covers the whole stack.
+    """
+
+    def __init__(self, get_response):
+        if not getattr(settings, "PERFORMANCE_INSTRUMENTATION", False):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        metrics = RequestMetrics()
+        request.performance_metrics = metrics
+        token = metrics.activate()
+        try:
+            response = self.get_response(request)
+        finally:
+            RequestMetrics.deactivate(token)
+        total = perf_counter() - metrics.started
+
+        response["Server-Timing"] = ", ".join(
+            [
+                (
+                    f"db;dur={metrics.sql_time * 1000:.2f};"
+                    f'desc="{metrics.query_count} queries"'
+                ),
+                f"serialize;dur={metrics.serialize_time * 1000:.2f}",
+                f"render;dur={metrics.render_time * 1000:.2f}",
+                f"total;dur={total * 1000:.2f}",
+            ]
+        )
+        if performance_logger.isEnabledFor(logging.INFO):
+            performance_logger.info(
+                json.dumps(
+                    {
+                        "method": request.method,
+                        "path": request.path,
+                        "view": metrics.view_name,
+                        "status": response.status_code,
+                        "queries": metrics.query_count,
+                        "db_ms": round(metrics.sql_time * 1000, 2),
+                        "serialize_ms": round(metrics.serialize_time * 1000, 2),
+                        "render_ms": round(metrics.render_time * 1000, 2),
+                        "total_ms": round(total * 1000, 2),
+                    }
+                )
+            )
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        request.performance_metrics.view_name = view_path(view_func)
+
+    def process_template_response(self, request, response):
+        # DRF responses are rendered by the handler right after this hook,
+        # and post-render callbacks run once rendering has finished.
+        metrics = request.performance_metrics
+        render_started = perf_counter()
+
+        def record_render_time(rendered):
+            metrics.render_time += perf_counter() - render_started
+
+        response.add_post_render_callback(record_render_time)
+        return response
+
+
+class PrometheusMetricsMiddleware:
+    """
+    Records request count, latency and per-request DB work into the
+    multiprocess Prometheus registry (see motion.metrics).
+
+    Reuses the RequestMetrics of ServerTimingMiddleware when that runs first.
+    """
+
+    def __init__(self, get_response):
+        if not getattr(settings, "METRICS_ENABLED", False):
+            raise MiddlewareNotUsed
+        from motion import metrics
+
+        self.metrics = metrics
+        self.get_response = get_response
+
+    def __call__(self, request):
+        request_metrics = getattr(request, "performance_metrics", None)
+        token = None
+        if request_metrics is None:
+            request_metrics = RequestMetrics()
+            token = request_metrics.activate()
+        started = perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            if token is not None:
+                RequestMetrics.deactivate(token)
+        elapsed = perf_counter() - started
+
+        match = getattr(request, "resolver_match", None)
+        route = match.route if match is not None else "<unmatched>"
+        if route == "metrics":
+            return response
+
+        metrics = self.metrics
+        metrics.http_requests.labels(
+            request.method, route, str(response.status_code)
+        ).inc()
+        metrics.http_request_duration.labels(request.method, route).observe(elapsed)
+        metrics.db_queries_per_request.labels(route).observe(
+            request_metrics.query_count
+        )
+        metrics.db_time_per_request.labels(route).observe(request_metrics.sql_time)
+        metrics.record_connection_state()
+        return response
@@ -0,0 +1,32 @@
+# Generated by Django 6.0 on 2026-10-19 15:27
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SlowQuery',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created', models.DateTimeField(auto_now_add=True)),
+                ('database', models.CharField(max_length=100)),
+                ('duration_ms', models.FloatField()),
+                ('fingerprint', models.TextField()),
+                ('sql', models.TextField()),
+                ('params', models.TextField(blank=True, default='')),
+                ('view', models.CharField(blank=True, default='', max_length=255)),
+                ('plan', models.TextField(blank=True, default='')),
+            ],
+            options={
+                'verbose_name_plural': 'slow queries',
+                'ordering': ['-id'],
+            },
+        ),
+    ]
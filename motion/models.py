@@ -0,0 +1,77 @@
+from django.conf import settings
+from django.db import models
+
+
+class SlowQuery(models.Model):
+    """
+    One SQL statement that exceeded SLOW_QUERY_THRESHOLD_MS, with the plan
+    captured right after it ran. The table is a ring buffer: only the newest
+    SLOW_QUERY_LOG_SIZE rows are kept (see motion/slow_queries.py).
+    """
+
+    created = models.DateTimeField(auto_now_add=True)
+    database = models.CharField(max_length=100)
+    duration_ms = models.FloatField()
+    fingerprint = models.TextField()
+    sql = models.TextField()
+    params = models.TextField(blank=True, default="")
+    view = models.CharField(max_length=255, blank=True, default="")
+    plan = models.TextField(blank=True, default="")
+
+    class Meta:
+        ordering = ["-id"]
+        verbose_name_plural = "slow queries"
+
+    def __str__(self):
+        return f"{self.duration_ms:.0f} ms in {self.view or 'unknown'}"
+
+
+class DeletionRequest(models.Model):
+    """
+    A tombstoned user or post whose rows are being purged in the background
+    (see motion/purge.py). ``progress`` maps each purged table to the number
+    of rows deleted so far.
+    """
+
+    USER = "user"
+    POST = "post"
+    TARGET_TYPES = [(USER, "User"), (POST, "Post")]
+
+    PENDING = "pending"
+    RUNNING = "running"
+    DONE = "done"
+    FAILED = "failed"
+    STATUSES = [
+        (PENDING, "Pending"),
+        (RUNNING, "Running"),
+        (DONE, "Done"),
+        (FAILED, "Failed"),
+    ]
+
+    target_type = models.CharField(max_length=10, choices=TARGET_TYPES)
+    target_id = models.BigIntegerField()
+    requested_by = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        null=True,
+        blank=True,
+        on_delete=models.SET_NULL,
+        related_name="+",
+    )
+    status = models.CharField(
+        max_length=10, choices=STATUSES, default=PENDING, db_index=True
+    )
+    progress = models.JSONField(default=dict, blank=True)
+    error = models.TextField(blank=True, default="")
+    created = models.DateTimeField(auto_now_add=True)
+    updated = models.DateTimeField(auto_now=True)
+    finished = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ["id"]
+
+    @property
+    def rows_deleted(self):
+        return sum(self.progress.values())
+
+    def __str__(self):
+        return f"Delete {self.target_type} #{self.target_id} ({self.status})"
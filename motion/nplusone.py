@@ -0,0 +1,206 @@
+"""
+N+1 query detection.
+
+Every query executed inside ``detect_n_plus_one()`` is fingerprinted (see
+``motion.instrumentation.fingerprint_sql``). When the same query shape runs
+more than ``NPLUSONE_THRESHOLD`` times, the place in our own code that issued
+it is recorded, and on exit the findings are raised (``NPLUSONE_RAISE``, which
+motion.test_runner.TestRunner turns on) or logged as a warning. Nothing is
+recorded unless NPLUSONE_ENABLED.
+
+NPlusOneMiddleware covers every request and jobs.queue.run every job; the
+management commands wrap their ``handle`` with the same helper::
+
+    @detect_n_plus_one("import_users")
+    def handle(self, *args, **options):
+        ...
+
+Batch loops call ``checkpoint()`` after each batch, whose queries repeat by
+design, so that only repetition within one batch is reported.
+"""
+
+import logging
+import os
+import re
+import threading
+import traceback
+from collections import Counter
+from contextlib import ContextDecorator
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+
+from motion.instrumentation import (
+    add_query_observer,
+    fingerprint_sql,
+    remove_query_observer,
+)
+
+logger = logging.getLogger(__name__)
+
+_current_detector = ContextVar("motion_nplusone_detector", default=None)
+
+# Frames from these files are plumbing, never the origin of a query
+_IGNORED_FILES = tuple(
+    os.path.normpath(os.path.join(os.path.dirname(__file__), name))
+    for name in ("nplusone.py", "instrumentation.py", "middleware.py")
+)
+_ORM_DIR = os.path.join("django", "db", "")
+
+
+# Blocks being observed, in every thread; the query observer is registered
+# while there is any
+_active_blocks = 0
+_active_blocks_lock = threading.Lock()
+
+
+class NPlusOneError(Exception):
+    """Raised when repeated identical-shape queries are detected."""
+
+
+def _observe_query(sql, params, many, duration, context):
+    detector = _current_detector.get()
+    if detector is not None:
+        detector.record(sql)
+
+
+def _start_observing():
+    global _active_blocks
+    with _active_blocks_lock:
+        _active_blocks += 1
+        add_query_observer(_observe_query)
+
+
+def _stop_observing():
+    global _active_blocks
+    with _active_blocks_lock:
+        _active_blocks -= 1
+        if not _active_blocks:
+            remove_query_observer(_observe_query)
+
+
+def _query_origin():
+    """
+    Innermost stack frames that belong to this project, followed by the frame
+    that called into the ORM (often a DRF field when a serializer is lazy).
+    """
+    base_dir = str(settings.BASE_DIR)
+    stack = [
+        frame
+        for frame in traceback.extract_stack()
+        if os.path.normpath(frame.filename) not in _IGNORED_FILES
+    ]
+    own_frames = [
+        f"at {os.path.relpath(frame.filename, base_dir)}:{frame.lineno} in {frame.name}"
+        for frame in stack
+        if frame.filename.startswith(base_dir) and "site-packages" not in frame.filename
+    ]
+    orm_callers = [frame for frame in stack if _ORM_DIR not in frame.filename]
+    origin = own_frames[-3:]
+    if orm_callers:
+        caller = orm_callers[-1]
+        origin.append(f"via {caller.filename}:{caller.lineno} in {caller.name}")
+    return origin
+
+
+class NPlusOneDetector:
+    def __init__(self, label, threshold=None, allowlist=None):
+        self.label = label
+        self.threshold = settings.NPLUSONE_THRESHOLD if threshold is None else threshold
+        patterns = settings.NPLUSONE_ALLOWLIST if allowlist is None else allowlist
+        self.allowlist = [re.compile(pattern) for pattern in patterns]
+        self.counts = Counter()
+        self.origins = {}
+
+    def record(self, sql):
+        fingerprint = fingerprint_sql(sql)
+        self.counts[fingerprint] += 1
+        # Only pay for a stack walk once per offending query shape
+        if self.counts[fingerprint] == self.threshold + 1:
+            self.origins[fingerprint] = _query_origin()
+
+    def _is_allowed(self, fingerprint, origin):
+        return any(
+            pattern.search(candidate)
+            for pattern in self.allowlist
+            for candidate in [fingerprint, *origin]
+        )
+
+    def violations(self):
+        return [
+            (fingerprint, self.counts[fingerprint], origin)
+            for fingerprint, origin in self.origins.items()
+            if not self._is_allowed(fingerprint, origin)
+        ]
+
+    def checkpoint(self):
+        """Report what was found so far and start counting afresh."""
+        try:
+            self.report()
+        finally:
+            self.counts.clear()
+            self.origins.clear()
+
+    def report(self):
+        violations = self.violations()
+        if not violations:
+            return
+        lines = [f"Possible N+1 queries in {self.label}:"]
+        for fingerprint, count, origin in violations:
+            lines.append(f"  {count}x {fingerprint}")
+            lines.extend(f"      {frame}" for frame in origin)
+        message = "\n".join(lines)
+        if settings.NPLUSONE_RAISE:
+            raise NPlusOneError(message)
+        logger.warning(message)
+
+
+class detect_n_plus_one(ContextDecorator):
+    """Context manager / decorator that reports N+1 queries in its block."""
+
+    def __init__(self, label="block", threshold=None, allowlist=None):
+        self.label = label
+        self.threshold = threshold
+        self.allowlist = allowlist
+        self._tokens = []
+
+    def __enter__(self):
+        if not settings.NPLUSONE_ENABLED:
+            self._tokens.append(None)
+            return None
+        _start_observing()
+        detector = NPlusOneDetector(self.label, self.threshold, self.allowlist)
+        self._tokens.append(_current_detector.set(detector))
+        return detector
+
+    def __exit__(self, exc_type, exc, tb):
+        token = self._tokens.pop()
+        if token is None:
+            return False
+        detector = _current_detector.get()
+        _current_detector.reset(token)
+        _stop_observing()
+        if exc_type is None:
+            detector.report()
+        return False
+
+
+def checkpoint():
+    """Report the current block's findings so far; call it after each batch."""
+    detector = _current_detector.get()
+    if detector is not None:
+        detector.checkpoint()
+
+
+class NPlusOneMiddleware:
+    """Runs every request under ``detect_n_plus_one`` when NPLUSONE_ENABLED."""
+
+    def __init__(self, get_response):
+        if not getattr(settings, "NPLUSONE_ENABLED", False):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        with detect_n_plus_one(f"{request.method} {request.path}"):
+            return self.get_response(request)
@@ -0,0 +1,14 @@
+from rest_framework.pagination import CursorPagination
+
+
+class KeysetPagination(CursorPagination):
+    """
+    Cursor pages newest first (``?cursor=`` from the next/previous links,
+    ``?limit=`` up to 100). Each page is a range scan from the previous
+    position on the ordering's index, however deep the client pages.
+    """
+
+    ordering = "-created"
+    page_size = 20
+    page_size_query_param = "limit"
+    max_page_size = 100
@@ -0,0 +1,218 @@
+"""
+Opt-in profiling of individual requests.
+
+A request is profiled when any of these holds:
+
+* it carries an ``X-Profile-Token`` header signed with our SECRET_KEY
+  (``python manage.py profiling_token`` mints one),
+* it has ``?profile=1`` and its JWT belongs to a staff user (checked before
+  the profiler starts, so other clients cannot make the server profile),
+* it is picked by the random ``PROFILING_SAMPLE_RATE``.
+
+Profiles are written to ``PROFILING_DIR`` either as cProfile ``.prof`` dumps
+(``flameprof`` / ``snakeviz``) or as collapsed ``.folded`` stacks from the
+statistical sampler (``flamegraph.pl`` / speedscope). Admins list and download
+them through ``/backend/api/profiles/``.
+
+A process profiles one request at a time. cProfile cannot be enabled in two
+threads at once on Python 3.12+ (it is built on sys.monitoring), and one
+sampler's thread would skew another's timings, so a request asking for a
+profile while another request of the process is being profiled (gthread
+workers) runs unprofiled.
+"""
+
+import cProfile
+import logging
+import random
+import re
+import sys
+import threading
+from collections import Counter
+from datetime import UTC, datetime
+from pathlib import Path
+from time import perf_counter
+
+from django.conf import settings
+from django.core import signing
+from django.core.exceptions import MiddlewareNotUsed
+from rest_framework.exceptions import AuthenticationFailed
+
+from motion.authentication import JWTAuthenticationWithoutBearer
+
+logger = logging.getLogger(__name__)
+
+TOKEN_SALT = "motion.profiling"
+PROFILE_EXTENSIONS = (".prof", ".folded")
+
+# Held while a request of this process is being profiled
+_profiling = threading.Lock()
+
+
+def make_token():
+    return signing.dumps("profile", salt=TOKEN_SALT)
+
+
+def is_valid_token(token):
+    try:
+        signing.loads(token, salt=TOKEN_SALT, max_age=settings.PROFILING_TOKEN_MAX_AGE)
+    except signing.BadSignature:
+        return False
+    return True
+
+
+def is_staff_request(request):
+    """
+    Whether the request's JWT belongs to a staff user. This middleware runs
+    before DRF authenticates the request, so the token is checked here.
+    """
+    try:
+        authenticated = JWTAuthenticationWithoutBearer().authenticate(request)
+    except AuthenticationFailed:
+        return False
+    return authenticated is not None and authenticated[0].is_staff
+
+
+def profile_dir():
+    path = Path(settings.PROFILING_DIR)
+    path.mkdir(parents=True, exist_ok=True)
+    return path
+
+
+def list_profiles():
+    directory = Path(settings.PROFILING_DIR)
+    if not directory.is_dir():
+        return []
+    files = [p for p in directory.iterdir() if p.suffix in PROFILE_EXTENSIONS]
+    return sorted(files, key=lambda p: p.stat().st_mtime, reverse=True)
+
+
+def get_profile_path(name):
+    """Resolve a profile file name, refusing anything outside PROFILING_DIR."""
+    if "/" in name or "\\" in name or not name.endswith(PROFILE_EXTENSIONS):
+        return None
+    path = Path(settings.PROFILING_DIR) / name
+    return path if path.is_file() else None
+
+
+class CProfileProfiler:
+    extension = ".prof"
+
+    def __init__(self):
+        self.profile = cProfile.Profile()
+
+    def start(self):
+        self.profile.enable()
+
+    def stop(self):
+        self.profile.disable()
+
+    def save(self, path):
+        self.profile.dump_stats(path)
+
+
+class SamplingProfiler:
+    """
+    Statistical profiler: a helper thread samples the profiled thread's stack
+    every ``interval`` seconds and counts identical stacks.
+    """
+
+    extension = ".folded"
+
+    def __init__(self, interval=None):
+        self.interval = interval or settings.PROFILING_SAMPLE_INTERVAL
+        self.samples = Counter()
+        self._target = None
+        self._stopped = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self._target = threading.get_ident()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stopped.set()
+        self._thread.join()
+
+    def _run(self):
+        while not self._stopped.wait(self.interval):
+            frame = sys._current_frames().get(self._target)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(
+                    f"{code.co_name} ({code.co_filename}:{code.co_firstlineno})"
+                )
+                frame = frame.f_back
+            if stack:
+                self.samples[";".join(reversed(stack))] += 1
+
+    def save(self, path):
+        with open(path, "w") as out:
+            out.writelines(
+                f"{stack} {count}\n" for stack, count in self.samples.items()
+            )
+
+
+PROFILERS = {"cprofile": CProfileProfiler, "sampling": SamplingProfiler}
+
+
+class ProfilingMiddleware:
+    def __init__(self, get_response):
+        if not getattr(settings, "PROFILING_ENABLED", False):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.profiler_class = PROFILERS[settings.PROFILING_MODE]
+
+    def _requested_by(self, request):
+        token = request.headers.get("X-Profile-Token")
+        if token and is_valid_token(token):
+            return "token"
+        if request.GET.get("profile") == "1" and is_staff_request(request):
+            return "staff"
+        rate = settings.PROFILING_SAMPLE_RATE
+        if rate and random.random() < rate:
+            return "sample"
+        return None
+
+    def __call__(self, request):
+        reason = self._requested_by(request)
+        if reason is None:
+            return self.get_response(request)
+
+        if not _profiling.acquire(blocking=False):
+            logger.info(
+                "Not profiling %s %s (%s): another request is being profiled",
+                request.method,
+                request.path,
+                reason,
+            )
+            return self.get_response(request)
+        try:
+            profiler = self.profiler_class()
+            started = perf_counter()
+            profiler.start()
+            try:
+                response = self.get_response(request)
+            finally:
+                profiler.stop()
+        finally:
+            _profiling.release()
+        elapsed_ms = (perf_counter() - started) * 1000
+
+        slug = re.sub(r"[^A-Za-z0-9]+", "_", request.path).strip("_") or "root"
+        stamp = datetime.now(UTC).strftime("%Y%m%dT%H%M%S%f")
+        name = (
+            f"{stamp}-{request.method}-{slug[:80]}-{elapsed_ms:.0f}ms"
+            f"{profiler.extension}"
+        )
+        try:
+            profiler.save(profile_dir() / name)
+        except OSError:
+            logger.exception("Could not write profile %s", name)
+        else:
+            response["X-Profile-Name"] = name
+            logger.info(
+                "Saved %s profile %s (%s)", settings.PROFILING_MODE, name, reason
+            )
+        return response
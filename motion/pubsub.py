@@ -0,0 +1,177 @@
+"""
+Publish/subscribe for pushing events to open connections (see motion/sse.py).
+
+Messages are small JSON-able dicts published to named channels, e.g.
+``posts:<user id>`` when that user posts. Subscribers are asyncio tasks.
+Each subscription has one bounded queue and is registered under every
+channel it listens to, so an idle subscription costs a few set entries and
+a queue.
+
+``publish`` may be called from any thread. Call it after commit
+(``transaction.on_commit``), so listeners never see uncommitted rows.
+
+Backends (PUBSUB_BACKEND):
+
+``motion.pubsub.InProcessBroker``
+    Delivers to subscribers of the publishing process only: enough when one
+    ASGI process serves both the writes and the event streams.
+``motion.pubsub.PostgresBroker``
+    ``NOTIFY`` on one PostgreSQL channel (PUBSUB_PG_CHANNEL). Each process
+    with subscribers keeps a single ``LISTEN`` connection and fans the
+    notifications out locally, so any worker, WSGI or ASGI, reaches every
+    subscriber.
+"""
+
+import asyncio
+import json
+import logging
+import threading
+from collections import defaultdict
+
+from django.conf import settings
+from django.db import connection
+from django.utils.module_loading import import_string
+
+logger = logging.getLogger(__name__)
+
+# Wait between attempts to re-establish a lost LISTEN connection (seconds)
+RECONNECT_DELAY = 2
+
+
+class Subscription:
+    """One listener's queue; ``lagged`` is set when messages were dropped."""
+
+    __slots__ = ("channels", "lagged", "loop", "queue")
+
+    def __init__(self, loop, size):
+        self.channels = frozenset()
+        self.queue = asyncio.Queue(size)
+        self.loop = loop
+        self.lagged = False
+
+    def put(self, message):
+        # Runs in the subscriber's event loop
+        try:
+            self.queue.put_nowait(message)
+        except asyncio.QueueFull:
+            self.lagged = True
+
+    async def get(self, timeout):
+        """The next message, or None after ``timeout`` seconds."""
+        try:
+            return await asyncio.wait_for(self.queue.get(), timeout)
+        except TimeoutError:
+            return None
+
+
+class InProcessBroker:
+    def __init__(self):
+        self._subscriptions = defaultdict(set)
+        self._lock = threading.Lock()
+
+    def subscribe(self, channels):
+        """A subscription to ``channels``; call from the subscriber's event loop."""
+        subscription = Subscription(
+            asyncio.get_running_loop(), settings.PUBSUB_QUEUE_SIZE
+        )
+        self.resubscribe(subscription, channels)
+        return subscription
+
+    def resubscribe(self, subscription, channels):
+        """Make ``subscription`` listen to ``channels`` instead."""
+        channels = frozenset(channels)
+        with self._lock:
+            for channel in subscription.channels - channels:
+                self._remove(subscription, channel)
+            for channel in channels - subscription.channels:
+                self._subscriptions[channel].add(subscription)
+        subscription.channels = channels
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            for channel in subscription.channels:
+                self._remove(subscription, channel)
+        subscription.channels = frozenset()
+
+    def _remove(self, subscription, channel):
+        subscriptions = self._subscriptions[channel]
+        subscriptions.discard(subscription)
+        if not subscriptions:
+            del self._subscriptions[channel]
+
+    def publish(self, channel, message):
+        self.deliver(channel, message)
+
+    def deliver(self, channel, message):
+        """Hand ``message`` to this process's subscribers of ``channel``."""
+        with self._lock:
+            subscriptions = list(self._subscriptions.get(channel, ()))
+        for subscription in subscriptions:
+            try:
+                subscription.loop.call_soon_threadsafe(subscription.put, message)
+            except RuntimeError:
+                # Its event loop is closed; it is being unsubscribed
+                pass
+
+
+class PostgresBroker(InProcessBroker):
+    def __init__(self):
+        super().__init__()
+        self._listener = None
+
+    def subscribe(self, channels):
+        if self._listener is None or self._listener.done():
+            self._listener = asyncio.get_running_loop().create_task(self._listen())
+        return super().subscribe(channels)
+
+    def publish(self, channel, message):
+        payload = json.dumps({"channel": channel, "message": message})
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT pg_notify(%s, %s)", [settings.PUBSUB_PG_CHANNEL, payload]
+            )
+
+    async def _listen(self):
+        import psycopg
+        from psycopg import sql
+
+        params = connection.get_connection_params()
+        # Both only apply to Django's own (synchronous) connections
+        params.pop("cursor_factory", None)
+        params.pop("context", None)
+        while True:
+            try:
+                async with await psycopg.AsyncConnection.connect(
+                    **params, autocommit=True
+                ) as listener:
+                    await listener.execute(
+                        sql.SQL("LISTEN {}").format(
+                            sql.Identifier(settings.PUBSUB_PG_CHANNEL)
+                        )
+                    )
+                    async for notify in listener.notifies():
+                        event = json.loads(notify.payload)
+                        self.deliver(event["channel"], event["message"])
+            except (psycopg.Error, OSError):
+                logger.exception("Pub/sub LISTEN connection lost, reconnecting")
+                await asyncio.sleep(RECONNECT_DELAY)
+
+
+_broker = None
+_broker_lock = threading.Lock()
+
+
+def get_broker():
+    global _broker
+    with _broker_lock:
+        if _broker is None:
+            _broker = import_string(settings.PUBSUB_BACKEND)()
+        return _broker
+
+
+def publish(channel, message):
+    """Publish ``message``; a failure is logged, never raised into the write path."""
+    try:
+        get_broker().publish(channel, message)
+    except Exception:
+        logger.exception("Could not publish to %s", channel)
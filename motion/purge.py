@@ -0,0 +1,225 @@
+"""
+Background deletion of users and posts.
+
+Deleting a user in the request would cascade, in one transaction, over the
+profile, every post, their likes and images, and the follow rows. Instead the
+request only tombstones the row (``deleted_at``), which the default managers
+hide immediately, records a ``DeletionRequest`` and enqueues a purge job
+(``motion.tasks.purge_deletion``). The job worker, or ``python manage.py
+purge_deletions`` as a sweeper, then deletes the dependent rows in
+batches of PURGE_BATCH_SIZE, each in its own short transaction, updating the
+request's progress after every batch. Purging is idempotent: a request that
+was interrupted is simply run again.
+"""
+
+import logging
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from follow.models import Follow
+from image.models import Image
+from jobs.queue import enqueue
+from motion import nplusone
+from motion.models import DeletionRequest
+from notification import inbox
+from notification.models import Notification
+from post import changes, feed, hashtags
+from post.models import ChangeEvent, Like, Post, PostHashtag
+from user.models import User
+from user_profile import counters
+from user_profile.models import UserProfile
+
+logger = logging.getLogger(__name__)
+
+# A running request not updated for this long is assumed to be abandoned
+STALE_AFTER = timedelta(minutes=10)
+
+
+def request_deletion(obj, requested_by=None):
+    """Tombstone a User or Post and queue its purge."""
+    target_type = (
+        DeletionRequest.USER if isinstance(obj, User) else DeletionRequest.POST
+    )
+    with transaction.atomic():
+        tombstoned = (
+            type(obj)
+            .all_objects.filter(pk=obj.pk, deleted_at__isnull=True)
+            .update(deleted_at=timezone.now())
+        )
+        # A repeated request must not uncount twice
+        if tombstoned and target_type == DeletionRequest.POST:
+            counters.adjust(
+                UserProfile.objects.filter(pk=obj.user_id), -1, "posts_count"
+            )
+            changes.record(ChangeEvent.POST_DELETED, obj.user.user_id, post=obj.pk)
+        elif tombstoned:
+            counters.record_user_deleted(obj)
+            changes.record(ChangeEvent.USER_DELETED, obj.pk)
+        deletion = DeletionRequest.objects.create(
+            target_type=target_type,
+            target_id=obj.pk,
+            requested_by=requested_by if requested_by != obj else None,
+        )
+        # Drop the author's recent posts from the feed buffers
+        profile_id = (
+            obj.user_id
+            if isinstance(obj, Post)
+            else UserProfile.objects.filter(user=obj)
+            .values_list("id", flat=True)
+            .first()
+        )
+        transaction.on_commit(lambda: feed.invalidate(profile_id))
+        enqueue(
+            "motion.tasks.purge_deletion",
+            {"request_id": deletion.pk},
+            queue="maintenance",
+            idempotency_key=f"purge-deletion:{deletion.pk}",
+        )
+    return deletion
+
+
+def _delete_in_batches(request, label, queryset, batch_size, before_delete=None):
+    """
+    Delete ``queryset`` ``batch_size`` rows per transaction, calling
+    ``before_delete(ids)`` first in each.
+    """
+    model = queryset.model
+    while True:
+        ids = list(queryset.order_by("pk").values_list("pk", flat=True)[:batch_size])
+        if not ids:
+            return
+        with transaction.atomic():
+            if before_delete is not None:
+                before_delete(ids)
+            deleted, _ = model._base_manager.filter(pk__in=ids).delete()
+            request.progress[label] = request.progress.get(label, 0) + deleted
+            request.save(update_fields=["progress", "updated"])
+        logger.info(
+            "%s: deleted %s %s (%s total)",
+            request,
+            deleted,
+            label,
+            request.progress[label],
+        )
+        nplusone.checkpoint()
+
+
+def _purge_post(request, post_ids, batch_size):
+    likes = Like.objects.filter(post_id__in=post_ids)
+    _delete_in_batches(request, "likes", likes, batch_size)
+    _delete_in_batches(
+        request, "images", Image.objects.filter(post_id__in=post_ids), batch_size
+    )
+    _delete_in_batches(
+        request,
+        "hashtags",
+        PostHashtag.objects.filter(post_id__in=post_ids),
+        batch_size,
+        before_delete=hashtags.record_purged,
+    )
+    _delete_in_batches(
+        request,
+        "notifications",
+        Notification.objects.filter(post_id__in=post_ids),
+        batch_size,
+        before_delete=inbox.record_purged,
+    )
+    _delete_in_batches(
+        request, "posts", Post.all_objects.filter(pk__in=post_ids), batch_size
+    )
+
+
+def _purge_user(request, batch_size):
+    user_id = request.target_id
+    posts = Post.all_objects.filter(user__user_id=user_id)
+    # Post by post group, so each post's dependent rows go before the post
+    while True:
+        post_ids = list(posts.order_by("pk").values_list("pk", flat=True)[:batch_size])
+        if not post_ids:
+            break
+        _purge_post(request, post_ids, batch_size)
+        nplusone.checkpoint()
+    _delete_in_batches(
+        request,
+        "likes",
+        Like.objects.filter(user_id=user_id),
+        batch_size,
+    )
+    _delete_in_batches(
+        request,
+        "notifications",
+        Notification.objects.filter(recipient_id=user_id),
+        batch_size,
+    )
+    _delete_in_batches(
+        request,
+        "follows",
+        Follow.objects.filter(Q(follower_id=user_id) | Q(following_id=user_id)),
+        batch_size,
+        # Followers who sync later still learn that the follow ended
+        before_delete=changes.record_follows_purged,
+    )
+    with transaction.atomic():
+        # Only the leftovers remain: one short cascade
+        UserProfile.objects.filter(user_id=user_id).delete()
+        deleted, _ = User.all_objects.filter(pk=user_id).delete()
+        request.progress["users"] = request.progress.get("users", 0) + deleted
+        request.save(update_fields=["progress", "updated"])
+
+
+def purge(request, batch_size=None):
+    """Run one DeletionRequest to completion."""
+    batch_size = batch_size or settings.PURGE_BATCH_SIZE
+    try:
+        if request.target_type == DeletionRequest.USER:
+            _purge_user(request, batch_size)
+        else:
+            _purge_post(request, [request.target_id], batch_size)
+    except Exception as exc:
+        logger.exception("%s failed", request)
+        request.status = DeletionRequest.FAILED
+        request.error = str(exc)
+        request.save(update_fields=["status", "error", "updated"])
+        raise
+    request.status = DeletionRequest.DONE
+    request.finished = timezone.now()
+    request.save(update_fields=["status", "finished", "updated"])
+    logger.info("%s: %s rows deleted", request, request.rows_deleted)
+
+
+def claim(request_id):
+    """Mark a pending, failed or abandoned request as running; False if taken."""
+    claimable = Q(status__in=[DeletionRequest.PENDING, DeletionRequest.FAILED]) | Q(
+        status=DeletionRequest.RUNNING, updated__lt=timezone.now() - STALE_AFTER
+    )
+    return bool(
+        DeletionRequest.objects.filter(claimable, pk=request_id).update(
+            status=DeletionRequest.RUNNING, updated=timezone.now()
+        )
+    )
+
+
+def purge_pending(batch_size=None):
+    """
+    Purge every pending (or abandoned) request, e.g. when no job worker is
+    running; returns the number of requests processed.
+    """
+    processed = 0
+    for request_id in DeletionRequest.objects.filter(
+        status__in=[DeletionRequest.PENDING, DeletionRequest.RUNNING]
+    ).values_list("pk", flat=True):
+        if not claim(request_id):
+            continue
+        try:
+            purge(DeletionRequest.objects.get(pk=request_id), batch_size)
+        except Exception:  # noqa: BLE001, S112
+            # Already logged and marked as failed; carry on with the others
+            continue
+        finally:
+            nplusone.checkpoint()
+        processed += 1
+    return processed
@@ -0,0 +1,39 @@
+from django.conf import settings
+from rest_framework import serializers
+from rest_framework.serializers import ModelSerializer
+
+from motion.models import DeletionRequest
+
+
+class DeletionRequestSerializer(ModelSerializer):
+    class Meta:
+        model = DeletionRequest
+        fields = [
+            "id",
+            "target_type",
+            "target_id",
+            "status",
+            "progress",
+            "rows_deleted",
+            "error",
+            "created",
+            "updated",
+            "finished",
+        ]
+        read_only_fields = fields
+
+
+class SubRequestSerializer(serializers.Serializer):
+    method = serializers.ChoiceField(choices=["GET", "POST"])
+    url = serializers.RegexField(
+        r"^/[^/]", help_text="e.g. /backend/api/posts/?limit=10"
+    )
+    body = serializers.JSONField(required=False, default=None)
+
+
+class BatchRequestSerializer(serializers.Serializer):
+    requests = serializers.ListField(
+        child=SubRequestSerializer(),
+        min_length=1,
+        max_length=settings.BATCH_MAX_REQUESTS,
+    )
@@ -1,6 +1,7 @@
+import json
 from datetime import timedelta
 from pathlib import Path
-from typing import Any, Dict, cast
+from typing import Any, cast
 
 import dj_database_url
 from decouple import config
@@ -65,12 +66,21 @@ INSTALLED_APPS = [
     "follow",
     "post",
     "image",
+    "analytics",
+    "jobs",
+    "notification",
     # Third party apps
     "rest_framework",
     "drf_yasg",
 ]
 
 MIDDLEWARE = [
+    "motion.middleware.ServerTimingMiddleware",
+    "motion.middleware.PrometheusMetricsMiddleware",
+    "motion.nplusone.NPlusOneMiddleware",
+    "motion.profiling.ProfilingMiddleware",
+    "motion.slow_queries.SlowQueryMiddleware",
+    "motion.db_router.ReplicaRoutingMiddleware",
     "django.middleware.security.SecurityMiddleware",
     "whitenoise.middleware.WhiteNoiseMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
@@ -83,6 +93,60 @@ MIDDLEWARE = [
 
 ROOT_URLCONF = "motion.urls"
 
+# Runs the tests with N+1 query detection raising (see motion/test_runner.py)
+TEST_RUNNER = "motion.test_runner.TestRunner"
+
+# Per-request query count / SQL / serialization / render timings, reported in the
+# Server-Timing response header and as a JSON line on the "motion.performance" logger
+PERFORMANCE_INSTRUMENTATION = config(
+    "PERFORMANCE_INSTRUMENTATION", default=True, cast=bool
+)
+
+# N+1 query detection: flag a request, job or management command (or a block wrapped
+# in motion.nplusone.detect_n_plus_one) that runs the same query shape more than
+# NPLUSONE_THRESHOLD times. Logs a warning in DEBUG; the test runner (TEST_RUNNER)
+# turns it on and makes it raise.
+# NPLUSONE_ALLOWLIST holds regexes matched against the SQL fingerprint and the
+# "at path.py:line in func" origin of intentional cases.
+NPLUSONE_ENABLED = config("NPLUSONE_ENABLED", default=DEBUG, cast=bool)
+NPLUSONE_RAISE = config("NPLUSONE_RAISE", default=False, cast=bool)
+NPLUSONE_THRESHOLD = config("NPLUSONE_THRESHOLD", default=5, cast=int)
+NPLUSONE_ALLOWLIST = [
+    # Django's own bookkeeping tables (migrations, sessions, permissions)
+    r'"django_',
+    r'"auth_permission"',
+]
+
+# Slow-query log: statements slower than this (0 disables) are logged with their
+# plan and kept in the SlowQuery admin, which holds the newest SLOW_QUERY_LOG_SIZE.
+SLOW_QUERY_THRESHOLD_MS = config("SLOW_QUERY_THRESHOLD_MS", default=200, cast=float)
+SLOW_QUERY_LOG_SIZE = config("SLOW_QUERY_LOG_SIZE", default=500, cast=int)
+
+# Opt-in request profiling (see motion/profiling.py), off unless PROFILING_ENABLED:
+# signed X-Profile-Token header, ?profile=1 with a staff user's JWT, or a random
+# sample of PROFILING_SAMPLE_RATE (0.0-1.0).
+# PROFILING_MODE is "sampling" (collapsed .folded stacks) or "cprofile" (.prof dumps).
+PROFILING_ENABLED = config("PROFILING_ENABLED", default=False, cast=bool)
+PROFILING_MODE = config("PROFILING_MODE", default="sampling")
+PROFILING_SAMPLE_RATE = config("PROFILING_SAMPLE_RATE", default=0.0, cast=float)
+PROFILING_SAMPLE_INTERVAL = config(
+    "PROFILING_SAMPLE_INTERVAL", default=0.002, cast=float
+)
+PROFILING_TOKEN_MAX_AGE = config("PROFILING_TOKEN_MAX_AGE", default=3600, cast=int)
+PROFILING_DIR = config("PROFILING_DIR", default=str(BASE_DIR / "profiles"))
+
+# Prometheus metrics served at /metrics. Workers share samples through
+# PROMETHEUS_MULTIPROC_DIR (set up in gunicorn.conf.py). The endpoint only answers
+# direct requests from these addresses/networks, never proxied ones.
+METRICS_ENABLED = config("METRICS_ENABLED", default=True, cast=bool)
+METRICS_ALLOWED_IPS = [
+    ip.strip()
+    for ip in cast(
+        str, config("METRICS_ALLOWED_IPS", default="127.0.0.1,::1", cast=str)
+    ).split(",")
+    if ip.strip()
+]
+
 TEMPLATES = [
     {
         "BACKEND": "django.template.backends.django.DjangoTemplates",
@@ -103,16 +167,13 @@ WSGI_APPLICATION = "motion.wsgi.application"
 
 
 # Database - Use PostgreSQL in production
-_database_url = config("DATABASE_URL", default=None)
-if _database_url:
+def _database_config(url):
     # Parse database URL and add SSL requirements for cloud databases
-    db_config = cast(
-        Dict[str, Any], dj_database_url.config(default=cast(str, _database_url))
-    )
+    db_config = cast(dict[str, Any], dj_database_url.parse(url))
     # Add SSL requirement for PostgreSQL (required by Render, Heroku, etc.)
     if db_config.get("ENGINE") == "django.db.backends.postgresql":
         # Configure SSL for PostgreSQL connections
-        options: Dict[str, Any] = db_config.get("OPTIONS", {}) or {}
+        options: dict[str, Any] = db_config.get("OPTIONS", {}) or {}
         # Only require SSL in production (local Docker doesn't support SSL)
         # In development, use prefer (will use SSL if available, but won't fail if not)
         if not DEBUG:
@@ -137,7 +198,12 @@ if _database_url:
                 options["options"] = search_path_option
 
         db_config["OPTIONS"] = options
-    DATABASES = {"default": db_config}
+    return db_config
+
+
+_database_url = config("DATABASE_URL", default=None)
+if _database_url:
+    DATABASES = {"default": _database_config(cast(str, _database_url))}
 else:
     # Development: SQLite3
     DATABASES = {
@@ -147,6 +213,25 @@ else:
         }
     }
 
+# Read replicas (see motion/db_router.py): safe-method requests to the views of
+# REPLICA_READ_APPS read from a replica, except for REPLICA_PIN_SECONDS after the user's
+# last write; a replica that fails to connect is skipped for REPLICA_RETRY_SECONDS.
+_replica_urls = cast(str, config("DATABASE_REPLICA_URLS", default=""))
+DATABASE_REPLICAS = []
+for _index, _url in enumerate(
+    filter(None, map(str.strip, _replica_urls.split(","))), 1
+):
+    DATABASES[f"replica_{_index}"] = {
+        **_database_config(_url),
+        "TEST": {"MIRROR": "default"},
+    }
+    DATABASE_REPLICAS.append(f"replica_{_index}")
+DATABASE_ROUTERS = ["motion.db_router.ReplicaRouter"]
+REPLICA_READ_APPS = ["post", "follow", "user"]
+REPLICA_PIN_SECONDS = config("REPLICA_PIN_SECONDS", default=5, cast=float)
+REPLICA_RETRY_SECONDS = config("REPLICA_RETRY_SECONDS", default=30, cast=float)
+REPLICA_PIN_DB = config("REPLICA_PIN_DB", default="/tmp/motion-replica-pins.sqlite3")
+
 
 # Password validation
 # https://docs.djangoproject.com/en/6.0/ref/settings/#auth-password-validators
@@ -166,6 +251,133 @@ AUTH_PASSWORD_VALIDATORS = [
     },
 ]
 
+# Background job queue in the database (see jobs/queue.py, run by `manage.py run_jobs`):
+# retries wait JOB_RETRY_BACKOFF * 2^(attempt-1) seconds up to JOB_RETRY_BACKOFF_MAX, a
+# job locked longer than JOB_LOCK_TIMEOUT seconds is assumed abandoned and run again.
+JOB_MAX_ATTEMPTS = config("JOB_MAX_ATTEMPTS", default=5, cast=int)
+JOB_RETRY_BACKOFF = config("JOB_RETRY_BACKOFF", default=10, cast=float)
+JOB_RETRY_BACKOFF_MAX = config("JOB_RETRY_BACKOFF_MAX", default=3600, cast=float)
+JOB_LOCK_TIMEOUT = config("JOB_LOCK_TIMEOUT", default=600, cast=int)
+JOB_POLL_INTERVAL = config("JOB_POLL_INTERVAL", default=1.0, cast=float)
+JOB_RETENTION_DAYS = config("JOB_RETENTION_DAYS", default=7, cast=int)
+# Port on which `manage.py run_jobs` serves its Prometheus metrics (0: not served)
+JOB_METRICS_PORT = config("JOB_METRICS_PORT", default=0, cast=int)
+
+# Deleted users/posts are tombstoned and purged by a background job (or by `manage.py
+# purge_deletions`), PURGE_BATCH_SIZE rows per transaction (see motion/purge.py)
+PURGE_BATCH_SIZE = config("PURGE_BATCH_SIZE", default=500, cast=int)
+
+# /backend/api/batch/: sub-requests per batch, and threads running batched GETs
+# concurrently (see motion/batch.py)
+BATCH_MAX_REQUESTS = config("BATCH_MAX_REQUESTS", default=20, cast=int)
+BATCH_WORKERS = config("BATCH_WORKERS", default=4, cast=int)
+
+# Caches. "feeds" holds the per-author recent-post buffers of the merge feed engine
+# (see post/feed.py). The default is per-process memory, where a new post only refreshes
+# its author's buffer in the worker that saved it and FEED_BUFFER_TTL bounds staleness
+# elsewhere; point FEED_CACHE_BACKEND/FEED_CACHE_LOCATION at a shared cache
+# (e.g. django.core.cache.backends.redis.RedisCache) to share buffers between workers.
+_feed_cache_backend = config(
+    "FEED_CACHE_BACKEND", default="django.core.cache.backends.locmem.LocMemCache"
+)
+CACHES = {
+    "default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"},
+    "feeds": {
+        "BACKEND": _feed_cache_backend,
+        "LOCATION": config("FEED_CACHE_LOCATION", default="feeds"),
+        "TIMEOUT": config("FEED_BUFFER_TTL", default=60, cast=int),
+    },
+}
+if _feed_cache_backend.endswith(".LocMemCache"):
+    # One entry per followed author; the default of 300 would thrash
+    CACHES["feeds"]["OPTIONS"] = {"MAX_ENTRIES": 100_000}
+# Newest post ids kept per author, and the feed page size (?limit= up to FEED_PAGE_MAX)
+FEED_BUFFER_SIZE = config("FEED_BUFFER_SIZE", default=100, cast=int)
+FEED_PAGE_SIZE = config("FEED_PAGE_SIZE", default=50, cast=int)
+FEED_PAGE_MAX = 100
+
+# User autocomplete (/users/search/, see user/search.py): shortest query, rows read per
+# kind of match, and result count (?limit= up to USER_SEARCH_MAX_LIMIT)
+USER_SEARCH_MIN_LENGTH = config("USER_SEARCH_MIN_LENGTH", default=2, cast=int)
+USER_SEARCH_CANDIDATES = config("USER_SEARCH_CANDIDATES", default=1000, cast=int)
+USER_SEARCH_LIMIT = 10
+USER_SEARCH_MAX_LIMIT = 50
+
+# Pub/sub behind the /posts/events/ stream (see motion/pubsub.py and motion/sse.py):
+# "motion.pubsub.InProcessBroker" for a single process, or
+# "motion.pubsub.PostgresBroker" (LISTEN/NOTIFY on PUBSUB_PG_CHANNEL) for several
+# workers. On PostgreSQL the default is PostgresBroker: the WSGI workers saving posts
+# and the ASGI workers holding the streams are separate processes.
+PUBSUB_BACKEND = config(
+    "PUBSUB_BACKEND",
+    default="motion.pubsub.PostgresBroker"
+    if DATABASES["default"]["ENGINE"] == "django.db.backends.postgresql"
+    else "motion.pubsub.InProcessBroker",
+)
+PUBSUB_PG_CHANNEL = config("PUBSUB_PG_CHANNEL", default="motion_events")
+# Events buffered per open stream before it is sent a reset, and the keep-alive interval
+PUBSUB_QUEUE_SIZE = config("PUBSUB_QUEUE_SIZE", default=100, cast=int)
+SSE_HEARTBEAT_SECONDS = config("SSE_HEARTBEAT_SECONDS", default=15, cast=float)
+
+# Delta sync (/posts/changes/, see post/changes.py): events per response, how long new
+# events are held back so that concurrent transactions commit first, and how long
+# events are kept (`manage.py prune_changes`)
+CHANGES_PAGE_SIZE = config("CHANGES_PAGE_SIZE", default=500, cast=int)
+CHANGES_SETTLE_SECONDS = config("CHANGES_SETTLE_SECONDS", default=1.0, cast=float)
+CHANGES_RETENTION_DAYS = config("CHANGES_RETENTION_DAYS", default=30, cast=int)
+
+# Engagement rollups (see analytics/rollups.py): rows younger than this are left for the
+# next run, so that transactions holding earlier ids have committed first. Likes and
+# follows are read from the change log, so the job must run within
+# CHANGES_RETENTION_DAYS.
+ROLLUP_SETTLE_SECONDS = config("ROLLUP_SETTLE_SECONDS", default=60.0, cast=float)
+
+# Hashtags (see post/hashtags.py): the top tags (/posts/tags/top/, ?limit= up to
+# HASHTAG_TOP_MAX) count the posts of the last HASHTAG_TOP_HOURS hours and are
+# recomputed every HASHTAG_TOP_CACHE_SECONDS
+HASHTAG_TOP_HOURS = config("HASHTAG_TOP_HOURS", default=24, cast=int)
+HASHTAG_TOP_CACHE_SECONDS = config("HASHTAG_TOP_CACHE_SECONDS", default=60, cast=float)
+HASHTAG_TOP_LIMIT = 10
+HASHTAG_TOP_MAX = 50
+
+# Notifications marked read by one /notifications/read/ call (see notification/inbox.py)
+NOTIFICATION_MARK_READ_MAX = 100
+
+# Trending posts: likes count TRENDING_LIKE_WEIGHT times as much as the post itself (0:
+# not at all) and every contribution halves every TRENDING_HALF_LIFE_HOURS (see
+# post/trending.py)
+TRENDING_HALF_LIFE_HOURS = config("TRENDING_HALF_LIFE_HOURS", default=12, cast=float)
+TRENDING_LIKE_WEIGHT = config("TRENDING_LIKE_WEIGHT", default=1.0, cast=float)
+
+# Password hashing: PASSWORD_HASHER picks the hasher for new hashes (pbkdf2, argon2,
+# bcrypt or scrypt; argon2/bcrypt need argon2-cffi/bcrypt installed). The others stay
+# listed so existing hashes still verify and get upgraded on login.
+_PASSWORD_HASHER_CHOICES = {
+    "pbkdf2": "motion.hashing.TunablePBKDF2PasswordHasher",
+    "argon2": "django.contrib.auth.hashers.Argon2PasswordHasher",
+    "bcrypt": "django.contrib.auth.hashers.BCryptSHA256PasswordHasher",
+    "scrypt": "django.contrib.auth.hashers.ScryptPasswordHasher",
+}
+_password_hasher = _PASSWORD_HASHER_CHOICES[config("PASSWORD_HASHER", default="pbkdf2")]
+PASSWORD_HASHERS = [_password_hasher] + [
+    hasher
+    for hasher in [
+        *_PASSWORD_HASHER_CHOICES.values(),
+        "django.contrib.auth.hashers.PBKDF2SHA1PasswordHasher",
+    ]
+    if hasher != _password_hasher
+]
+# PBKDF2 iterations (0: Django's default)
+PASSWORD_HASH_ITERATIONS = config("PASSWORD_HASH_ITERATIONS", default=0, cast=int)
+
+# Logins and registrations hash on a bounded pool per worker process (see
+# motion/hashing.py); when workers + queue are busy the request gets a fast 503.
+AUTHENTICATION_BACKENDS = ["motion.hashing.PooledModelBackend"]
+PASSWORD_HASHING_EXECUTOR = config("PASSWORD_HASHING_EXECUTOR", default="thread")
+PASSWORD_HASHING_WORKERS = config("PASSWORD_HASHING_WORKERS", default=2, cast=int)
+PASSWORD_HASHING_QUEUE = config("PASSWORD_HASHING_QUEUE", default=4, cast=int)
+PASSWORD_HASHING_TIMEOUT = config("PASSWORD_HASHING_TIMEOUT", default=10, cast=float)
+
 # user should be the name of your app, User should be the name of your model
 AUTH_USER_MODEL = "user.User"
 
@@ -189,16 +401,56 @@ STATIC_URL = "/static/"
 STATIC_ROOT = BASE_DIR / "staticfiles"
 STATICFILES_STORAGE = "whitenoise.storage.CompressedManifestStaticFilesStorage"
 
+# Uploaded images (see image/storage.py); originals are stored once per SHA-256
+MEDIA_URL = "/media/"
+MEDIA_ROOT = config("MEDIA_ROOT", default=str(BASE_DIR / "media"))
+IMAGE_UPLOAD_MAX_BYTES = config("IMAGE_UPLOAD_MAX_BYTES", default=10_485_760, cast=int)
+IMAGE_UPLOAD_MAX_FILES = config("IMAGE_UPLOAD_MAX_FILES", default=10, cast=int)
+IMAGE_UPLOAD_CHUNK_SIZE = 64 * 1024
+# Resized WebP variants rendered by the "images" job queue on a process pool:
+# name -> longest side in pixels
+IMAGE_VARIANTS = {"thumbnail": 160, "small": 480, "medium": 1080}
+IMAGE_VARIANT_QUALITY = config("IMAGE_VARIANT_QUALITY", default=80, cast=int)
+IMAGE_PROCESSING_WORKERS = config("IMAGE_PROCESSING_WORKERS", default=2, cast=int)
+# `manage.py prune_media` deletes files no upload committed once they are this old
+IMAGE_ORPHAN_GRACE_SECONDS = config(
+    "IMAGE_ORPHAN_GRACE_SECONDS", default=3600, cast=int
+)
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/4.2/ref/settings/#default-auto-field
 
 DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"
 
+# Rate limits as "N/period" (s, min, hour, day), kept in token buckets in a SQLite file
+# shared by the workers of a host (see motion/throttling.py). "anon" applies per IP to
+# anonymous requests, "user" to every request, the others to views with that
+# throttle_scope.
+THROTTLE_DB = config("THROTTLE_DB", default="/tmp/motion-throttle.sqlite3")
+THROTTLE_RATES = {
+    "anon": config("THROTTLE_RATE_ANON", default="100/min"),
+    "user": config("THROTTLE_RATE_USER", default="1000/min"),
+    "likes": config("THROTTLE_RATE_LIKES", default="120/min"),
+    "login": config("THROTTLE_RATE_LOGIN", default="10/min"),
+}
+# Per-user overrides as JSON, e.g. {"42": {"likes": "600/min", "user": null}} (null: no
+# limit)
+THROTTLE_USER_RATES = config("THROTTLE_USER_RATES", default="{}", cast=json.loads)
+
 REST_FRAMEWORK = {
     "DEFAULT_AUTHENTICATION_CLASSES": [
         "motion.authentication.JWTAuthenticationWithoutBearer",
     ],
     "DEFAULT_PERMISSION_CLASSES": ("rest_framework.permissions.IsAuthenticated",),
+    "DEFAULT_THROTTLE_CLASSES": [
+        "motion.throttling.SharedAnonRateThrottle",
+        "motion.throttling.SharedUserRateThrottle",
+        "motion.throttling.SharedScopedRateThrottle",
+    ],
+    "DEFAULT_THROTTLE_RATES": THROTTLE_RATES,
+    # Proxies in front of the app (the host nginx). Clients are identified by the
+    # X-Forwarded-For entry the last proxy appended, not by what the client sent.
+    "NUM_PROXIES": config("NUM_PROXIES", default=1, cast=int),
 }
 
 
@@ -0,0 +1,172 @@
+"""
+Slow-query log.
+
+Statements slower than SLOW_QUERY_THRESHOLD_MS are logged on the
+"motion.slow_queries" logger together with their fingerprint, parameters,
+the view (or management command) that ran them and the query plan
+(``EXPLAIN (ANALYZE off)`` on PostgreSQL, ``EXPLAIN QUERY PLAN`` on SQLite).
+
+The plan is captured right after the statement, from inside the execute
+wrapper, on a short-lived connection of its own: the caller has not fetched
+the statement's results yet (e.g. ``INSERT ... RETURNING`` on SQLite), and
+its transaction may be broken or about to roll back.
+
+Each entry is also stored as a ``SlowQuery`` row; the table is pruned to the
+newest SLOW_QUERY_LOG_SIZE rows so it behaves like a ring buffer, and can be
+browsed in the Django admin. Rows are queued on the connection and written
+once it is outside any transaction (before its next statement, at the end of
+the request in SlowQueryMiddleware, or when the process exits), so an entry
+survives the rollback of the transaction that ran the slow statement.
+"""
+
+import atexit
+import json
+import logging
+import sys
+from time import perf_counter
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, DatabaseError, connections, transaction
+
+from motion.instrumentation import (
+    add_execute_wrapper,
+    current_metrics,
+    fingerprint_sql,
+    is_untracked,
+    untracked,
+)
+
+logger = logging.getLogger(__name__)
+
+EXPLAIN_PREFIXES = {
+    "postgresql": "EXPLAIN (ANALYZE off) ",
+    "sqlite": "EXPLAIN QUERY PLAN ",
+}
+EXPLAINABLE = ("SELECT", "INSERT", "UPDATE", "DELETE", "WITH")
+MAX_PARAMS_LENGTH = 2000
+
+
+def _caller():
+    metrics = current_metrics()
+    if metrics is not None and metrics.view_name:
+        return metrics.view_name
+    if len(sys.argv) > 1 and sys.argv[0].endswith("manage.py"):
+        return f"manage.py {sys.argv[1]}"
+    return ""
+
+
+def explain(connection, sql, params):
+    """
+    Return the plan for ``sql`` as text, or "" when it cannot be explained.
+    Runs on a new connection to ``connection``'s database, outside of its
+    transaction.
+    """
+    prefix = EXPLAIN_PREFIXES.get(connection.vendor)
+    if prefix is None or not sql.lstrip().upper().startswith(EXPLAINABLE):
+        return ""
+    explainer = connections.create_connection(connection.alias)
+    try:
+        with explainer.cursor() as cursor:
+            cursor.execute(prefix + sql, params)
+            rows = cursor.fetchall()
+    finally:
+        explainer.close()
+    if connection.vendor == "sqlite":
+        # (id, parent, notused, detail)
+        return "\n".join(str(row[-1]) for row in rows)
+    return "\n".join(str(row[0]) for row in rows)
+
+
+def slow_query_execute(execute, sql, params, many, context):
+    """Execute wrapper that captures statements above the threshold."""
+    if is_untracked():
+        return execute(sql, params, many, context)
+
+    connection = context["connection"]
+    flush(connection)
+
+    start = perf_counter()
+    result = execute(sql, params, many, context)
+    duration_ms = (perf_counter() - start) * 1000
+    if duration_ms >= settings.SLOW_QUERY_THRESHOLD_MS:
+        with untracked():
+            entry = _capture(connection, sql, params, many, duration_ms)
+        connection.__dict__.setdefault("_slow_queries", []).append(entry)
+    return result
+
+
+def flush(connection):
+    """
+    Store the slow statements queued on ``connection``, unless it or the
+    default connection (which stores them) is in a transaction.
+    """
+    pending = getattr(connection, "_slow_queries", None)
+    if (
+        not pending
+        or connection.in_atomic_block
+        or connections[DEFAULT_DB_ALIAS].in_atomic_block
+    ):
+        return
+    connection._slow_queries = []
+    with untracked():
+        _store(pending)
+
+
+def flush_all():
+    for connection in connections.all(initialized_only=True):
+        flush(connection)
+
+
+def _capture(connection, sql, params, many, duration_ms):
+    """Explain and log one slow statement; returns the SlowQuery fields."""
+    entry = {
+        "database": connection.alias,
+        "duration_ms": round(duration_ms, 2),
+        "fingerprint": fingerprint_sql(sql),
+        "sql": sql,
+        "params": repr(params)[:MAX_PARAMS_LENGTH],
+        "view": _caller(),
+        "plan": "",
+    }
+    if not many:
+        try:
+            entry["plan"] = explain(connection, sql, params)
+        except DatabaseError as exc:
+            entry["plan"] = f"EXPLAIN failed: {exc}"
+    logger.warning(json.dumps(entry))
+    return entry
+
+
+def _store(entries):
+    from motion.models import SlowQuery
+
+    # A savepoint keeps a failed insert from breaking an outer transaction
+    # (e.g. while migrations have not created the table yet).
+    try:
+        with transaction.atomic(using=DEFAULT_DB_ALIAS):
+            rows = SlowQuery.objects.using(DEFAULT_DB_ALIAS).bulk_create(
+                SlowQuery(**entry) for entry in entries
+            )
+            SlowQuery.objects.using(DEFAULT_DB_ALIAS).filter(
+                id__lte=max(row.id for row in rows) - settings.SLOW_QUERY_LOG_SIZE
+            ).delete()
+    except DatabaseError as exc:
+        logger.warning("Could not store slow queries: %s", exc)
+
+
+def install():
+    add_execute_wrapper(slow_query_execute)
+    # Management commands and scripts: capture whatever is still queued
+    atexit.register(flush_all)
+
+
+class SlowQueryMiddleware:
+    """Captures slow statements queued during the request before it returns."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        response = self.get_response(request)
+        flush_all()
+        return response
@@ -0,0 +1,216 @@
+"""
+Sparse fieldsets: ``?fields=`` and ``?expand=`` on read endpoints.
+
+``fields`` lists the fields to render, dotted for nested objects
+(``fields=id,content,user.avatar,user.user.username``); a nested object named
+without sub-fields keeps all of its fields. ``expand`` lists the nested
+objects to embed; any other nested object is rendered as its id. Without
+``expand`` every selected nested object is embedded, and without either
+parameter the output is unchanged.
+
+The queryset is derived from the trimmed serializer: ``only()`` the columns
+that are rendered, ``select_related`` / ``prefetch_related`` only the
+relations that are embedded, and the annotations of fields that are kept.
+Serializers describe what their non-model fields need with these attributes:
+
+``sparse_requires``
+    ``{field: [model paths]}`` loaded when the field is rendered, e.g.
+    ``{"trending": ["trending_score"]}`` or ``{"variants": ["blob"]}``.
+``sparse_querysets``
+    ``{field: queryset method}`` applied when a top-level field is rendered,
+    e.g. ``{"likes_count": "with_likes_count"}``.
+``expandable_fields``
+    ``{field: serializer class}`` for relations rendered as an id by default
+    and embedded with that serializer when expanded.
+"""
+
+from django.core.exceptions import FieldDoesNotExist
+from django.db.models import Prefetch
+from rest_framework.relations import ManyRelatedField, PrimaryKeyRelatedField
+from rest_framework.serializers import BaseSerializer, ListSerializer
+
+
+def parse_fields(value):
+    """``"id,user.avatar"`` -> ``{"id": {}, "user": {"avatar": {}}}``."""
+    tree = {}
+    for path in filter(None, (part.strip() for part in value.split(","))):
+        node = tree
+        for name in path.split("."):
+            node = node.setdefault(name, {})
+    return tree
+
+
+def parse_expand(value):
+    """``"user,user.user"`` -> ``{"user", "user.user"}``."""
+    return {part.strip() for part in value.split(",") if part.strip()}
+
+
+def _nested(field):
+    return field.child if isinstance(field, ListSerializer) else field
+
+
+def trim(serializer, fields=None, expand=None, path=""):
+    """Drop unrequested fields and collapse unexpanded nested serializers."""
+    serializer = _nested(serializer)
+    expandable = getattr(serializer, "expandable_fields", {})
+    for name in list(serializer.fields):
+        if fields and name not in fields:
+            del serializer.fields[name]
+            continue
+        field = serializer.fields[name]
+        dotted = path + name
+        subfields = fields.get(name) if fields else None
+        wanted = bool(subfields) or expand is None or dotted in expand
+        if name in expandable and (subfields or (expand and dotted in expand)):
+            # Rendered as an id by default, embedded on request
+            field = expandable[name](read_only=True)
+            serializer.fields[name] = field
+        if not isinstance(_nested(field), BaseSerializer):
+            continue
+        if wanted:
+            trim(field, subfields, expand, dotted + ".")
+        else:
+            serializer.fields[name] = PrimaryKeyRelatedField(
+                read_only=True,
+                many=isinstance(field, ListSerializer),
+                **({} if field.source == name else {"source": field.source}),
+            )
+
+
+class _Plan:
+    def __init__(self):
+        self.only = []
+        self.select = []
+        self.prefetch = []
+        self.methods = []
+
+
+def _plan_path(model, path, prefix, plan):
+    """Load a model path (a column or a relation) named in sparse_requires."""
+    relations = []
+    for name in path.split("__"):
+        field = model._meta.get_field(name)
+        if not field.is_relation:
+            break
+        relations.append(name)
+        model = field.related_model
+    if relations:
+        # "profile__posts_count" joins profile and loads just that column
+        plan.select.append(prefix + "__".join(relations))
+    plan.only.append(prefix + path)
+
+
+def _plan_serializer(serializer, model, prefix, plan, top_level, parent=None):
+    """
+    Add what ``serializer`` renders of ``model`` (at ``prefix``) to ``plan``.
+    ``parent`` is ``(one-to-one field, model, prefix)`` of the row this one
+    was joined from.
+    """
+    requires = getattr(serializer, "sparse_requires", {})
+    querysets = getattr(serializer, "sparse_querysets", {})
+    for name, field in serializer.fields.items():
+        if field.write_only:
+            continue
+        for path in requires.get(name, []):
+            _plan_path(model, path, prefix, plan)
+        if top_level and name in querysets:
+            plan.methods.append(querysets[name])
+        if field.source == "*":
+            continue
+        attr = field.source.split(".")[0]
+        try:
+            model_field = model._meta.get_field(attr)
+        except FieldDoesNotExist:
+            # A property or method; its needs are declared in sparse_requires
+            continue
+        path = prefix + attr
+        nested = _nested(field)
+        if (
+            parent is not None
+            and isinstance(nested, BaseSerializer)
+            and model_field.remote_field is parent[0]
+        ):
+            # A back-path (users' profile.user): select_related caches the
+            # parent row there, so its columns are loaded on the parent
+            _plan_serializer(nested, parent[1], parent[2], plan, False)
+            continue
+        if model_field.many_to_many or model_field.one_to_many:
+            related = model_field.related_model
+            child = _Plan()
+            if isinstance(nested, BaseSerializer):
+                _plan_serializer(nested, related, "", child, top_level=False)
+            if model_field.one_to_many:
+                # The prefetch matches rows to parents through this column
+                child.only.append(model_field.field.name)
+            queryset = related._base_manager.all()
+            if child.select:
+                queryset = queryset.select_related(*child.select)
+            if child.only or isinstance(field, ManyRelatedField):
+                queryset = queryset.only(*child.only)
+            plan.prefetch.append(Prefetch(path, queryset=queryset))
+        elif isinstance(nested, BaseSerializer):
+            plan.select.append(path)
+            plan.only.append(path)
+            _plan_serializer(
+                nested,
+                model_field.related_model,
+                path + "__",
+                plan,
+                False,
+                (model_field, model, prefix) if model_field.one_to_one else None,
+            )
+        elif model_field.is_relation and not model_field.concrete:
+            # Reverse one-to-one rendered as an id
+            plan.select.append(path)
+            plan.only.append(f"{path}__{model_field.related_model._meta.pk.name}")
+        else:
+            plan.only.append(path)
+
+
+def optimize(queryset, serializer):
+    """Restrict ``queryset`` to what the (trimmed) ``serializer`` renders."""
+    plan = _Plan()
+    _plan_serializer(_nested(serializer), queryset.model, "", plan, top_level=True)
+    # Without arguments select_related() would follow every relation
+    if plan.select:
+        queryset = queryset.select_related(*plan.select)
+    queryset = queryset.prefetch_related(*plan.prefetch)
+    for method in plan.methods:
+        queryset = getattr(queryset, method)()
+    # The primary key is always loaded
+    return queryset.only(*(plan.only or [queryset.model._meta.pk.name]))
+
+
+class SparseFieldsetsMixin:
+    """
+    ``?fields=`` / ``?expand=`` for GET requests of a generic view. Views
+    return their base queryset from ``get_queryset``; ``get_full_queryset``
+    adds what the full representation needs.
+    """
+
+    def get_sparse_spec(self):
+        params = self.request.query_params
+        if self.request.method != "GET" or (
+            "fields" not in params and "expand" not in params
+        ):
+            return None
+        return (
+            parse_fields(params["fields"]) if "fields" in params else None,
+            parse_expand(params["expand"]) if "expand" in params else None,
+        )
+
+    def get_full_queryset(self, queryset):
+        return queryset
+
+    def get_serializer(self, *args, **kwargs):
+        serializer = super().get_serializer(*args, **kwargs)
+        spec = self.get_sparse_spec()
+        if spec is not None:
+            trim(serializer, *spec)
+        return serializer
+
+    def filter_queryset(self, queryset):
+        queryset = super().filter_queryset(queryset)
+        if self.get_sparse_spec() is None:
+            return self.get_full_queryset(queryset)
+        return optimize(queryset, self.get_serializer())
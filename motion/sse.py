@@ -0,0 +1,187 @@
+"""
+Server-Sent Events stream of new posts by the users a viewer follows.
+
+``GET /backend/api/posts/events/`` is served by this plain ASGI app, which
+``motion/asgi.py`` mounts in front of Django. An idle connection therefore
+holds no Django request, no thread and no database connection. It holds one
+coroutine and one pub/sub subscription (see motion/pubsub.py) to the
+``posts:<user id>`` channel of each followee, plus ``viewer:<user id>``. The
+follow toggle publishes on ``viewer:<user id>`` to refresh the followees.
+The stream only runs under ASGI; the WSGI app answers 404 there. In
+production it is the ``events`` service of docker-compose.prod.yml, to which
+nginx routes this path, and posts saved by the WSGI workers reach it through
+PostgresBroker.
+
+EventSource cannot send headers, so the access token can also be given as
+``?token=``. nginx does not log this location, and gunicorn writes no access
+log unless asked to. The token is only checked on connect, so the stream ends
+when it expires; EventSource then reconnects, and the client should hand it a
+fresh token. Events::
+
+    event: post
+    data: {"id": 123, "user": 7, "created": "..."}
+
+Every SSE_HEARTBEAT_SECONDS a comment line keeps proxies from closing the
+connection. If the viewer falls PUBSUB_QUEUE_SIZE events behind, the
+dropped events are replaced by one ``event: reset``, after which the client
+should refetch its feed.
+"""
+
+import asyncio
+import json
+import logging
+import time
+from urllib.parse import parse_qs
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import close_old_connections
+from rest_framework_simplejwt.exceptions import InvalidToken
+from rest_framework_simplejwt.settings import api_settings as jwt_settings
+
+from follow.models import Follow
+from motion import metrics
+from motion.authentication import JWTAuthenticationWithoutBearer
+from motion.pubsub import get_broker
+from user.models import User
+
+logger = logging.getLogger(__name__)
+
+PATH = "/backend/api/posts/events/"
+
+
+def posts_channel(user_id):
+    return f"posts:{user_id}"
+
+
+def viewer_channel(user_id):
+    return f"viewer:{user_id}"
+
+
+def _token(scope):
+    """The connection's validated access token (header or ?token=), or None."""
+    authentication = JWTAuthenticationWithoutBearer()
+    headers = dict(scope["headers"])
+    if b"authorization" in headers:
+        raw_token = authentication.get_raw_token(headers[b"authorization"])
+    else:
+        raw_token = parse_qs(scope["query_string"].decode()).get("token", [None])[0]
+    if not raw_token:
+        return None
+    try:
+        return authentication.get_validated_token(raw_token)
+    except InvalidToken:
+        return None
+
+
+@sync_to_async
+def _channels(user_id):
+    """The viewer's channels, or None when the account no longer exists."""
+    try:
+        if not User.objects.filter(pk=user_id).exists():
+            return None
+        followees = Follow.objects.filter(follower_id=user_id).values_list(
+            "following_id", flat=True
+        )
+        return [viewer_channel(user_id), *map(posts_channel, followees)]
+    finally:
+        # Not a Django request, so nothing else recycles this thread's connection
+        close_old_connections()
+
+
+def _event(name, data):
+    return f"event: {name}\ndata: {json.dumps(data)}\n\n".encode()
+
+
+async def _refuse(send, status, detail):
+    await send(
+        {
+            "type": "http.response.start",
+            "status": status,
+            "headers": [(b"content-type", b"application/json")],
+        }
+    )
+    await send(
+        {"type": "http.response.body", "body": json.dumps({"detail": detail}).encode()}
+    )
+
+
+async def _wait_for_disconnect(receive):
+    while (await receive())["type"] != "http.disconnect":
+        pass
+
+
+async def _stream(send, subscription, user_id):
+    broker = get_broker()
+    while True:
+        message = await subscription.get(settings.SSE_HEARTBEAT_SECONDS)
+        if subscription.lagged:
+            subscription.lagged = False
+            while not subscription.queue.empty():
+                subscription.queue.get_nowait()
+            body = _event("reset", {})
+        elif message is None:
+            body = b": ping\n\n"
+        elif message["event"] == "follows":
+            channels = await _channels(user_id)
+            if channels is None:
+                return
+            broker.resubscribe(subscription, channels)
+            continue
+        else:
+            body = _event(message["event"], message["data"])
+        await send({"type": "http.response.body", "body": body, "more_body": True})
+
+
+async def feed_events(scope, receive, send):
+    """ASGI app for the event stream."""
+    if scope["method"] != "GET":
+        return await _refuse(send, 405, "Method not allowed.")
+    token = _token(scope)
+    user_id = None if token is None else token.get(jwt_settings.USER_ID_CLAIM)
+    channels = None if user_id is None else await _channels(user_id)
+    if channels is None:
+        return await _refuse(send, 401, "Authentication credentials were not provided.")
+
+    broker = get_broker()
+    subscription = broker.subscribe(channels)
+    metrics.sse_connections.inc()
+    try:
+        await send(
+            {
+                "type": "http.response.start",
+                "status": 200,
+                "headers": [
+                    (b"content-type", b"text/event-stream"),
+                    (b"cache-control", b"no-cache"),
+                    # Stop nginx from buffering the stream
+                    (b"x-accel-buffering", b"no"),
+                ],
+            }
+        )
+        await send(
+            {
+                "type": "http.response.body",
+                "body": b"retry: 5000\n\n",
+                "more_body": True,
+            }
+        )
+        stream = asyncio.ensure_future(_stream(send, subscription, user_id))
+        disconnect = asyncio.ensure_future(_wait_for_disconnect(receive))
+        done, pending = await asyncio.wait(
+            {stream, disconnect},
+            timeout=max(token["exp"] - time.time(), 0),
+            return_when=asyncio.FIRST_COMPLETED,
+        )
+        for task in pending:
+            task.cancel()
+        if stream in done and stream.exception() is not None:
+            logger.warning(
+                "Event stream of user %s failed: %r", user_id, stream.exception()
+            )
+        elif disconnect not in done:
+            # The account is gone or the token expired: end the response
+            await send({"type": "http.response.body", "body": b""})
+    finally:
+        broker.unsubscribe(subscription)
+        metrics.sse_connections.dec()
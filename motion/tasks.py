@@ -0,0 +1,12 @@
+from jobs.queue import task
+from motion import purge
+from motion.models import DeletionRequest
+
+
+@task(queue="maintenance")
+def purge_deletion(request_id):
+    """Purge the rows of a tombstoned user or post (see motion/purge.py)."""
+    if not purge.claim(request_id):
+        # Already done, or being purged by another worker
+        return
+    purge.purge(DeletionRequest.objects.get(pk=request_id))
@@ -0,0 +1,27 @@
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.test.runner import DiscoverRunner
+from django.test.utils import override_settings
+
+# A replica alias reading the test database, for the router tests (motion/db_router.py)
+REPLICA_MIRROR = "replica_mirror"
+
+
+class TestRunner(DiscoverRunner):
+    """Django's runner, with N+1 query detection on and raising (motion/nplusone.py)."""
+
+    def setup_test_environment(self, **kwargs):
+        super().setup_test_environment(**kwargs)
+        self._nplusone = override_settings(NPLUSONE_ENABLED=True, NPLUSONE_RAISE=True)
+        self._nplusone.enable()
+
+    def teardown_test_environment(self, **kwargs):
+        self._nplusone.disable()
+        super().teardown_test_environment(**kwargs)
+
+    def setup_databases(self, **kwargs):
+        default = connections.settings[DEFAULT_DB_ALIAS]
+        connections.settings[REPLICA_MIRROR] = {
+            **default,
+            "TEST": {**default["TEST"], "MIRROR": DEFAULT_DB_ALIAS},
+        }
+        return super().setup_databases(**kwargs)
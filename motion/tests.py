@@ -0,0 +1,616 @@
+import asyncio
+import os
+import re
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import timedelta
+from unittest import mock
+
+from asgiref.sync import sync_to_async
+from django.contrib.auth import authenticate, hashers
+from django.contrib.auth.models import AnonymousUser
+from django.db import connection, connections, transaction
+from django.http import HttpResponse
+from django.test import (
+    RequestFactory,
+    TestCase,
+    TransactionTestCase,
+    override_settings,
+)
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient, APIRequestFactory
+from rest_framework_simplejwt.tokens import AccessToken
+
+from follow.models import Follow
+from motion import (
+    batch,
+    db_router,
+    instrumentation,
+    metrics,
+    nplusone,
+    profiling,
+    pubsub,
+    sse,
+)
+from motion.hashing import check_user_password
+from motion.models import DeletionRequest, SlowQuery
+from motion.nplusone import NPlusOneError, detect_n_plus_one
+from motion.profiling import ProfilingMiddleware
+from motion.purge import purge, request_deletion
+from motion.slow_queries import flush_all
+from motion.test_runner import REPLICA_MIRROR
+from motion.throttling import SharedAnonRateThrottle, get_store
+from post.models import Like, Post
+from user.models import User
+from user_profile.models import UserProfile
+
+
+class ThrottleKeyTests(TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        settings_override = override_settings(
+            THROTTLE_DB=f"{directory.name}/throttle.sqlite3"
+        )
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        get_store().reset()
+
+    def login(self, forwarded_for):
+        # As nginx forwards it: the client's header, then the client's address
+        return self.client.post(
+            "/backend/api/token/",
+            {"email": "nobody@example.com", "password": "wrong"},
+            HTTP_X_FORWARDED_FOR=f"{forwarded_for}, 203.0.113.7",
+        )
+
+    def test_spoofed_forwarded_for_shares_the_clients_bucket(self):
+        factory = APIRequestFactory()
+        keys = set()
+        for spoofed in ("198.51.100.1", "198.51.100.2"):
+            request = factory.get("/", HTTP_X_FORWARDED_FOR=f"{spoofed}, 203.0.113.7")
+            request.user = AnonymousUser()
+            keys.add(SharedAnonRateThrottle().get_cache_key(request, None))
+        self.assertEqual(len(keys), 1)
+
+    def test_login_throttle_ignores_spoofed_forwarded_for(self):
+        # The "login" scope allows 10 per minute
+        statuses = [self.login(f"198.51.100.{i}").status_code for i in range(11)]
+        self.assertNotIn(429, statuses[:10])
+        self.assertEqual(statuses[10], 429)
+
+
+# What one gunicorn worker records, in a process of its own
+WORKER_SAMPLE = """
+from prometheus_client import Counter
+Counter("motion_http_requests_total", "", ["method", "route", "status"]).labels(
+    "GET", "posts", "200"
+).inc()
+"""
+
+
+class MetricsTests(TestCase):
+    def scrape(self, address, **headers):
+        return self.client.get("/metrics", REMOTE_ADDR=address, **headers)
+
+    @override_settings(METRICS_ALLOWED_IPS=["127.0.0.1", "::1", "172.28.0.1"])
+    def test_only_allowed_direct_requests_are_answered(self):
+        self.assertEqual(self.scrape("127.0.0.1").status_code, 200)
+        # A scrape through the published port, from the compose network's gateway
+        self.assertEqual(self.scrape("172.28.0.1").status_code, 200)
+        self.assertEqual(self.scrape("172.28.0.5").status_code, 403)
+        self.assertEqual(
+            self.scrape("127.0.0.1", HTTP_X_FORWARDED_FOR="198.51.100.1").status_code,
+            403,
+        )
+
+    def test_workers_samples_are_merged(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        env = {**os.environ, "PROMETHEUS_MULTIPROC_DIR": directory.name}
+        for _ in range(2):
+            subprocess.run([sys.executable, "-c", WORKER_SAMPLE], env=env, check=True)
+        with mock.patch.object(metrics, "_multiproc_dir", directory.name):
+            payload, _ = metrics.render_latest()
+        self.assertIn(
+            'motion_http_requests_total{method="GET",route="posts",status="200"} 2.0',
+            payload.decode(),
+        )
+
+
+@override_settings(PROFILING_ENABLED=True, PROFILING_SAMPLE_RATE=0.0)
+class ProfilingTriggerTests(TestCase):
+    def setUp(self):
+        self.middleware = ProfilingMiddleware(lambda request: HttpResponse())
+
+    def requested_by(self, user=None):
+        headers = {}
+        if user is not None:
+            headers["HTTP_AUTHORIZATION"] = f"Bearer {AccessToken.for_user(user)}"
+        request = RequestFactory().get("/backend/api/posts/?profile=1", **headers)
+        return self.middleware._requested_by(request)
+
+    def test_profile_param_needs_a_staff_token(self):
+        user = User.objects.create_user(
+            username="member", email="member@example.com", password="x"
+        )
+        self.assertIsNone(self.requested_by())
+        self.assertIsNone(self.requested_by(user))
+        user.is_staff = True
+        user.save(update_fields=["is_staff"])
+        self.assertEqual(self.requested_by(user), "staff")
+
+
+@override_settings(
+    PROFILING_ENABLED=True, PROFILING_SAMPLE_RATE=0.0, PROFILING_MODE="cprofile"
+)
+class ProfilingConcurrencyTests(TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        settings_override = override_settings(PROFILING_DIR=directory.name)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.entered = threading.Event()
+        self.proceed = threading.Event()
+
+    def view(self, request):
+        if request.path == "/slow/":
+            self.entered.set()
+            self.proceed.wait(5)
+        return HttpResponse()
+
+    def test_one_request_per_process_is_profiled_at_a_time(self):
+        middleware = ProfilingMiddleware(self.view)
+        headers = {"HTTP_X_PROFILE_TOKEN": profiling.make_token()}
+        responses = {}
+
+        def slow():
+            responses["slow"] = middleware(RequestFactory().get("/slow/", **headers))
+
+        thread = threading.Thread(target=slow)
+        thread.start()
+        self.assertTrue(self.entered.wait(5))
+        with self.assertLogs("motion.profiling", "INFO") as logs:
+            meanwhile = middleware(RequestFactory().get("/fast/", **headers))
+        self.proceed.set()
+        thread.join()
+        self.assertNotIn("X-Profile-Name", meanwhile)
+        self.assertIn("another request is being profiled", logs.output[0])
+        self.assertIn("X-Profile-Name", responses["slow"])
+        # The lock is free again
+        self.assertIn(
+            "X-Profile-Name", middleware(RequestFactory().get("/fast/", **headers))
+        )
+
+
+class NPlusOneTests(TestCase):
+    def query(self):
+        User.objects.filter(pk=0).exists()
+
+    def test_repeated_queries_raise_and_the_observer_is_removed(self):
+        with (
+            self.assertRaises(NPlusOneError),
+            detect_n_plus_one("loop", threshold=2),
+        ):
+            for _ in range(3):
+                self.query()
+        self.assertNotIn(nplusone._observe_query, instrumentation._query_observers)
+
+    def test_checkpoint_counts_each_batch_on_its_own(self):
+        with detect_n_plus_one("batches", threshold=2):
+            for _ in range(3):
+                self.query()
+                self.query()
+                nplusone.checkpoint()
+
+    @override_settings(NPLUSONE_ENABLED=False)
+    def test_disabled_detection_records_nothing(self):
+        with detect_n_plus_one("loop", threshold=0) as detector:
+            self.query()
+        self.assertIsNone(detector)
+        self.assertNotIn(nplusone._observe_query, instrumentation._query_observers)
+
+
+class DeletionTests(TestCase):
+    def setUp(self):
+        self.alice = User.objects.create_user(
+            username="alice", email="alice@example.com", password="x"
+        )
+        self.bob = User.objects.create_user(
+            username="bob", email="bob@example.com", password="x"
+        )
+        self.post = Post.objects.create(user=self.alice.profile, content="hello")
+        Like.objects.create(user=self.bob, post=self.post)
+        for follower, following in ((self.alice, self.bob), (self.bob, self.alice)):
+            client = APIClient()
+            client.force_authenticate(follower)
+            client.post(f"/backend/api/followers/toggle-follow/{following.pk}/")
+
+    def counts(self, user):
+        profile = UserProfile.objects.get(user=user)
+        return profile.followers_count, profile.following_count, profile.posts_count
+
+    def test_deleted_post_is_uncounted_once_and_purged(self):
+        request_deletion(self.post, self.alice)
+        request_deletion(Post.all_objects.get(pk=self.post.pk), self.alice)
+        self.assertFalse(Post.objects.filter(pk=self.post.pk).exists())
+        self.assertEqual(self.counts(self.alice), (1, 1, 0))
+
+        for deletion in DeletionRequest.objects.all():
+            purge(deletion, batch_size=1)
+        self.assertFalse(Post.all_objects.filter(pk=self.post.pk).exists())
+        self.assertFalse(Like.objects.exists())
+        self.assertEqual(self.counts(self.alice), (1, 1, 0))
+        self.assertEqual(
+            DeletionRequest.objects.first().progress, {"likes": 1, "posts": 1}
+        )
+
+    def test_deleted_user_stops_counting_before_the_purge(self):
+        request_deletion(self.alice, self.alice)
+        self.assertEqual(self.counts(self.bob), (0, 0, 0))
+
+        purge(DeletionRequest.objects.get(), batch_size=1)
+        self.assertFalse(User.all_objects.filter(pk=self.alice.pk).exists())
+        self.assertFalse(Follow.objects.exists())
+        self.assertEqual(self.counts(self.bob), (0, 0, 0))
+
+
+class BatchTests(TransactionTestCase):
+    def setUp(self):
+        self.users = [
+            User.objects.create_user(
+                username=f"user{i}", email=f"user{i}@example.com", password="x"
+            )
+            for i in range(3)
+        ]
+        # Staff may read every account, and would reach the admin if allowed
+        self.users[0].is_staff = self.users[0].is_superuser = True
+        self.users[0].save(update_fields=["is_staff", "is_superuser"])
+        self.client = APIClient()
+        self.client.force_authenticate(self.users[0])
+
+    def run_batch(self, *urls, method="GET"):
+        response = self.client.post(
+            "/backend/api/batch/",
+            {"requests": [{"method": method, "url": url} for url in urls]},
+            format="json",
+        )
+        self.assertEqual(response.status_code, 200)
+        return response.json()["responses"]
+
+    def test_consecutive_gets_run_on_the_pool_in_order(self):
+        threads = []
+
+        def dispatch(*args, **kwargs):
+            threads.append(threading.current_thread().name)
+            return batch_dispatch(*args, **kwargs)
+
+        batch_dispatch = batch.dispatch
+        with mock.patch.object(batch, "dispatch", dispatch):
+            responses = self.run_batch(
+                *(f"/backend/api/users/{user.pk}/" for user in self.users)
+            )
+        self.assertEqual(
+            [response["body"]["username"] for response in responses],
+            ["user0", "user1", "user2"],
+        )
+        self.assertEqual(len(threads), 3)
+        self.assertTrue(all(name.startswith("batch") for name in threads))
+
+    def test_batches_cannot_be_nested(self):
+        (response,) = self.run_batch("/backend/api/batch/", method="POST")
+        self.assertEqual(response["status"], 400)
+
+    def test_only_api_views_are_reachable(self):
+        responses = self.run_batch(
+            "/admin/", "/admin/user/user/", "/metrics", "/health/", "/swagger/"
+        )
+        self.assertEqual([response["status"] for response in responses], [404] * 5)
+
+
+@override_settings(PASSWORD_HASH_ITERATIONS=1000)
+class PasswordHashingTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username="member", email="member@example.com", password="x"
+        )
+
+    def store(self, encoded):
+        User.objects.filter(pk=self.user.pk).update(password=encoded)
+        self.user.refresh_from_db()
+
+    def test_hashes_of_the_other_hashers_verify_and_are_upgraded(self):
+        for algorithm in ("scrypt", "pbkdf2_sha1"):
+            with self.subTest(algorithm=algorithm):
+                self.store(hashers.make_password("secret", hasher=algorithm))
+                self.assertFalse(check_user_password(self.user, "wrong"))
+                self.assertTrue(self.user.password.startswith(f"{algorithm}$"))
+                self.assertTrue(check_user_password(self.user, "secret"))
+                self.user.refresh_from_db()
+                self.assertTrue(self.user.password.startswith("pbkdf2_sha256$1000$"))
+
+    def test_login_rehashes_with_the_new_iteration_count(self):
+        with override_settings(PASSWORD_HASH_ITERATIONS=500):
+            self.store(hashers.make_password("secret"))
+        self.assertTrue(self.user.password.startswith("pbkdf2_sha256$500$"))
+        self.assertEqual(
+            authenticate(None, username="member@example.com", password="secret"),
+            self.user,
+        )
+        self.user.refresh_from_db()
+        self.assertTrue(self.user.password.startswith("pbkdf2_sha256$1000$"))
+        self.assertIsNone(
+            authenticate(None, username="member@example.com", password="wrong")
+        )
+
+
+@override_settings(PERFORMANCE_INSTRUMENTATION=True)
+class ServerTimingTests(TestCase):
+    def timings(self, response):
+        return {
+            name: (float(duration), description)
+            for name, duration, description in re.findall(
+                r'(\w+);dur=([\d.]+)(?:;desc="([^"]*)")?', response["Server-Timing"]
+            )
+        }
+
+    def test_header_counts_the_requests_own_queries(self):
+        user = User.objects.create_user(
+            username="member", email="member@example.com", password="x"
+        )
+        client = APIClient()
+        client.force_authenticate(user)
+        with CaptureQueriesContext(connection) as queries:
+            response = client.get("/backend/api/users/")
+        timings = self.timings(response)
+        self.assertEqual(set(timings), {"db", "serialize", "render", "total"})
+        self.assertEqual(timings["db"][1], f"{len(queries)} queries")
+        self.assertGreater(len(queries), 0)
+        self.assertGreaterEqual(timings["total"][0], timings["db"][0])
+
+        # Nothing carries over to the next request, or outside of one
+        response = client.get("/health/")
+        self.assertEqual(self.timings(response)["db"], (0.0, "0 queries"))
+        self.assertIsNone(instrumentation.current_metrics())
+
+
+class SlowQueryTests(TransactionTestCase):
+    def run_slowly(self, func):
+        """Run ``func`` with every statement counting as slow."""
+        with (
+            self.assertLogs("motion.slow_queries", "WARNING"),
+            override_settings(SLOW_QUERY_THRESHOLD_MS=1e-6),
+        ):
+            func()
+            flush_all()
+
+    def lookups(self):
+        return SlowQuery.objects.filter(sql__contains='"user_user"."username" =')
+
+    def test_entry_outlives_the_rolled_back_transaction(self):
+        def rolled_back():
+            try:
+                with transaction.atomic():
+                    User.objects.filter(username="nobody").exists()
+                    # Nothing is stored while the transaction is open
+                    self.assertFalse(SlowQuery.objects.exists())
+                    raise RuntimeError
+            except RuntimeError:
+                pass
+
+        self.run_slowly(rolled_back)
+        entry = self.lookups().get()
+        self.assertEqual(entry.database, "default")
+        self.assertIn("user_user", entry.plan)
+        self.assertNotIn("EXPLAIN failed", entry.plan)
+
+    @override_settings(SLOW_QUERY_LOG_SIZE=3)
+    def test_only_the_newest_entries_are_kept(self):
+        def lookups():
+            for _ in range(5):
+                User.objects.filter(username="nobody").exists()
+
+        self.run_slowly(lookups)
+        self.assertLessEqual(SlowQuery.objects.count(), 3)
+        self.assertEqual(
+            SlowQuery.objects.order_by("-id").first().fingerprint,
+            self.lookups().order_by("-id").first().fingerprint,
+        )
+
+    def test_entries_name_the_view(self):
+        user = User.objects.create_user(
+            username="member", email="member@example.com", password="x"
+        )
+        client = APIClient()
+        client.force_authenticate(user)
+        self.run_slowly(lambda: client.get("/backend/api/users/search/?q=mem"))
+        self.assertTrue(
+            SlowQuery.objects.filter(view="user.views.UserSearchAPIView").exists()
+        )
+
+
+@override_settings(DATABASE_REPLICAS=[REPLICA_MIRROR], REPLICA_PIN_SECONDS=60)
+class ReplicaRoutingTests(TransactionTestCase):
+    databases = {"default", REPLICA_MIRROR}
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        settings_override = override_settings(
+            REPLICA_PIN_DB=f"{directory.name}/pins.sqlite3"
+        )
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.user = User.objects.create_user(
+            username="reader", email="reader@example.com", password="x"
+        )
+        self.post = Post.objects.create(user=self.user.profile, content="hello")
+        self.client = APIClient()
+        self.client.credentials(
+            HTTP_AUTHORIZATION=f"Bearer {AccessToken.for_user(self.user)}"
+        )
+
+    def aliases(self, method, url):
+        """The aliases that ran the queries of a request."""
+        used = set()
+
+        def record(alias):
+            def wrapper(execute, sql, params, many, context):
+                used.add(alias)
+                return execute(sql, params, many, context)
+
+            return wrapper
+
+        with (
+            connections["default"].execute_wrapper(record("default")),
+            connections[REPLICA_MIRROR].execute_wrapper(record(REPLICA_MIRROR)),
+        ):
+            response = getattr(self.client, method)(url)
+        self.assertLess(response.status_code, 400)
+        return used
+
+    def test_safe_reads_of_replica_apps_use_the_replica(self):
+        self.assertEqual(
+            self.aliases("get", "/backend/api/posts/following/"), {REPLICA_MIRROR}
+        )
+        # Views of other apps read from the primary
+        self.assertEqual(
+            self.aliases("get", "/backend/api/notifications/unread-count/"),
+            {"default"},
+        )
+
+    def test_writes_use_the_primary_and_pin_the_writer(self):
+        url = f"/backend/api/posts/toggle-like/{self.post.pk}/"
+        self.assertEqual(self.aliases("post", url), {"default"})
+        self.assertTrue(db_router.get_pin_store().is_pinned(self.user.pk))
+        self.assertEqual(
+            self.aliases("get", "/backend/api/posts/following/"), {"default"}
+        )
+
+    def test_pin_expires(self):
+        self.aliases("post", f"/backend/api/posts/toggle-like/{self.post.pk}/")
+        with mock.patch.object(db_router.time, "time", return_value=time.time() + 61):
+            self.assertEqual(
+                self.aliases("get", "/backend/api/posts/following/"),
+                {REPLICA_MIRROR},
+            )
+
+    def test_unreachable_replica_falls_back_to_the_primary(self):
+        self.addCleanup(db_router._unavailable.clear)
+        db_router.mark_unavailable(REPLICA_MIRROR)
+        self.assertEqual(
+            self.aliases("get", "/backend/api/posts/following/"), {"default"}
+        )
+
+
+class EventStream:
+    """A client of the event stream ASGI app, reading what it sends."""
+
+    def __init__(self, token=None, query=""):
+        headers = [(b"authorization", f"Bearer {token}".encode())] if token else []
+        self.scope = {
+            "type": "http",
+            "method": "GET",
+            "path": sse.PATH,
+            "headers": headers,
+            "query_string": query.encode(),
+        }
+        self.sent = asyncio.Queue()
+        self.disconnected = asyncio.Event()
+
+    def start(self):
+        self.task = asyncio.ensure_future(
+            sse.feed_events(self.scope, self.receive, self.sent.put)
+        )
+
+    async def receive(self):
+        await self.disconnected.wait()
+        return {"type": "http.disconnect"}
+
+    async def next(self, timeout=5):
+        return await asyncio.wait_for(self.sent.get(), timeout)
+
+    async def close(self):
+        self.disconnected.set()
+        await asyncio.wait_for(self.task, 5)
+
+
+class EventStreamTests(TransactionTestCase):
+    def setUp(self):
+        self.viewer, self.author, self.other = [
+            User.objects.create_user(
+                username=name, email=f"{name}@example.com", password="x"
+            )
+            for name in ("viewer", "author", "other")
+        ]
+        Follow.objects.create(follower=self.viewer, following=self.author)
+
+    async def connect(self, token=None):
+        stream = EventStream(token or AccessToken.for_user(self.viewer))
+        stream.start()
+        self.assertEqual((await stream.next())["status"], 200)
+        self.assertEqual((await stream.next())["body"], b"retry: 5000\n\n")
+        return stream
+
+    async def wait_subscribed(self, channel):
+        broker = pubsub.get_broker()
+        while channel not in broker._subscriptions:
+            await asyncio.sleep(0.01)
+
+    async def test_connection_without_a_valid_token_is_refused(self):
+        for stream in (EventStream(), EventStream(query="token=nonsense")):
+            stream.start()
+            self.assertEqual((await stream.next())["status"], 401)
+            await stream.close()
+
+    async def test_posts_of_followees_are_delivered(self):
+        stream = await self.connect()
+        await sync_to_async(Post.objects.create)(user=self.other.profile, content="x")
+        post = await sync_to_async(Post.objects.create)(
+            user=self.author.profile, content="hello"
+        )
+        body = (await stream.next())["body"].decode()
+        self.assertTrue(body.startswith("event: post\n"), body)
+        self.assertIn(f'"id": {post.pk}', body)
+        await stream.close()
+
+    @override_settings(PUBSUB_QUEUE_SIZE=2)
+    async def test_viewer_falling_behind_gets_a_reset(self):
+        stream = await self.connect()
+        channel = sse.posts_channel(self.author.pk)
+        # Delivered before the stream can drain its queue
+        for i in range(5):
+            pubsub.publish(channel, {"event": "post", "data": {"id": i}})
+        self.assertEqual((await stream.next())["body"], b"event: reset\ndata: {}\n\n")
+        pubsub.publish(channel, {"event": "post", "data": {"id": 5}})
+        self.assertIn(b'"id": 5', (await stream.next())["body"])
+        await stream.close()
+
+    async def test_follow_resubscribes_the_stream(self):
+        stream = await self.connect()
+        client = APIClient()
+        client.force_authenticate(self.viewer)
+        response = await sync_to_async(client.post)(
+            f"/backend/api/followers/toggle-follow/{self.other.pk}/"
+        )
+        self.assertEqual(response.status_code, 200)
+        await asyncio.wait_for(
+            self.wait_subscribed(sse.posts_channel(self.other.pk)), 5
+        )
+        post = await sync_to_async(Post.objects.create)(
+            user=self.other.profile, content="hello"
+        )
+        self.assertIn(f'"id": {post.pk}'.encode(), (await stream.next())["body"])
+        await stream.close()
+
+    async def test_stream_ends_when_the_token_expires(self):
+        token = AccessToken.for_user(self.viewer)
+        token.set_exp(lifetime=timedelta(seconds=1))
+        stream = await self.connect(token)
+        last = await stream.next()
+        self.assertEqual((last["body"], last.get("more_body")), (b"", None))
+        await asyncio.wait_for(stream.task, 5)
@@ -0,0 +1,149 @@
+"""
+Rate limiting shared by every worker process on a host.
+
+DRF's own throttles keep their history in the Django cache, which would need
+a cache server to be shared between gunicorn workers. These keep a token
+bucket per (scope, client) in a small SQLite database in WAL mode instead.
+A check is a single ``INSERT ... ON CONFLICT DO UPDATE ... RETURNING`` on a
+primary key: O(1) however busy the client is, and atomic across processes
+because SQLite serializes writers.
+
+A rate of "N/period" is a bucket of N tokens refilling at N / period tokens
+per second; every request takes a token or is throttled until one refills.
+
+Settings:
+    THROTTLE_DB          path of the SQLite file (one per host, created on first use)
+    THROTTLE_RATES       scope -> "N/period" (DRF's DEFAULT_THROTTLE_RATES)
+    THROTTLE_USER_RATES  per-user overrides, {"<user id>": {scope: rate or None}}
+"""
+
+import logging
+import sqlite3
+import time
+
+from django.conf import settings
+from rest_framework.throttling import (
+    AnonRateThrottle,
+    ScopedRateThrottle,
+    SimpleRateThrottle,
+    UserRateThrottle,
+)
+
+from motion import metrics
+from motion.localstore import LocalStore, store_getter
+
+logger = logging.getLogger(__name__)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS bucket (
+    key TEXT PRIMARY KEY,
+    tokens REAL NOT NULL,
+    allowed INTEGER NOT NULL,
+    updated REAL NOT NULL,
+    expires REAL NOT NULL
+) WITHOUT ROWID
+"""
+
+# SET expressions see the row as it was before the update
+_REFILLED = "min(:capacity, tokens + (:now - updated) * :rate)"
+_TAKE = f"""
+INSERT INTO bucket (key, tokens, allowed, updated, expires)
+VALUES (:key, :capacity - 1, 1, :now, :now + :duration)
+ON CONFLICT (key) DO UPDATE SET
+    tokens = {_REFILLED} - ({_REFILLED} >= 1),
+    allowed = {_REFILLED} >= 1,
+    updated = :now,
+    expires = :now + :duration
+RETURNING tokens, allowed
+"""
+
+
+class TokenBucketStore(LocalStore):
+    """Token buckets in a SQLite file shared by the processes of one host."""
+
+    schema = _SCHEMA
+    # Buckets untouched for a whole period are full again, so their rows can go
+    prune_sql = "DELETE FROM bucket WHERE expires < ?"
+
+    def take(self, key, capacity, duration, now=None):
+        """
+        Take a token from ``key``'s bucket. Returns 0 when the request is
+        allowed, otherwise the seconds until a token is available.
+        """
+        now = time.time() if now is None else now
+        rate = capacity / duration
+        tokens, allowed = (
+            self.connection()
+            .execute(
+                _TAKE,
+                {
+                    "key": key,
+                    "capacity": capacity,
+                    "duration": duration,
+                    "rate": rate,
+                    "now": now,
+                },
+            )
+            .fetchone()
+        )
+        self.maybe_prune(now)
+        return 0 if allowed else (1 - tokens) / rate
+
+    def reset(self):
+        self.connection().execute("DELETE FROM bucket")
+
+
+get_store = store_getter(TokenBucketStore, "THROTTLE_DB")
+
+
+class SharedRateThrottle(SimpleRateThrottle):
+    """SimpleRateThrottle whose buckets live in the shared TokenBucketStore."""
+
+    def rate_for(self, request):
+        """The scope's rate, unless THROTTLE_USER_RATES has one for this user."""
+        user = request.user
+        if user and user.is_authenticated:
+            overrides = settings.THROTTLE_USER_RATES.get(str(user.pk), {})
+            if self.scope in overrides:
+                return overrides[self.scope]
+        return self.rate
+
+    def allow_request(self, request, view):
+        self.wait_seconds = 0
+        rate = self.rate_for(request)
+        if rate is None:
+            return True
+        key = self.get_cache_key(request, view)
+        if key is None:
+            return True
+        num_requests, duration = self.parse_rate(rate)
+
+        start = time.perf_counter()
+        try:
+            self.wait_seconds = get_store().take(key, num_requests, duration)
+        except sqlite3.Error:
+            # A broken limiter must not take the API down with it
+            logger.exception("Rate limit check failed for %s", key)
+            return True
+        finally:
+            metrics.throttle_check_duration.observe(time.perf_counter() - start)
+        allowed = self.wait_seconds == 0
+        metrics.throttle_checks.labels(
+            self.scope, "allowed" if allowed else "throttled"
+        ).inc()
+        return allowed
+
+    def wait(self):
+        return self.wait_seconds
+
+
+class SharedAnonRateThrottle(AnonRateThrottle, SharedRateThrottle):
+    """Anonymous requests, per IP address ("anon" scope)."""
+
+
+class SharedUserRateThrottle(UserRateThrottle, SharedRateThrottle):
+    """Every request, per user (per IP address when anonymous; "user" scope)."""
+
+
+class SharedScopedRateThrottle(ScopedRateThrottle, SharedRateThrottle):
+    """Views with a ``throttle_scope``, per user or IP address."""
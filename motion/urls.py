@@ -7,7 +7,16 @@ from django.urls import include, path, re_path
 from drf_yasg import openapi
 from drf_yasg.views import get_schema_view
 from rest_framework import permissions
-from rest_framework_simplejwt import views as jwt_views
+
+from image.views import serve_media
+from motion.views import (
+    BatchAPIView,
+    DeletionRequestDetailAPIView,
+    ProfileDownloadAPIView,
+    ProfileListAPIView,
+    TokenObtainPairView,
+    metrics_view,
+)
 
 # Determine the base URL for Swagger schema
 # In production, use HTTPS; in development, auto-detect
@@ -18,7 +27,12 @@ if not settings.DEBUG:
     if allowed_hosts and allowed_hosts[0].strip():
         domain = allowed_hosts[0].strip()
         # Remove http:// or https:// if present
-        domain = domain.replace("http://", "").replace("https://", "").split("/")[0].split(":")[0]
+        domain = (
+            domain.replace("http://", "")
+            .replace("https://", "")
+            .split("/")[0]
+            .split(":")[0]
+        )
         if domain:
             schema_url = f"https://{domain}"
 
@@ -54,15 +68,31 @@ That's it! The token will be automatically added to all requests.
 
 urlpatterns = [
     path("health/", lambda r: HttpResponse("ok", content_type="text/plain")),
+    path("metrics", metrics_view, name="metrics"),
     path("admin/", admin.site.urls),
     path("backend/api/users/", include("user.urls")),
     path(
         "backend/api/token/",
-        jwt_views.TokenObtainPairView.as_view(),
+        TokenObtainPairView.as_view(),
         name="token_obtain_pair",
     ),
     path("backend/api/followers/", include("follow.urls")),
     path("backend/api/posts/", include("post.urls")),
+    path("backend/api/analytics/", include("analytics.urls")),
+    path("backend/api/notifications/", include("notification.urls")),
+    path("backend/api/batch/", BatchAPIView.as_view(), name="batch"),
+    path("backend/api/profiles/", ProfileListAPIView.as_view(), name="profile-list"),
+    path(
+        "backend/api/profiles/<str:name>/",
+        ProfileDownloadAPIView.as_view(),
+        name="profile-download",
+    ),
+    path(
+        "backend/api/deletions/<int:pk>/",
+        DeletionRequestDetailAPIView.as_view(),
+        name="deletion-request-detail",
+    ),
+    re_path(r"^media/(?P<path>(?:images|variants)/.+)$", serve_media),
     # Swagger documentation URLs
     re_path(
         r"^swagger(?P<format>\.json|\.yaml)$",
@@ -0,0 +1,125 @@
+import ipaddress
+from datetime import UTC, datetime
+
+from django.conf import settings
+from django.http import FileResponse, Http404, HttpResponse, HttpResponseForbidden
+from rest_framework import status
+from rest_framework.generics import RetrieveAPIView
+from rest_framework.permissions import IsAuthenticated
+from rest_framework.response import Response
+from rest_framework.views import APIView
+from rest_framework_simplejwt import views as jwt_views
+
+from motion import batch, metrics, profiling, purge
+from motion.models import DeletionRequest
+from motion.permissions import IsAdmin
+from motion.serializers import BatchRequestSerializer, DeletionRequestSerializer
+
+
+def _is_local_request(request):
+    # Anything that came through the nginx proxy carries forwarding headers
+    if "HTTP_X_FORWARDED_FOR" in request.META or "HTTP_X_REAL_IP" in request.META:
+        return False
+    try:
+        address = ipaddress.ip_address(request.META.get("REMOTE_ADDR", ""))
+    except ValueError:
+        return False
+    return any(
+        address in ipaddress.ip_network(allowed, strict=False)
+        for allowed in settings.METRICS_ALLOWED_IPS
+    )
+
+
+def metrics_view(request):
+    """Prometheus scrape endpoint, reachable from the local host only."""
+    if not _is_local_request(request):
+        return HttpResponseForbidden()
+    payload, content_type = metrics.render_latest()
+    return HttpResponse(payload, content_type=content_type)
+
+
+class ProfileListAPIView(APIView):
+    """
+    GET: List saved request profiles, newest first (admins only)
+    """
+
+    permission_classes = [IsAdmin]
+
+    def get(self, request):
+        return Response(
+            [
+                {
+                    "name": path.name,
+                    "size": stat.st_size,
+                    "created": datetime.fromtimestamp(stat.st_mtime, UTC),
+                    "url": request.build_absolute_uri(f"{path.name}/"),
+                }
+                for path in profiling.list_profiles()
+                for stat in [path.stat()]
+            ]
+        )
+
+
+class ProfileDownloadAPIView(APIView):
+    """
+    GET: Download one saved request profile (admins only)
+    """
+
+    permission_classes = [IsAdmin]
+
+    def get(self, request, name):
+        path = profiling.get_profile_path(name)
+        if path is None:
+            raise Http404
+        return FileResponse(open(path, "rb"), as_attachment=True, filename=name)
+
+
+class DeletionRequestDetailAPIView(RetrieveAPIView):
+    """
+    GET: Progress of a background deletion (requester or admins)
+    """
+
+    serializer_class = DeletionRequestSerializer
+    permission_classes = [IsAuthenticated]
+
+    def get_queryset(self):
+        if IsAdmin().has_permission(self.request, self):
+            return DeletionRequest.objects.all()
+        return DeletionRequest.objects.filter(requested_by=self.request.user)
+
+
+class BackgroundDestroyMixin:
+    """
+    DELETE tombstones the object and answers 202 with the deletion request;
+    its rows are purged in the background (see motion/purge.py).
+    """
+
+    def destroy(self, request, *args, **kwargs):
+        deletion = purge.request_deletion(self.get_object(), requested_by=request.user)
+        return Response(
+            DeletionRequestSerializer(deletion).data, status=status.HTTP_202_ACCEPTED
+        )
+
+
+class TokenObtainPairView(jwt_views.TokenObtainPairView):
+    """
+    POST: Obtain an access/refresh token pair, limited per client by the
+    "login" throttle scope
+    """
+
+    throttle_scope = "login"
+
+
+class BatchAPIView(APIView):
+    """
+    POST: Run several GET/POST API calls at once, authenticated once
+    (see motion/batch.py); answers their responses in order
+    """
+
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request):
+        serializer = BatchRequestSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        responses = batch.run(request, serializer.validated_data["requests"])
+        return Response({"responses": responses})
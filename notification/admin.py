@@ -0,0 +1,10 @@
+from django.contrib import admin
+
+from notification.models import Notification
+
+
+@admin.register(Notification)
+class NotificationAdmin(admin.ModelAdmin):
+    list_display = ("recipient", "kind", "post", "count", "updated", "read_at")
+    list_filter = ("kind",)
+    raw_id_fields = ("recipient", "post", "last_actor")
@@ -0,0 +1,125 @@
+"""
+Notification inbox: likes of a user's posts and new followers.
+
+Events of the same kind on the same target (the likes of one post, the
+user's new followers) are merged into the recipient's one unread row for
+that target ("X and 41 others liked your post"). The row's ``count`` goes
+up, ``last_actor`` and ``updated`` change, and it moves to the top of the
+inbox. Once the row is read, the next event opens a new one. A burst of
+likes on a viral post is thus one UPDATE of one row per like, not one new
+row each, and the inbox shows one entry per post.
+
+Recording an event is an UPDATE of the open row or, when there is none, an
+INSERT. A partial unique constraint allows one open row per target, so an
+INSERT that loses a race with a concurrent one becomes the UPDATE. An unlike
+or unfollow is taken back from the open row if its like or follow was
+counted there.
+
+The number of unread rows is stored on the recipient's profile
+(``UserProfile.unread_notifications``). It only changes when a row is
+opened, read or removed, not on every merged event, and reading it costs no
+COUNT. Every row write is counted in the ``motion_notification_writes_total``
+metric by operation, which gives the write amplification (rows written per
+event) under real load.
+"""
+
+from collections import Counter
+
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from motion import metrics
+from notification.models import Notification
+from user_profile import counters
+from user_profile.models import UserProfile
+
+
+def _open(recipient_id, kind, post_id):
+    return Notification.objects.filter(
+        recipient_id=recipient_id, kind=kind, post_id=post_id, read_at__isnull=True
+    )
+
+
+def _adjust_unread(user_id, delta):
+    counters.adjust(
+        UserProfile.objects.filter(user_id=user_id), delta, "unread_notifications"
+    )
+
+
+def notify(recipient_id, kind, actor_id, when, post_id=None):
+    """Merge ``actor_id``'s event at ``when`` into the recipient's open row."""
+    if recipient_id == actor_id:
+        return
+    rows = _open(recipient_id, kind, post_id)
+    merge = {"count": F("count") + 1, "last_actor_id": actor_id, "updated": when}
+    if rows.update(**merge):
+        metrics.notification_writes.labels("merged").inc()
+        return
+    try:
+        with transaction.atomic():
+            Notification.objects.create(
+                recipient_id=recipient_id,
+                kind=kind,
+                post_id=post_id,
+                last_actor_id=actor_id,
+                created=when,
+                updated=when,
+            )
+    except IntegrityError:
+        # Opened by a concurrent event
+        rows.update(**merge)
+        metrics.notification_writes.labels("merged").inc()
+        return
+    _adjust_unread(recipient_id, 1)
+    metrics.notification_writes.labels("opened").inc()
+
+
+def withdraw(recipient_id, kind, actor_id, when, post_id=None):
+    """
+    Take back ``actor_id``'s event from ``when`` (the time of the like or
+    follow being undone), if the recipient's open row counted it.
+    """
+    # Rows opened after the event did not count it
+    rows = _open(recipient_id, kind, post_id).filter(created__lte=when)
+    removed, _ = rows.filter(count__lte=1).delete()
+    if removed:
+        _adjust_unread(recipient_id, -1)
+        metrics.notification_writes.labels("removed").inc()
+        return
+    if rows.update(count=F("count") - 1):
+        rows.filter(last_actor_id=actor_id).update(last_actor=None)
+        metrics.notification_writes.labels("withdrawn").inc()
+
+
+def mark_read(user, ids=None):
+    """Mark the user's unread rows (those in ``ids``, or all) read; returns how many."""
+    rows = Notification.objects.filter(recipient=user, read_at__isnull=True)
+    if ids is not None:
+        rows = rows.filter(pk__in=ids)
+    with transaction.atomic():
+        read = rows.update(read_at=timezone.now())
+        if read:
+            _adjust_unread(user.pk, -read)
+    metrics.notification_writes.labels("read").inc(read)
+    return read
+
+
+def unread_count(user):
+    return (
+        UserProfile.objects.filter(user=user)
+        .values_list("unread_notifications", flat=True)
+        .first()
+        or 0
+    )
+
+
+def record_purged(notification_ids):
+    """Uncount unread rows deleted with their posts (see motion/purge.py)."""
+    unread = Counter(
+        Notification.objects.filter(
+            pk__in=notification_ids, read_at__isnull=True
+        ).values_list("recipient_id", flat=True)
+    )
+    for recipient_id, count in unread.items():
+        _adjust_unread(recipient_id, -count)
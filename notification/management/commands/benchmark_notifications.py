@@ -0,0 +1,171 @@
+import random
+import statistics
+import threading
+import time
+import uuid
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.utils import timezone
+
+from notification import inbox
+from notification.models import Notification
+from post.models import ChangeEvent, Post
+from user.models import User
+from user_profile.models import UserProfile
+
+_WRITES = ("INSERT", "UPDATE", "DELETE")
+
+
+def _hammer(events, read_every, results):
+    timings = []
+    writes = 0
+
+    def count_writes(execute, sql, params, many, context):
+        nonlocal writes
+        writes += sql.lstrip().upper().startswith(_WRITES)
+        return execute(sql, params, many, context)
+
+    try:
+        with connection.execute_wrapper(count_writes):
+            for i, (recipient_id, actor_id, post_id) in enumerate(events, 1):
+                start = time.perf_counter()
+                with transaction.atomic():
+                    inbox.notify(
+                        recipient_id,
+                        Notification.LIKE,
+                        actor_id,
+                        timezone.now(),
+                        post_id,
+                    )
+                timings.append(time.perf_counter() - start)
+                if read_every and i % read_every == 0:
+                    inbox.mark_read(User(pk=recipient_id))
+    finally:
+        # No request ends in this thread to close its connection
+        connection.close()
+    results.append((timings, writes))
+
+
+class Command(BaseCommand):
+    help = (
+        "Measure the cost and write amplification of like notifications from "
+        "several threads, on throwaway users and posts deleted afterwards. "
+        "Refuses to run with DEBUG off unless given --i-know"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--threads", type=int, default=4)
+        parser.add_argument("--events", type=int, default=2000, help="Per thread")
+        parser.add_argument("--actors", type=int, default=1000)
+        parser.add_argument(
+            "--posts", type=int, default=10, help="Liked posts, one author each"
+        )
+        parser.add_argument(
+            "--viral",
+            type=float,
+            default=0.8,
+            help="Share of the likes that go to the first post",
+        )
+        parser.add_argument(
+            "--read-every",
+            type=int,
+            default=0,
+            help="Authors read their notifications every N likes (0: never)",
+        )
+        parser.add_argument(
+            "--i-know",
+            action="store_true",
+            help="Run with DEBUG off: writes to the configured database, with the "
+            "side effects of real posts (change events, pushed events, metrics)",
+        )
+
+    def _setup(self, prefix, authors, actors):
+        User.objects.bulk_create(
+            User(username=f"{prefix}{i}", email=f"{prefix}{i}@bench.invalid")
+            for i in range(authors + actors)
+        )
+        users = list(User.objects.filter(username__startswith=prefix).order_by("pk"))
+        profiles = UserProfile.objects.bulk_create(
+            UserProfile(user=user) for user in users[:authors]
+        )
+        posts = [
+            Post.objects.create(user=profile, content="benchmark")
+            for profile in profiles
+        ]
+        return posts, [user.pk for user in users[authors:]]
+
+    def handle(self, *args, **options):
+        if not settings.DEBUG and not options["i_know"]:
+            raise CommandError(
+                "This creates and deletes thousands of users on the configured "
+                f"database ({connection.settings_dict['NAME']}). Run it with DEBUG "
+                "on, or pass --i-know."
+            )
+        prefix = f"bench-{uuid.uuid4().hex[:8]}-"
+        posts, actor_ids = self._setup(prefix, options["posts"], options["actors"])
+        targets = [(post.user.user_id, post.pk) for post in posts]
+
+        def like():
+            recipient_id, post_id = (
+                targets[0]
+                if random.random() < options["viral"]
+                else random.choice(targets)
+            )
+            return recipient_id, random.choice(actor_ids), post_id
+
+        results = []
+        threads = [
+            threading.Thread(
+                target=_hammer,
+                args=(
+                    [like() for _ in range(options["events"])],
+                    options["read_every"],
+                    results,
+                ),
+            )
+            for _ in range(options["threads"])
+        ]
+        try:
+            started = time.perf_counter()
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            elapsed = time.perf_counter() - started
+            rows = Notification.objects.filter(
+                recipient__username__startswith=prefix
+            ).count()
+        finally:
+            with transaction.atomic():
+                Notification.objects.filter(
+                    recipient__username__startswith=prefix
+                ).delete()
+                ChangeEvent.objects.filter(
+                    post__in=[post.pk for post in posts]
+                ).delete()
+                Post.all_objects.filter(pk__in=[post.pk for post in posts]).delete()
+                User.all_objects.filter(username__startswith=prefix).delete()
+
+        timings = sorted(t for worker_timings, _ in results for t in worker_timings)
+        writes = sum(count for _, count in results)
+        events = len(timings)
+
+        def percentile(p):
+            return timings[min(events - 1, int(events * p))] * 1e3
+
+        self.stdout.write(
+            f"{events} likes in {elapsed:.2f}s "
+            f"({events / elapsed:,.0f}/s over {len(threads)} threads)"
+        )
+        self.stdout.write(
+            f"per like: mean {statistics.fmean(timings) * 1e3:.2f}ms, "
+            f"p50 {percentile(0.5):.2f}ms, p99 {percentile(0.99):.2f}ms"
+        )
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"{writes} writes ({writes / events:.2f} per like), "
+                f"{rows} notification rows ({rows / events:.4f} per like)"
+            )
+        )
@@ -0,0 +1,95 @@
+# Generated by Django 6.0 on 2026-10-19 21:00
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        ("post", "0007_hashtags"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="Notification",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "kind",
+                    models.CharField(
+                        choices=[("like", "Post liked"), ("follow", "New follower")],
+                        max_length=10,
+                    ),
+                ),
+                ("count", models.PositiveIntegerField(default=1)),
+                ("created", models.DateTimeField()),
+                ("updated", models.DateTimeField()),
+                ("read_at", models.DateTimeField(blank=True, null=True)),
+                (
+                    "last_actor",
+                    models.ForeignKey(
+                        blank=True,
+                        null=True,
+                        on_delete=django.db.models.deletion.SET_NULL,
+                        related_name="+",
+                        to=settings.AUTH_USER_MODEL,
+                    ),
+                ),
+                (
+                    "post",
+                    models.ForeignKey(
+                        blank=True,
+                        null=True,
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="+",
+                        to="post.post",
+                    ),
+                ),
+                (
+                    "recipient",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="notifications",
+                        to=settings.AUTH_USER_MODEL,
+                    ),
+                ),
+            ],
+            options={
+                "indexes": [
+                    models.Index(
+                        fields=["recipient", "updated", "id"],
+                        name="notification_inbox_idx",
+                    )
+                ],
+                "constraints": [
+                    models.UniqueConstraint(
+                        condition=models.Q(
+                            ("post__isnull", False), ("read_at__isnull", True)
+                        ),
+                        fields=("recipient", "kind", "post"),
+                        name="unique_unread_post_notification",
+                    ),
+                    models.UniqueConstraint(
+                        condition=models.Q(
+                            ("post__isnull", True), ("read_at__isnull", True)
+                        ),
+                        fields=("recipient", "kind"),
+                        name="unique_unread_notification",
+                    ),
+                ],
+            },
+        ),
+    ]
@@ -0,0 +1,57 @@
+from django.db import models
+from django.db.models import Q
+
+from post.models import Post
+from user.models import User
+
+
+class Notification(models.Model):
+    """
+    One inbox entry: every like of a post, or every new follower, since the
+    recipient last read it, merged into one row (see notification/inbox.py).
+    """
+
+    LIKE = "like"
+    FOLLOW = "follow"
+    KIND_CHOICES = [(LIKE, "Post liked"), (FOLLOW, "New follower")]
+
+    recipient = models.ForeignKey(
+        User, on_delete=models.CASCADE, related_name="notifications"
+    )
+    kind = models.CharField(max_length=10, choices=KIND_CHOICES)
+    # The liked post; none for follows
+    post = models.ForeignKey(
+        Post, null=True, blank=True, on_delete=models.CASCADE, related_name="+"
+    )
+    # Events merged into the row, and who caused the latest one
+    count = models.PositiveIntegerField(default=1)
+    last_actor = models.ForeignKey(
+        User, null=True, blank=True, on_delete=models.SET_NULL, related_name="+"
+    )
+    created = models.DateTimeField()
+    updated = models.DateTimeField()
+    read_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        constraints = [
+            # One unread row per target, which new events are merged into
+            models.UniqueConstraint(
+                fields=["recipient", "kind", "post"],
+                condition=Q(read_at__isnull=True, post__isnull=False),
+                name="unique_unread_post_notification",
+            ),
+            models.UniqueConstraint(
+                fields=["recipient", "kind"],
+                condition=Q(read_at__isnull=True, post__isnull=True),
+                name="unique_unread_notification",
+            ),
+        ]
+        indexes = [
+            # The inbox, most recently updated first
+            models.Index(
+                fields=["recipient", "updated", "id"], name="notification_inbox_idx"
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.kind} x{self.count} for user #{self.recipient_id}"
@@ -0,0 +1,34 @@
+from django.conf import settings
+from rest_framework import serializers
+from rest_framework.serializers import ModelSerializer
+
+from notification.models import Notification
+from user.serializers import UserSerializer
+
+
+class NotificationSerializer(ModelSerializer):
+    # Who caused the latest of the ``count`` merged events
+    last_actor = UserSerializer(read_only=True)
+
+    class Meta:
+        model = Notification
+        fields = [
+            "id",
+            "kind",
+            "post",
+            "count",
+            "last_actor",
+            "created",
+            "updated",
+            "read_at",
+        ]
+        read_only_fields = fields
+
+
+class MarkReadSerializer(serializers.Serializer):
+    ids = serializers.ListField(
+        child=serializers.IntegerField(),
+        required=False,
+        max_length=settings.NOTIFICATION_MARK_READ_MAX,
+        help_text="Notifications to mark read; all of them if left out",
+    )
@@ -0,0 +1,88 @@
+from datetime import timedelta
+
+from django.test import TestCase
+from django.utils import timezone
+
+from notification import inbox
+from notification.models import Notification
+from post.models import Post
+from user.models import User
+
+
+def make_user(name):
+    return User.objects.create_user(
+        username=name, email=f"{name}@example.com", password="x"
+    )
+
+
+class InboxTests(TestCase):
+    def setUp(self):
+        self.author = make_user("author")
+        self.fans = [make_user(f"fan{i}") for i in range(3)]
+        self.post = Post.objects.create(user=self.author.profile, content="hello")
+        self.now = timezone.now()
+
+    def like(self, fan, when=None):
+        inbox.notify(
+            self.author.pk,
+            Notification.LIKE,
+            fan.pk,
+            when or self.now,
+            post_id=self.post.pk,
+        )
+
+    def unlike(self, fan, when=None):
+        inbox.withdraw(
+            self.author.pk,
+            Notification.LIKE,
+            fan.pk,
+            when or self.now,
+            post_id=self.post.pk,
+        )
+
+    def rows(self):
+        return list(
+            Notification.objects.filter(recipient=self.author)
+            .order_by("pk")
+            .values_list("count", "last_actor_id", "read_at")
+        )
+
+    def test_events_merge_into_the_open_row(self):
+        for fan in self.fans:
+            self.like(fan)
+        self.assertEqual(self.rows(), [(3, self.fans[2].pk, None)])
+        self.assertEqual(inbox.unread_count(self.author), 1)
+
+    def test_own_events_are_ignored(self):
+        self.like(self.author)
+        self.assertEqual(self.rows(), [])
+        self.assertEqual(inbox.unread_count(self.author), 0)
+
+    def test_reading_closes_the_row(self):
+        self.like(self.fans[0])
+        self.assertEqual(inbox.mark_read(self.author), 1)
+        self.assertEqual(inbox.unread_count(self.author), 0)
+        self.like(self.fans[1])
+        rows = self.rows()
+        self.assertEqual(len(rows), 2)
+        self.assertEqual(rows[1], (1, self.fans[1].pk, None))
+        self.assertEqual(inbox.unread_count(self.author), 1)
+
+    def test_withdraw_decrements_then_removes(self):
+        self.like(self.fans[0])
+        self.like(self.fans[1])
+        self.unlike(self.fans[1])
+        self.assertEqual(self.rows(), [(1, None, None)])
+        self.assertEqual(inbox.unread_count(self.author), 1)
+        self.unlike(self.fans[0])
+        self.assertEqual(self.rows(), [])
+        self.assertEqual(inbox.unread_count(self.author), 0)
+
+    def test_withdraw_ignores_rows_opened_after_the_event(self):
+        self.like(self.fans[0], when=self.now - timedelta(hours=1))
+        inbox.mark_read(self.author)
+        self.like(self.fans[1])
+        # The undone like was counted in the row already read
+        self.unlike(self.fans[0], when=self.now - timedelta(hours=1))
+        self.assertEqual(self.rows()[1], (1, self.fans[1].pk, None))
+        self.assertEqual(inbox.unread_count(self.author), 1)
@@ -0,0 +1,13 @@
+from django.urls import path
+
+from notification.views import (
+    MarkReadAPIView,
+    NotificationListAPIView,
+    UnreadCountAPIView,
+)
+
+urlpatterns = [
+    path("", NotificationListAPIView.as_view()),
+    path("unread-count/", UnreadCountAPIView.as_view()),
+    path("read/", MarkReadAPIView.as_view()),
+]
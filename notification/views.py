@@ -0,0 +1,55 @@
+from rest_framework.generics import ListAPIView
+from rest_framework.permissions import IsAuthenticated
+from rest_framework.views import APIView, Response
+
+from motion.pagination import KeysetPagination
+from notification import inbox
+from notification.models import Notification
+from notification.serializers import MarkReadSerializer, NotificationSerializer
+
+
+class InboxPagination(KeysetPagination):
+    ordering = ("-updated", "-id")
+
+
+class NotificationListAPIView(ListAPIView):
+    """
+    GET: Your notifications, one per liked post or for your new followers
+    since you last read them, most recently updated first, in pages of
+    ?limit= (default 20, max 100) linked by next/previous cursors
+    """
+
+    serializer_class = NotificationSerializer
+    permission_classes = [IsAuthenticated]
+    pagination_class = InboxPagination
+
+    def get_queryset(self):
+        return Notification.objects.filter(recipient=self.request.user).select_related(
+            "last_actor__profile"
+        )
+
+
+class UnreadCountAPIView(APIView):
+    """
+    GET: Number of your unread notifications
+    """
+
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request):
+        return Response({"unread": inbox.unread_count(request.user)})
+
+
+class MarkReadAPIView(APIView):
+    """
+    POST: Mark the notifications ``ids`` read, or all of them without ``ids``;
+    answers the number marked and the remaining unread count
+    """
+
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request):
+        serializer = MarkReadSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        read = inbox.mark_read(request.user, serializer.validated_data.get("ids"))
+        return Response({"read": read, "unread": inbox.unread_count(request.user)})
@@ -0,0 +1,148 @@
+"""
+Change log for delta sync (``GET /backend/api/posts/changes/?since=<cursor>``).
+
+Every post creation, edit and deletion, account deletion, like, unlike,
+follow and unfollow appends a ChangeEvent in the transaction that makes the
+change. Its auto-increment id is the sync cursor. A client asks for the
+events after its cursor that concern it:
+
+- post events of the users it follows and of itself
+- likes and follows it made, or that are of its posts or of itself
+
+Each branch is a range scan of the ``(subject, id)`` or ``(actor, id)``
+index from the cursor, so a poll reads only the matching events newer than
+the cursor, however large the tables are.
+
+Ids are handed out when rows are inserted, not when they commit, so an
+event could appear behind a cursor that already passed it. Events therefore
+become visible CHANGES_SETTLE_SECONDS after they are written, which is
+longer than these short transactions stay open. Events older than
+CHANGES_RETENTION_DAYS are pruned (``manage.py prune_changes``). A cursor
+from before the retention window is expired, and the client must resync.
+"""
+
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from follow.models import Follow
+from motion import nplusone
+from post.models import ChangeEvent
+
+POST_KINDS = [
+    ChangeEvent.POST_CREATED,
+    ChangeEvent.POST_UPDATED,
+    ChangeEvent.POST_DELETED,
+    ChangeEvent.USER_DELETED,
+]
+
+
+class CursorExpired(Exception):
+    pass
+
+
+def record(kind, subject, actor=None, post=None):
+    ChangeEvent.objects.create(kind=kind, subject=subject, actor=actor, post=post)
+
+
+def record_follows_purged(follow_ids):
+    """Unfollow events for follows deleted with an account (see motion/purge.py)."""
+    ChangeEvent.objects.bulk_create(
+        ChangeEvent(
+            kind=ChangeEvent.FOLLOW_REMOVED, subject=following_id, actor=follower_id
+        )
+        for follower_id, following_id in Follow.objects.filter(
+            pk__in=follow_ids
+        ).values_list("follower_id", "following_id")
+    )
+
+
+def relevant_to(user):
+    """Events that concern ``user``."""
+    followees = Follow.objects.filter(follower=user).values("following_id")
+    return (
+        Q(kind__in=POST_KINDS, subject__in=followees)
+        | Q(subject=user.pk)
+        | Q(actor=user.pk)
+    )
+
+
+def _settled():
+    return timezone.now() - timedelta(seconds=settings.CHANGES_SETTLE_SECONDS)
+
+
+def latest_cursor():
+    """The cursor of a client that has seen every settled event."""
+    return (
+        ChangeEvent.objects.filter(created__lte=_settled())
+        .order_by("-id")
+        .values_list("id", flat=True)
+        .first()
+        or 0
+    )
+
+
+def changes_since(user, since, limit):
+    """
+    ``(events, cursor, has_more)``: up to ``limit`` events after ``since``
+    that concern ``user``, in order, and the cursor to continue from.
+    """
+    oldest = ChangeEvent.objects.order_by("id").values_list("id", flat=True).first()
+    if since and oldest is not None and since < oldest - 1:
+        raise CursorExpired
+    # The latest settled id is read first, so it cannot pass an event of the page
+    latest = latest_cursor()
+    events = list(
+        ChangeEvent.objects.filter(relevant_to(user), id__gt=since, id__lte=latest)
+        .order_by("id")
+        .values("id", "kind", "subject", "actor", "post")[: limit + 1]
+    )
+    if len(events) > limit:
+        return events[:limit], events[limit - 1]["id"], True
+    # Nothing else concerns the user up to the latest event, so skip past it
+    return events, max(since, latest), False
+
+
+def collapse(events):
+    """The net effect of ``events``: the last event about each thing wins."""
+    posts = {}
+    deleted_users = set()
+    likes = {}
+    follows = {}
+    for event in events:
+        kind = event["kind"]
+        if kind == ChangeEvent.USER_DELETED:
+            deleted_users.add(event["subject"])
+        elif kind in POST_KINDS:
+            posts[event["post"]] = kind != ChangeEvent.POST_DELETED
+        elif kind in (ChangeEvent.LIKE_ADDED, ChangeEvent.LIKE_REMOVED):
+            likes[(event["post"], event["actor"])] = kind == ChangeEvent.LIKE_ADDED
+        else:
+            follows[(event["actor"], event["subject"])] = (
+                kind == ChangeEvent.FOLLOW_ADDED
+            )
+    return posts, deleted_users, likes, follows
+
+
+def prune(older_than=None, batch_size=1000):
+    """Delete events older than CHANGES_RETENTION_DAYS, oldest first."""
+    cutoff = timezone.now() - (
+        older_than or timedelta(days=settings.CHANGES_RETENTION_DAYS)
+    )
+    # The newest event stays, so that expired cursors can still be told apart
+    newest = ChangeEvent.objects.order_by("-id").values_list("id", flat=True).first()
+    deleted = 0
+    while True:
+        ids = list(
+            ChangeEvent.objects.filter(created__lt=cutoff, id__lt=newest or 0)
+            .order_by("id")
+            .values_list("id", flat=True)[:batch_size]
+        )
+        if not ids:
+            return deleted
+        with transaction.atomic():
+            deleted += ChangeEvent.objects.filter(pk__in=ids).delete()[0]
+        nplusone.checkpoint()
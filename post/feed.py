@@ -0,0 +1,127 @@
+"""
+Following-feed engines, chosen per user by ``UserProfile.feed_engine``.
+
+``sql``
+    One query over all followed users' posts. Simple, but for users who
+    follow thousands of accounts it is a large ``IN`` over the posts table.
+``merge``
+    The "feeds" cache keeps each author's newest FEED_BUFFER_SIZE posts as
+    ``(sort key, post id)``, newest first. A page is a heap-based k-way merge
+    (``heapq.merge``) of the followees' buffers; cache misses are refilled
+    with one windowed query, and only the winning ids are loaded.
+
+A full buffer says nothing about its author's older posts, so the merge
+stops at the newest "horizon" (the oldest entry of any full buffer) and the
+rest of a deep page comes from the SQL engine.
+"""
+
+import heapq
+from datetime import UTC, datetime, timedelta
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db.models import F, Q, Window
+from django.db.models.functions import RowNumber
+
+from motion.metrics import record_cache_lookup
+from post.models import Post
+from user_profile.models import UserProfile
+
+_EPOCH = datetime(1970, 1, 1, tzinfo=UTC)
+
+
+def sort_key(created, post_id):
+    """Feed order key: microseconds since the epoch, then id (exact, unlike floats)."""
+    return ((created - _EPOCH) // timedelta(microseconds=1), post_id)
+
+
+def _buffer_key(profile_id):
+    return f"feed:recent:{profile_id}"
+
+
+def invalidate(profile_id):
+    """Forget an author's buffer after their posts changed."""
+    caches["feeds"].delete(_buffer_key(profile_id))
+
+
+def followee_profile_ids(user):
+    """Profile ids of the users ``user`` follows, as a lazy subquery."""
+    return UserProfile.objects.filter(user__followers__follower=user).values_list(
+        "id", flat=True
+    )
+
+
+def before_filter(before):
+    """Posts strictly older than the ``(created, id)`` cursor position."""
+    created, post_id = before
+    return Q(created__lt=created) | Q(created=created, id__lt=post_id)
+
+
+def sql_feed(profile_ids, before=None):
+    """The ``sql`` engine: a queryset of the authors' posts, newest first."""
+    queryset = Post.objects.filter(user_id__in=profile_ids)
+    if before is not None:
+        queryset = queryset.filter(before_filter(before))
+    return queryset.order_by("-created", "-id")
+
+
+def recent_posts(profile_ids):
+    """``{profile_id: [(sort key, post id), ...]}`` newest first, from the cache."""
+    cache = caches["feeds"]
+    keys = {_buffer_key(profile_id): profile_id for profile_id in profile_ids}
+    buffers = {keys[key]: buffer for key, buffer in cache.get_many(keys).items()}
+    missing = [profile_id for profile_id in profile_ids if profile_id not in buffers]
+    record_cache_lookup("feed_buffers", True, len(buffers))
+    record_cache_lookup("feed_buffers", False, len(missing))
+    if missing:
+        # Every missing author's newest posts in one query
+        fresh = {profile_id: [] for profile_id in missing}
+        rows = (
+            Post.objects.filter(user_id__in=missing)
+            .annotate(
+                rank=Window(
+                    RowNumber(),
+                    partition_by=F("user_id"),
+                    order_by=(F("created").desc(), F("id").desc()),
+                )
+            )
+            .filter(rank__lte=settings.FEED_BUFFER_SIZE)
+            .order_by("user_id", "-created", "-id")
+            .values_list("user_id", "created", "id")
+        )
+        for profile_id, created, post_id in rows:
+            fresh[profile_id].append(sort_key(created, post_id))
+        cache.set_many({_buffer_key(pid): buffer for pid, buffer in fresh.items()})
+        buffers.update(fresh)
+    return buffers
+
+
+def merged_feed(profile_ids, limit, before=None):
+    """
+    The ``merge`` engine: ids of the next ``limit`` posts (all of them if
+    ``limit`` is None), newest first.
+    """
+    profile_ids = list(profile_ids)
+    buffers = recent_posts(profile_ids).values()
+    horizon = max(
+        (buffer[-1] for buffer in buffers if len(buffer) >= settings.FEED_BUFFER_SIZE),
+        default=None,
+    )
+    position = None if before is None else sort_key(*before)
+    ids = []
+    for key in heapq.merge(*buffers, reverse=True):
+        if position is not None and key >= position:
+            continue
+        if horizon is not None and key < horizon:
+            break
+        ids.append(key[1])
+        position = key
+        if len(ids) == limit:
+            return ids
+    if horizon is not None:
+        # Older than some buffer reaches: finish the page from the database
+        if position is not None:
+            position = (_EPOCH + timedelta(microseconds=position[0]), position[1])
+        rest = sql_feed(profile_ids, position).values_list("id", flat=True)
+        ids += rest if limit is None else rest[: limit - len(ids)]
+    return ids
@@ -0,0 +1,172 @@
+"""
+Hashtags in post content: the per-tag feed (``GET
+/backend/api/posts/tag/<tag>/``) and the top tags (``GET
+/backend/api/posts/tags/top/``).
+
+A hashtag is a ``#`` that does not follow a word character, then a word
+containing a letter (``#django``, ``#día2``, not ``#1`` or ``&#39;``).
+Tags are case-insensitive and stored lowercased. PostSerializer syncs a
+post's PostHashtag rows with its content when it creates or updates the
+post, in the same transaction. The rows carry the post's creation time, so a
+tag's feed is a keyset scan of the ``(tag, created, post)`` index however
+many posts use the tag.
+
+The top tags are the tags used by the most posts created in the last
+HASHTAG_TOP_HOURS hours. The counts are kept per tag and hour
+(HashtagCount) and adjusted as posts gain or lose tags and as deleted posts
+are purged, so the ranking sums at most HASHTAG_TOP_HOURS rows per tag
+instead of scanning posts. The ranking is cached for
+HASHTAG_TOP_CACHE_SECONDS. ``manage.py prune_hashtag_counts`` deletes the
+hours that left the window; ``manage.py index_hashtags`` indexes posts
+written before hashtags were.
+"""
+
+import re
+from collections import Counter
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import IntegrityError, transaction
+from django.db.models import F, Sum, Value
+from django.db.models.functions import Greatest
+from django.utils import timezone
+
+from motion import nplusone
+from post.models import HashtagCount, Post, PostHashtag
+
+_HASHTAG = re.compile(r"(?<![\w&#])#(\w*[^\W\d_]\w*)")
+MAX_LENGTH = PostHashtag._meta.get_field("tag").max_length
+# Tags indexed per post, the first ones written
+MAX_PER_POST = 30
+_TOP_CACHE_KEY = "hashtags:top"
+
+
+def normalize(tag):
+    return tag.lstrip("#").lower()
+
+
+def extract(content):
+    """The distinct tags in ``content``, in order of appearance."""
+    tags = {}
+    for match in _HASHTAG.finditer(content):
+        tag = normalize(match.group(1))
+        if len(tag) <= MAX_LENGTH:
+            tags.setdefault(tag)
+            if len(tags) == MAX_PER_POST:
+                break
+    return list(tags)
+
+
+def _hour(when):
+    return when.replace(minute=0, second=0, microsecond=0)
+
+
+def _window_start():
+    return _hour(timezone.now()) - timedelta(hours=settings.HASHTAG_TOP_HOURS - 1)
+
+
+def _count(deltas):
+    """Add ``{(tag, hour): delta}`` to the hourly counts inside the window."""
+    start = _window_start()
+    # In a fixed order, so that concurrent posts lock the rows in the same order
+    for (tag, bucket), delta in sorted(deltas.items()):
+        if not delta or bucket < start:
+            continue
+        counts = HashtagCount.objects.filter(tag=tag, bucket=bucket)
+        if delta < 0:
+            counts.update(count=Greatest(F("count") + delta, Value(0)))
+            continue
+        if counts.update(count=F("count") + delta):
+            continue
+        try:
+            with transaction.atomic():
+                HashtagCount.objects.create(tag=tag, bucket=bucket, count=delta)
+        except IntegrityError:
+            # The hour's first post with the tag was counted concurrently
+            counts.update(count=F("count") + delta)
+
+
+def sync(post):
+    """
+    Make ``post``'s PostHashtag rows, and the counts, match its content;
+    True if they changed.
+    """
+    tags = set(extract(post.content))
+    with transaction.atomic():
+        current = set(post.hashtags.values_list("tag", flat=True))
+        added, removed = tags - current, current - tags
+        if removed:
+            post.hashtags.filter(tag__in=removed).delete()
+        PostHashtag.objects.bulk_create(
+            PostHashtag(post=post, tag=tag, created=post.created) for tag in added
+        )
+        bucket = _hour(post.created)
+        _count(
+            {(tag, bucket): 1 for tag in added} | {(tag, bucket): -1 for tag in removed}
+        )
+    return bool(added or removed)
+
+
+def index_posts(batch_size=1000, progress=None):
+    """
+    Sync every post's hashtags, ``batch_size`` posts at a time, calling
+    ``progress(last_id, changed)`` after each batch; returns the number of
+    posts whose hashtags changed.
+    """
+    changed = 0
+    last_id = 0
+    while True:
+        posts = list(
+            Post.objects.filter(pk__gt=last_id)
+            .order_by("pk")
+            .only("id", "content", "created")[:batch_size]
+        )
+        if not posts:
+            return changed
+        changed += sum(sync(post) for post in posts)
+        nplusone.checkpoint()
+        last_id = posts[-1].pk
+        if progress is not None:
+            progress(last_id, changed)
+
+
+def record_purged(hashtag_ids):
+    """Uncount hashtags deleted with their posts (see motion/purge.py)."""
+    purged = Counter(
+        (tag, _hour(created))
+        for tag, created in PostHashtag.objects.filter(pk__in=hashtag_ids).values_list(
+            "tag", "created"
+        )
+    )
+    _count({key: -count for key, count in purged.items()})
+
+
+def top(limit):
+    """``[{"tag", "posts"}]``: the ``limit`` most used tags, most used first."""
+    ranking = cache.get(_TOP_CACHE_KEY)
+    if ranking is None:
+        ranking = list(
+            HashtagCount.objects.filter(bucket__gte=_window_start(), count__gt=0)
+            .values("tag")
+            .annotate(posts=Sum("count"))
+            .order_by("-posts", "tag")[: settings.HASHTAG_TOP_MAX]
+        )
+        cache.set(_TOP_CACHE_KEY, ranking, settings.HASHTAG_TOP_CACHE_SECONDS)
+    return ranking[:limit]
+
+
+def prune_counts(batch_size=1000):
+    """Delete the hourly counts that left the window."""
+    start = _window_start()
+    deleted = 0
+    while True:
+        ids = list(
+            HashtagCount.objects.filter(bucket__lt=start)
+            .order_by("pk")
+            .values_list("pk", flat=True)[:batch_size]
+        )
+        if not ids:
+            return deleted
+        deleted += HashtagCount.objects.filter(pk__in=ids).delete()[0]
+        nplusone.checkpoint()
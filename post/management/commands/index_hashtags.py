@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+
+from motion.nplusone import detect_n_plus_one
+from post.hashtags import index_posts
+
+
+class Command(BaseCommand):
+    help = "Index the hashtags of every post, e.g. of posts written before they were"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=1000)
+
+    # Syncing posts one by one is inherent to this backfill
+    @detect_n_plus_one("index_hashtags", allowlist=[r"in index_posts$"])
+    def handle(self, *args, **options):
+        def progress(last_id, changed):
+            self.stdout.write(f"Indexed posts up to #{last_id}, {changed} changed")
+
+        changed = index_posts(options["batch_size"], progress)
+        self.stdout.write(
+            self.style.SUCCESS(f"Updated the hashtags of {changed} post(s)")
+        )
@@ -0,0 +1,22 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+
+from motion.nplusone import detect_n_plus_one
+from post.changes import prune
+
+
+class Command(BaseCommand):
+    help = "Delete change log events older than CHANGES_RETENTION_DAYS"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--days", type=int, default=None, help="Keep this many days instead"
+        )
+        parser.add_argument("--batch-size", type=int, default=1000)
+
+    @detect_n_plus_one("prune_changes")
+    def handle(self, *args, **options):
+        older_than = options["days"] and timedelta(days=options["days"])
+        deleted = prune(older_than, options["batch_size"])
+        self.stdout.write(self.style.SUCCESS(f"Deleted {deleted} change event(s)"))
@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+
+from motion.nplusone import detect_n_plus_one
+from post.hashtags import prune_counts
+
+
+class Command(BaseCommand):
+    help = "Delete hourly hashtag counts older than HASHTAG_TOP_HOURS"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=1000)
+
+    @detect_n_plus_one("prune_hashtag_counts")
+    def handle(self, *args, **options):
+        deleted = prune_counts(options["batch_size"])
+        self.stdout.write(self.style.SUCCESS(f"Deleted {deleted} hashtag count(s)"))
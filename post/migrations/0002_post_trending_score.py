@@ -0,0 +1,41 @@
+# Generated by Django 6.0 on 2026-10-19 15:31
+
+from django.db import migrations, models
+from django.db.models import Count
+
+BATCH_SIZE = 1000
+
+
+def backfill_trending_score(apps, schema_editor):
+    from post.trending import backfill_score
+
+    Post = apps.get_model("post", "Post")
+    last_id = 0
+    while True:
+        batch = list(
+            Post.objects.filter(id__gt=last_id)
+            .order_by("id")
+            .annotate(likes_count=Count("likes"))[:BATCH_SIZE]
+        )
+        if not batch:
+            break
+        for post in batch:
+            post.trending_score = backfill_score(post.created, post.likes_count)
+        Post.objects.bulk_update(batch, ["trending_score"])
+        last_id = batch[-1].id
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("post", "0001_initial"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="post",
+            name="trending_score",
+            field=models.FloatField(db_index=True, default=0.0, editable=False),
+        ),
+        migrations.RunPython(backfill_trending_score, migrations.RunPython.noop),
+    ]
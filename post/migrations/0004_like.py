@@ -0,0 +1,108 @@
+# Generated by Django 6.0 on 2026-10-19 16:00
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models, transaction
+from django.db.models import OuterRef, Subquery
+
+BATCH_SIZE = 5000
+
+
+def backfill_created(apps, schema_editor):
+    """
+    Existing likes have no timestamp; date them at their post's creation, the
+    time post/trending.py's backfill already counted them at. One transaction
+    per batch keeps locks short on large tables.
+    """
+    Like = apps.get_model("post", "Like")
+    Post = apps.get_model("post", "Post")
+    created = Post.objects.filter(pk=OuterRef("post_id")).values("created")[:1]
+    last_id = 0
+    while True:
+        ids = list(
+            Like.objects.filter(pk__gt=last_id, created__isnull=True)
+            .order_by("pk")
+            .values_list("pk", flat=True)[:BATCH_SIZE]
+        )
+        if not ids:
+            break
+        with transaction.atomic():
+            Like.objects.filter(pk__in=ids).update(created=Subquery(created))
+        last_id = ids[-1]
+
+
+class Migration(migrations.Migration):
+    # Batches commit on their own
+    atomic = False
+
+    dependencies = [
+        ("post", "0003_post_deleted_at"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        # The implicit many-to-many table becomes the Like model as it is
+        migrations.SeparateDatabaseAndState(
+            state_operations=[
+                migrations.CreateModel(
+                    name="Like",
+                    fields=[
+                        (
+                            "id",
+                            models.BigAutoField(
+                                auto_created=True,
+                                primary_key=True,
+                                serialize=False,
+                                verbose_name="ID",
+                            ),
+                        ),
+                        (
+                            "post",
+                            models.ForeignKey(
+                                on_delete=django.db.models.deletion.CASCADE,
+                                to="post.post",
+                            ),
+                        ),
+                        (
+                            "user",
+                            models.ForeignKey(
+                                on_delete=django.db.models.deletion.CASCADE,
+                                to=settings.AUTH_USER_MODEL,
+                            ),
+                        ),
+                    ],
+                    options={
+                        "db_table": "post_post_likes",
+                        "unique_together": {("post", "user")},
+                    },
+                ),
+                migrations.AlterField(
+                    model_name="post",
+                    name="likes",
+                    field=models.ManyToManyField(
+                        blank=True,
+                        related_name="liked_posts",
+                        through="post.Like",
+                        to=settings.AUTH_USER_MODEL,
+                    ),
+                ),
+            ],
+        ),
+        migrations.AddField(
+            model_name="like",
+            name="created",
+            field=models.DateTimeField(null=True),
+        ),
+        migrations.RunPython(backfill_created, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name="like",
+            name="created",
+            field=models.DateTimeField(auto_now_add=True),
+        ),
+        migrations.AddIndex(
+            model_name="like",
+            index=models.Index(
+                fields=["user", "created", "post"], name="like_user_timeline_idx"
+            ),
+        ),
+    ]
@@ -0,0 +1,22 @@
+# Generated by Django 6.0 on 2026-10-19 16:20
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("post", "0004_like"),
+        ("user_profile", "0003_userprofile_feed_engine"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="post",
+            index=models.Index(
+                fields=["user", "-created"], name="post_author_recent_idx"
+            ),
+        ),
+    ]
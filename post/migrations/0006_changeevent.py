@@ -0,0 +1,53 @@
+# Generated by Django 6.0 on 2026-10-19 18:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("post", "0005_post_post_author_recent_idx"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ChangeEvent",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "kind",
+                    models.CharField(
+                        choices=[
+                            ("post_created", "Post created"),
+                            ("post_updated", "Post updated"),
+                            ("post_deleted", "Post deleted"),
+                            ("user_deleted", "User deleted"),
+                            ("like_added", "Like added"),
+                            ("like_removed", "Like removed"),
+                            ("follow_added", "Follow added"),
+                            ("follow_removed", "Follow removed"),
+                        ],
+                        max_length=20,
+                    ),
+                ),
+                ("subject", models.BigIntegerField()),
+                ("actor", models.BigIntegerField(blank=True, null=True)),
+                ("post", models.BigIntegerField(blank=True, null=True)),
+                ("created", models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                "indexes": [
+                    models.Index(fields=["subject", "id"], name="change_subject_idx"),
+                    models.Index(fields=["actor", "id"], name="change_actor_idx"),
+                ],
+            },
+        ),
+    ]
@@ -0,0 +1,67 @@
+# Generated by Django 6.0 on 2026-10-19 19:30
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("post", "0006_changeevent"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="HashtagCount",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("tag", models.CharField(max_length=100)),
+                ("bucket", models.DateTimeField()),
+                ("count", models.PositiveIntegerField(default=0)),
+            ],
+            options={
+                "unique_together": {("bucket", "tag")},
+            },
+        ),
+        migrations.CreateModel(
+            name="PostHashtag",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("tag", models.CharField(max_length=100)),
+                ("created", models.DateTimeField()),
+                (
+                    "post",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="hashtags",
+                        to="post.post",
+                    ),
+                ),
+            ],
+            options={
+                "indexes": [
+                    models.Index(
+                        fields=["tag", "created", "post"],
+                        name="hashtag_tag_timeline_idx",
+                    )
+                ],
+                "unique_together": {("post", "tag")},
+            },
+        ),
+    ]
@@ -1,9 +1,47 @@
-from django.db import models
+from django.db import models, transaction
+from django.db.models import Count, OuterRef, Prefetch, Subquery
+from django.db.models.functions import Coalesce
+from django.utils import timezone
 
 from user.models import User
 from user_profile.models import UserProfile
 
 
+class PostQuerySet(models.QuerySet):
+    def with_likes_count(self):
+        """Annotate ``likes_count`` (likes by accounts that are not deleted)."""
+        likes = (
+            Like.objects.filter(post=OuterRef("pk"), user__deleted_at__isnull=True)
+            .values("post")
+            .annotate(count=Count("*"))
+            .values("count")
+        )
+        return self.annotate(likes_count=Coalesce(Subquery(likes), 0))
+
+    def for_listing(self, authors=True):
+        """
+        Everything PostSerializer renders, in a constant number of queries;
+        ``authors=False`` leaves out the author join for compact payloads.
+        """
+        from image.models import Image
+
+        queryset = self.select_related("user__user") if authors else self
+        return queryset.prefetch_related(
+            Prefetch("images", queryset=Image.objects.select_related("blob"))
+        ).with_likes_count()
+
+
+class PostManager(models.Manager.from_queryset(PostQuerySet)):
+    """Hides deleted posts and posts of deleted accounts."""
+
+    def get_queryset(self):
+        return (
+            super()
+            .get_queryset()
+            .filter(deleted_at__isnull=True, user__user__deleted_at__isnull=True)
+        )
+
+
 # Create your models here.
 class Post(models.Model):
     user = models.ForeignKey(
@@ -12,7 +50,168 @@ class Post(models.Model):
     content = models.TextField()
     created = models.DateTimeField(auto_now_add=True)
     updated = models.DateTimeField(auto_now=True)
-    likes = models.ManyToManyField(User, related_name="liked_posts", blank=True)
+    likes = models.ManyToManyField(
+        User, through="Like", related_name="liked_posts", blank=True
+    )
+    # Log-space, time-decayed engagement score, see post/trending.py
+    trending_score = models.FloatField(default=0.0, db_index=True, editable=False)
+    # Set when the post is deleted; rows are purged in the background
+    deleted_at = models.DateTimeField(null=True, blank=True, editable=False)
+
+    objects = PostManager()
+    all_objects = PostQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            # An author's newest posts, for feeds
+            models.Index(fields=["user", "-created"], name="post_author_recent_idx"),
+        ]
+
+    def save(self, *args, **kwargs):
+        adding = self._state.adding
+        if adding and not self.trending_score:
+            from post.trending import creation_score
+
+            self.trending_score = creation_score(self.created or timezone.now())
+        from post import changes, feed
+        from user_profile import counters
+
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            changes.record(
+                ChangeEvent.POST_CREATED if adding else ChangeEvent.POST_UPDATED,
+                self.user.user_id,
+                post=self.pk,
+            )
+            if adding:
+                counters.adjust(
+                    UserProfile.objects.filter(pk=self.user_id), 1, "posts_count"
+                )
+        if adding:
+            transaction.on_commit(lambda: feed.invalidate(self.user_id))
+            transaction.on_commit(self.announce)
+
+    def announce(self):
+        """Push the new post to the author's followers' event streams."""
+        from motion import pubsub, sse
+
+        author_id = self.user.user_id
+        pubsub.publish(
+            sse.posts_channel(author_id),
+            {
+                "event": "post",
+                "data": {
+                    "id": self.pk,
+                    "user": author_id,
+                    "created": self.created.isoformat(),
+                },
+            },
+        )
 
     def __str__(self):
         return f"Post #{self.id} by {self.user.user.username}"
+
+
+class Like(models.Model):
+    """A user's like of a post, and when it happened."""
+
+    post = models.ForeignKey(Post, on_delete=models.CASCADE)
+    user = models.ForeignKey(User, on_delete=models.CASCADE)
+    created = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        # The table of the former implicit many-to-many, kept with its rows
+        db_table = "post_post_likes"
+        # Also the (post, user) index used to count a post's likes
+        unique_together = [("post", "user")]
+        indexes = [
+            # A user's likes newest first, answered from the index alone
+            models.Index(
+                fields=["user", "created", "post"], name="like_user_timeline_idx"
+            ),
+        ]
+
+    def __str__(self):
+        return f"Like of post #{self.post_id} by user #{self.user_id}"
+
+
+class PostHashtag(models.Model):
+    """A hashtag written in a post, see post/hashtags.py."""
+
+    # Lowercased, without the "#"
+    tag = models.CharField(max_length=100)
+    post = models.ForeignKey(Post, on_delete=models.CASCADE, related_name="hashtags")
+    # The post's creation time, so that a tag's feed is read from the index alone
+    created = models.DateTimeField()
+
+    class Meta:
+        unique_together = [("post", "tag")]
+        indexes = [
+            # A tag's posts newest first
+            models.Index(
+                fields=["tag", "created", "post"], name="hashtag_tag_timeline_idx"
+            ),
+        ]
+
+    def __str__(self):
+        return f"#{self.tag} in post #{self.post_id}"
+
+
+class HashtagCount(models.Model):
+    """Posts created in one hour that use a tag, for the top tags."""
+
+    tag = models.CharField(max_length=100)
+    bucket = models.DateTimeField()
+    count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        # Bucket first: the top tags sum the rows of the last few buckets
+        unique_together = [("bucket", "tag")]
+
+    def __str__(self):
+        return f"#{self.tag} {self.bucket:%Y-%m-%d %H:00}: {self.count}"
+
+
+class ChangeEvent(models.Model):
+    """
+    One change to a post, like or follow, read by /posts/changes/ in ``id``
+    order (see post/changes.py). Plain ids rather than foreign keys, so that
+    tombstones outlive the rows they describe.
+    """
+
+    POST_CREATED = "post_created"
+    POST_UPDATED = "post_updated"
+    POST_DELETED = "post_deleted"
+    USER_DELETED = "user_deleted"
+    LIKE_ADDED = "like_added"
+    LIKE_REMOVED = "like_removed"
+    FOLLOW_ADDED = "follow_added"
+    FOLLOW_REMOVED = "follow_removed"
+    KIND_CHOICES = [
+        (POST_CREATED, "Post created"),
+        (POST_UPDATED, "Post updated"),
+        (POST_DELETED, "Post deleted"),
+        (USER_DELETED, "User deleted"),
+        (LIKE_ADDED, "Like added"),
+        (LIKE_REMOVED, "Like removed"),
+        (FOLLOW_ADDED, "Follow added"),
+        (FOLLOW_REMOVED, "Follow removed"),
+    ]
+
+    kind = models.CharField(max_length=20, choices=KIND_CHOICES)
+    # The user the change is about: the post's author, the liked post's
+    # author, the followed user, the deleted user
+    subject = models.BigIntegerField()
+    # The user who liked or followed
+    actor = models.BigIntegerField(null=True, blank=True)
+    post = models.BigIntegerField(null=True, blank=True)
+    created = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["subject", "id"], name="change_subject_idx"),
+            models.Index(fields=["actor", "id"], name="change_actor_idx"),
+        ]
+
+    def __str__(self):
+        return f"{self.kind} #{self.id}"
@@ -1,9 +1,18 @@
-from rest_framework.fields import IntegerField
-from rest_framework.serializers import ModelSerializer
+from django.conf import settings
+from django.db import transaction
+from rest_framework.serializers import (
+    FileField,
+    ListField,
+    ModelSerializer,
+    SerializerMethodField,
+)
 
 from image.models import Image
 from image.serializers import ImageSerializer
+from image.storage import store_upload
+from post import hashtags
 from post.models import Post
+from post.trending import decayed_value
 from user_profile.models import UserProfile
 from user_profile.serializers import UserProfileSerializer
 
@@ -11,7 +20,17 @@ from user_profile.serializers import UserProfileSerializer
 class PostSerializer(ModelSerializer):
     user = UserProfileSerializer(read_only=True)
     images = ImageSerializer(many=True, required=False)
-    likes_count = IntegerField(source="likes.count", read_only=True)
+    likes_count = SerializerMethodField()
+    # Image files sent as multipart/form-data (repeat the field for several)
+    uploads = ListField(
+        child=FileField(),
+        write_only=True,
+        required=False,
+        max_length=settings.IMAGE_UPLOAD_MAX_FILES,
+    )
+
+    # See motion/sparse.py
+    sparse_querysets = {"likes_count": "with_likes_count"}
 
     class Meta:
         model = Post
@@ -23,17 +42,47 @@ class PostSerializer(ModelSerializer):
             "updated",
             "likes_count",
             "images",
+            "uploads",
         ]
 
+    def get_likes_count(self, obj) -> int:
+        # Annotated by Post.objects.for_listing(); fall back for fresh instances
+        if hasattr(obj, "likes_count"):
+            return obj.likes_count
+        return obj.likes.count()
+
     def create(self, validated_data):
         images_data = validated_data.pop("images", [])
+        # Stored (or matched to an identical earlier upload) before the post exists
+        blobs = [store_upload(upload) for upload in validated_data.pop("uploads", [])]
         user = self.context["request"].user
         # Ensure user has a profile, create one if it doesn't exist
         user_profile, _ = UserProfile.objects.get_or_create(user=user)
 
-        post = Post.objects.create(user=user_profile, **validated_data)
+        with transaction.atomic():
+            post = Post.objects.create(user=user_profile, **validated_data)
+            hashtags.sync(post)
 
-        for img in images_data:
-            Image.objects.create(post=post, **img)
+            for img in images_data:
+                Image.objects.create(post=post, **img)
+            Image.objects.bulk_create(Image(post=post, blob=blob) for blob in blobs)
+
+        return post
 
+    def update(self, instance, validated_data):
+        with transaction.atomic():
+            post = super().update(instance, validated_data)
+            hashtags.sync(post)
         return post
+
+
+class TrendingPostSerializer(PostSerializer):
+    trending = SerializerMethodField()
+    sparse_requires = {"trending": ["trending_score"]}
+
+    class Meta(PostSerializer.Meta):
+        fields = PostSerializer.Meta.fields + ["trending"]
+
+    def get_trending(self, obj) -> float:
+        """Current decayed engagement value (1.0 = a brand-new post)"""
+        return round(decayed_value(obj.trending_score), 4)
@@ -1,3 +1,311 @@
-from django.test import TestCase
+from datetime import timedelta
+from unittest import mock
 
-# Create your tests here.
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from follow.models import Follow
+from post import hashtags, trending
+from post.changes import CursorExpired, changes_since
+from post.models import ChangeEvent, HashtagCount, Like, Post, PostHashtag
+from user.models import User
+from user_profile.models import UserProfile
+
+
+def make_user(name):
+    return User.objects.create_user(
+        username=name, email=f"{name}@example.com", password="x"
+    )
+
+
+class LikedPostsTests(TestCase):
+    def setUp(self):
+        author = make_user("author")
+        self.fan = make_user("fan")
+        self.posts = [
+            Post.objects.create(user=author.profile, content=str(i)) for i in range(3)
+        ]
+        for post in self.posts:
+            Like.objects.create(user=self.fan, post=post)
+        self.client = APIClient()
+        self.client.force_authenticate(self.fan)
+
+    def test_without_page_params_lists_every_liked_post(self):
+        response = self.client.get("/backend/api/posts/likes/")
+        self.assertEqual(
+            [post["id"] for post in response.json()],
+            [post.pk for post in reversed(self.posts)],
+        )
+
+    def test_limit_returns_cursor_pages(self):
+        response = self.client.get("/backend/api/posts/likes/?limit=2").json()
+        self.assertEqual(
+            [post["id"] for post in response["results"]],
+            [self.posts[2].pk, self.posts[1].pk],
+        )
+        response = self.client.get(response["next"]).json()
+        self.assertEqual(
+            [post["id"] for post in response["results"]], [self.posts[0].pk]
+        )
+        self.assertIsNone(response["next"])
+
+
+class ToggleLikeTests(TestCase):
+    def setUp(self):
+        self.post = Post.objects.create(user=make_user("author").profile, content="hi")
+        self.fan = make_user("fan")
+        self.client = APIClient()
+        self.client.force_authenticate(self.fan)
+
+    def toggle(self):
+        response = self.client.post(f"/backend/api/posts/toggle-like/{self.post.pk}/")
+        self.assertEqual(response.status_code, 200)
+        return response.json()["status"]
+
+    def events(self):
+        return ChangeEvent.objects.filter(post=self.post.pk).count()
+
+    def test_like_that_loses_a_race_counts_once(self):
+        self.assertEqual(self.toggle(), "liked")
+        events = self.events()
+        # As if a concurrent request liked the post after this one looked
+        with mock.patch.object(Like.objects, "filter") as likes:
+            likes.return_value.first.return_value = None
+            self.assertEqual(self.toggle(), "liked")
+        self.assertEqual(Like.objects.filter(post=self.post).count(), 1)
+        self.assertEqual(self.events(), events)
+
+    def test_unlike_that_loses_a_race_counts_once(self):
+        self.assertEqual(self.toggle(), "liked")
+        like = Like.objects.get(post=self.post)
+        Like.objects.filter(pk=like.pk).delete()
+        events = self.events()
+        with mock.patch.object(Like.objects, "filter") as likes:
+            likes.return_value.first.return_value = like
+            self.assertEqual(self.toggle(), "unliked")
+        self.assertEqual(self.events(), events)
+
+
+@override_settings(FEED_PAGE_SIZE=2)
+class FollowingFeedTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        author = make_user("author")
+        self.viewer = make_user("viewer")
+        Follow.objects.create(follower=self.viewer, following=author)
+        self.posts = [
+            Post.objects.create(user=author.profile, content=str(i)) for i in range(4)
+        ]
+        self.client = APIClient()
+        self.client.force_authenticate(self.viewer)
+
+    def feed(self, query=""):
+        response = self.client.get(f"/backend/api/posts/following/{query}")
+        return [post["id"] for post in response.json()]
+
+    def test_every_engine_pages_only_when_asked(self):
+        newest_first = [post.pk for post in reversed(self.posts)]
+        for engine in (UserProfile.SQL_FEED, UserProfile.MERGE_FEED):
+            with self.subTest(engine=engine):
+                UserProfile.objects.filter(user=self.viewer).update(feed_engine=engine)
+                self.assertEqual(self.feed(), newest_first)
+                self.assertEqual(self.feed("?limit=5"), newest_first)
+                # A page holds FEED_PAGE_SIZE posts unless ?limit= says otherwise
+                self.assertEqual(
+                    self.feed(f"?before={newest_first[0]}"), newest_first[1:3]
+                )
+                self.assertEqual(self.feed(f"?before={newest_first[3]}"), [])
+
+
+@override_settings(CHANGES_SETTLE_SECONDS=0)
+class ChangesSinceTests(TestCase):
+    def setUp(self):
+        self.viewer = make_user("viewer")
+        self.followee = make_user("followee")
+        self.stranger = make_user("stranger")
+        Follow.objects.create(follower=self.viewer, following=self.followee)
+
+    def post(self, user):
+        return Post.objects.create(user=user.profile, content="hi")
+
+    def test_pages_through_relevant_events(self):
+        first = self.post(self.followee)
+        self.post(self.stranger)
+        second = self.post(self.followee)
+
+        events, cursor, has_more = changes_since(self.viewer, 0, 1)
+        self.assertEqual([event["post"] for event in events], [first.pk])
+        self.assertTrue(has_more)
+        events, cursor, has_more = changes_since(self.viewer, cursor, 1)
+        self.assertEqual([event["post"] for event in events], [second.pk])
+        self.assertFalse(has_more)
+
+        # The stranger's later events move the cursor without being returned
+        self.post(self.stranger)
+        events, next_cursor, _ = changes_since(self.viewer, cursor, 10)
+        self.assertEqual(events, [])
+        self.assertEqual(next_cursor, ChangeEvent.objects.latest("id").pk)
+
+    @override_settings(CHANGES_SETTLE_SECONDS=60)
+    def test_unsettled_events_wait(self):
+        self.post(self.followee)
+        self.assertEqual(changes_since(self.viewer, 0, 10), ([], 0, False))
+
+    def test_cursor_before_the_pruned_events_expires(self):
+        posts = [self.post(self.followee) for _ in range(3)]
+        _, cursor, _ = changes_since(self.viewer, 0, 1)
+        ChangeEvent.objects.filter(post__in=[posts[0].pk, posts[1].pk]).delete()
+        with self.assertRaises(CursorExpired):
+            changes_since(self.viewer, cursor, 10)
+
+
+class HashtagTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.author = make_user("author")
+
+    def post(self, content):
+        post = Post.objects.create(user=self.author.profile, content=content)
+        hashtags.sync(post)
+        return post
+
+    def counts(self):
+        return dict(HashtagCount.objects.values_list("tag", "count"))
+
+    def test_extract(self):
+        self.assertEqual(
+            hashtags.extract("#Django and #django, #día2 but not #1, a#b or &#39;"),
+            ["django", "día2"],
+        )
+
+    def test_counts_follow_edits_and_purges(self):
+        post = self.post("#python #django")
+        self.post("#python")
+        self.assertEqual(self.counts(), {"python": 2, "django": 1})
+
+        post.content = "#django #rust"
+        self.assertTrue(hashtags.sync(post))
+        self.assertFalse(hashtags.sync(post))
+        self.assertEqual(self.counts(), {"python": 1, "django": 1, "rust": 1})
+
+        hashtags.record_purged(
+            PostHashtag.objects.filter(post=post).values_list("pk", flat=True)
+        )
+        self.assertEqual(self.counts(), {"python": 1, "django": 0, "rust": 0})
+
+    def test_top_ranks_by_posts(self):
+        self.post("#python #django")
+        self.post("#python")
+        self.assertEqual(
+            hashtags.top(5),
+            [{"tag": "python", "posts": 2}, {"tag": "django", "posts": 1}],
+        )
+
+
+@override_settings(TRENDING_HALF_LIFE_HOURS=12, TRENDING_LIKE_WEIGHT=1.0)
+class TrendingTests(TestCase):
+    def setUp(self):
+        self.author = make_user("author").profile
+        self.now = timezone.now()
+
+    def post(self, hours_ago):
+        created = self.now - timedelta(hours=hours_ago)
+        post = Post.objects.create(user=self.author, content="hi")
+        Post.objects.filter(pk=post.pk).update(
+            created=created, trending_score=trending.creation_score(created)
+        )
+        post.refresh_from_db()
+        return post
+
+    def like(self, post, times=1):
+        for _ in range(times):
+            trending.record_like(post, self.now)
+
+    def ranking(self):
+        return list(
+            Post.objects.order_by("-trending_score").values_list("pk", flat=True)
+        )
+
+    def test_value_halves_every_half_life(self):
+        score = trending.creation_score(self.now)
+        self.assertAlmostEqual(trending.decayed_value(score, self.now), 1.0)
+        self.assertAlmostEqual(
+            trending.decayed_value(score, self.now + timedelta(hours=12)), 0.5
+        )
+
+    def test_likes_outweigh_age_until_they_decay(self):
+        old, new = self.post(hours_ago=24), self.post(hours_ago=0)
+        self.assertEqual(self.ranking(), [new.pk, old.pk])
+        # Worth 1/4 now, plus 4 fresh likes, beats a fresh post on its own
+        self.like(old, 4)
+        self.assertEqual(self.ranking(), [old.pk, new.pk])
+        old.refresh_from_db()
+        self.assertAlmostEqual(
+            trending.decayed_value(old.trending_score, self.now), 4.25
+        )
+        self.like(new, 4)
+        self.assertEqual(self.ranking(), [new.pk, old.pk])
+
+    def test_unlike_takes_the_like_back(self):
+        post = self.post(hours_ago=1)
+        created_score = post.trending_score
+        self.like(post)
+        trending.record_unlike(post, self.now)
+        post.refresh_from_db()
+        self.assertAlmostEqual(post.trending_score, created_score)
+
+    @override_settings(TRENDING_LIKE_WEIGHT=0)
+    def test_zero_like_weight_ignores_likes(self):
+        post = self.post(hours_ago=1)
+        created_score = post.trending_score
+        self.like(post)
+        trending.record_unlike(post, self.now)
+        post.refresh_from_db()
+        self.assertEqual(post.trending_score, created_score)
+
+
+class CompactListingTests(TestCase):
+    def setUp(self):
+        self.viewer = make_user("viewer")
+        self.client = APIClient()
+        self.client.force_authenticate(self.viewer)
+        self.add_authors(2)
+
+    def add_authors(self, count):
+        start = UserProfile.objects.count()
+        for i in range(start, start + count):
+            author = make_user(f"author{i}")
+            Follow.objects.create(follower=self.viewer, following=author)
+            for _ in range(2):
+                Post.objects.create(user=author.profile, content=f"by {i}")
+
+    def get(self, query):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(f"/backend/api/posts/following/{query}")
+        self.assertEqual(response.status_code, 200)
+        return response.json(), len(queries)
+
+    def test_compact_posts_refer_to_their_included_authors(self):
+        full, _ = self.get("")
+        compact, _ = self.get("?compact=1")
+        self.assertEqual(len(compact["posts"]), len(full))
+        authors = {}
+        for post, compact_post in zip(full, compact["posts"], strict=True):
+            author = post.pop("user")
+            authors[str(author["id"])] = author
+            self.assertEqual(compact_post, {**post, "user": author["id"]})
+        self.assertEqual(compact["included"]["authors"], authors)
+        self.assertEqual(len(authors), 2)
+
+    def test_query_count_does_not_grow_with_the_page(self):
+        for query in ("", "?compact=1"):
+            with self.subTest(query=query):
+                _, few = self.get(query)
+                self.add_authors(3)
+                posts, many = self.get(query)
+                self.assertGreater(len(posts["posts"] if query else posts), 4)
+                self.assertEqual(few, many)
@@ -0,0 +1,100 @@
+"""
+Time-decayed trending score.
+
+A post's trending value at time ``t`` is
+
+    sum(weight_i * exp(-(t - t_i) / tau))
+
+over its creation (weight 1) and its likes (weight TRENDING_LIKE_WEIGHT, at
+the time of the like; with a weight of 0 likes do not count). Factoring out ``exp(-(t - EPOCH) / tau)``, which is
+the same for every post, leaves ``sum(weight_i * exp((t_i - EPOCH) / tau))``:
+a value that never changes with time, only with new events. We store its
+logarithm in ``Post.trending_score``, so
+
+* a like/unlike is one O(1) UPDATE (log-add / log-subtract in SQL),
+* ranking by the stored column is the same as ranking by the decayed value
+  at any moment, so "top K" is an index scan of K rows with no recomputation.
+"""
+
+import math
+from datetime import UTC, datetime
+
+from django.conf import settings
+from django.db.models import F, FloatField, Value
+from django.db.models.functions import Abs, Exp, Greatest, Ln
+from django.utils import timezone
+
+EPOCH = datetime(2025, 1, 1, tzinfo=UTC)
+# Smallest argument we pass to LN when an unlike removes (almost) everything
+_MIN_REMAINDER = 1e-12
+
+
+def tau():
+    """Decay time constant in seconds, derived from the configured half-life."""
+    return settings.TRENDING_HALF_LIFE_HOURS * 3600 / math.log(2)
+
+
+def event_score(when, weight=1.0):
+    """Log-space contribution of an event of ``weight`` happening at ``when``."""
+    return math.log(weight) + (when - EPOCH).total_seconds() / tau()
+
+
+def creation_score(created):
+    return event_score(created)
+
+
+def backfill_score(created, likes_count):
+    """Score for existing posts whose like times are unknown (counted at creation)."""
+    return creation_score(created) + math.log1p(
+        settings.TRENDING_LIKE_WEIGHT * likes_count
+    )
+
+
+def decayed_value(score, now=None):
+    """Current (decayed) trending value of a stored score."""
+    now = now or timezone.now()
+    return math.exp(score - (now - EPOCH).total_seconds() / tau())
+
+
+def _log_add(value):
+    # log(e^score + e^value), computed without overflow
+    value = Value(value, output_field=FloatField())
+    score = F("trending_score")
+    return Greatest(score, value) + Ln(1 + Exp(-Abs(score - value)))
+
+
+def _log_subtract(value, floor):
+    # log(e^score - e^value), never below the post's own creation score
+    value = Value(value, output_field=FloatField())
+    floor = Value(floor, output_field=FloatField())
+    score = F("trending_score")
+    remainder = Greatest(
+        1 - Exp(value - score), Value(_MIN_REMAINDER, output_field=FloatField())
+    )
+    return Greatest(floor, score + Ln(remainder))
+
+
+def record_like(post, when=None):
+    """Add one like to ``post``'s score with a single atomic UPDATE."""
+    from post.models import Post
+
+    if settings.TRENDING_LIKE_WEIGHT <= 0:
+        return
+    like = event_score(when or timezone.now(), settings.TRENDING_LIKE_WEIGHT)
+    Post.all_objects.filter(pk=post.pk).update(trending_score=_log_add(like))
+
+
+def record_unlike(post, liked_at=None):
+    """
+    Remove one like from ``post``'s score. Without the like's timestamp the
+    like is assumed to be recent, which removes at most what a fresh like
+    added; the score never drops below the post's creation score.
+    """
+    from post.models import Post
+
+    if settings.TRENDING_LIKE_WEIGHT <= 0:
+        return
+    like = event_score(liked_at or timezone.now(), settings.TRENDING_LIKE_WEIGHT)
+    Post.all_objects.filter(pk=post.pk).update(
+        trending_score=_log_subtract(like, creation_score(post.created))
+    )
@@ -2,10 +2,14 @@ from django.urls import path
 
 from post.views import (
     FollowingFeedAPIView,
+    HashtagPostsAPIView,
     LikedPostsAPIView,
+    PostChangesAPIView,
     PostDetailAPIView,
     PostListCreateAPIView,
     ToggleLikeAPIView,
+    TopHashtagsAPIView,
+    TrendingPostsAPIView,
     UserPostsAPIView,
 )
 
@@ -14,7 +18,11 @@ urlpatterns = [
     path("", PostListCreateAPIView.as_view()),
     path("<int:pk>/", PostDetailAPIView.as_view()),
     path("toggle-like/<int:post_id>/", ToggleLikeAPIView.as_view()),
+    path("trending/", TrendingPostsAPIView.as_view()),
     path("likes/", LikedPostsAPIView.as_view()),
     path("following/", FollowingFeedAPIView.as_view()),
+    path("changes/", PostChangesAPIView.as_view()),
+    path("tag/<str:tag>/", HashtagPostsAPIView.as_view()),
+    path("tags/top/", TopHashtagsAPIView.as_view()),
     path("user/<int:user_id>/", UserPostsAPIView.as_view()),
 ]
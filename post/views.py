@@ -1,3 +1,8 @@
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.shortcuts import get_object_or_404
+from rest_framework import status
+from rest_framework.exceptions import ValidationError
 from rest_framework.generics import (
     ListAPIView,
     ListCreateAPIView,
@@ -5,24 +10,103 @@ from rest_framework.generics import (
 )
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.views import APIView, Response
+
+from motion.pagination import KeysetPagination
 from motion.permissions import IsOwnerOrAdmin
-from user.models import User
-from post.models import Post
+from motion.sparse import SparseFieldsetsMixin, trim
+from motion.views import BackgroundDestroyMixin
+from notification import inbox
+from notification.models import Notification
+from post import changes, feed, hashtags, trending
+from post.models import ChangeEvent, Like, Post, PostHashtag
+from user_profile.models import UserProfile
+from user_profile.serializers import UserProfileSerializer
+
 from .serializers import (
     PostSerializer,
+    TrendingPostSerializer,
 )
 
 
+class PostListingMixin(SparseFieldsetsMixin):
+    """
+    Post endpoints: full output by default, ?fields= / ?expand= to trim it.
+    Lists also take ?compact=1: each post's author is an id into
+    ``included.authors``, which holds every distinct author once.
+    """
+
+    def is_compact(self):
+        return self.request.query_params.get("compact") in ("1", "true")
+
+    def get_full_queryset(self, queryset):
+        return queryset.for_listing(authors=not self.is_compact())
+
+    def get_serializer(self, *args, **kwargs):
+        serializer = super().get_serializer(*args, **kwargs)
+        if self.request.method == "GET" and self.is_compact():
+            trim(serializer, expand={"images"})
+        return serializer
+
+    def list(self, request, *args, **kwargs):
+        if not self.is_compact():
+            return super().list(request, *args, **kwargs)
+        posts = list(self.filter_queryset(self.get_queryset()))
+        return Response(self.get_compact_data(posts))
+
+    def list_by_post_id(self, rows):
+        """
+        A page of ``rows`` (``values()`` with a ``post_id``), read from their
+        index alone, with its posts loaded by id in one query.
+        """
+        paginated = self.paginate_queryset(rows)
+        if paginated is not None:
+            rows = paginated
+        post_ids = [row["post_id"] for row in rows]
+        posts = self.filter_queryset(self.get_queryset()).in_bulk(post_ids)
+        page = [posts[post_id] for post_id in post_ids if post_id in posts]
+        if self.is_compact():
+            data = self.get_compact_data(page)
+        else:
+            data = self.get_serializer(page, many=True).data
+        if paginated is None:
+            return Response(data)
+        return self.get_paginated_response(data)
+
+    def get_compact_data(self, posts):
+        authors = UserProfile.objects.select_related("user").filter(
+            id__in={post.user_id for post in posts}
+        )
+        return {
+            "posts": self.get_serializer(posts, many=True).data,
+            "included": {
+                "authors": {
+                    author["id"]: author
+                    for author in UserProfileSerializer(
+                        authors, many=True, context=self.get_serializer_context()
+                    ).data
+                }
+            },
+        }
+
+
 # Create your views here.
-class PostListCreateAPIView(ListCreateAPIView):
+class PostListCreateAPIView(PostListingMixin, ListCreateAPIView):
     serializer_class = PostSerializer
     permission_classes = [IsAuthenticated]
 
     def get_queryset(self):
-        return Post.objects.all().order_by("-created")
+        return Post.objects.order_by("-created")
 
 
-class PostDetailAPIView(RetrieveUpdateDestroyAPIView):
+class PostDetailAPIView(
+    BackgroundDestroyMixin, PostListingMixin, RetrieveUpdateDestroyAPIView
+):
+    """
+    GET: Post details
+    PUT/PATCH: Update post (owner/admin)
+    DELETE: Delete post (owner/admin), purged in the background (202)
+    """
+
     queryset = Post.objects.all()
     serializer_class = PostSerializer
     permission_classes = [IsOwnerOrAdmin]
@@ -30,41 +114,270 @@ class PostDetailAPIView(RetrieveUpdateDestroyAPIView):
 
 class ToggleLikeAPIView(APIView):
     permission_classes = [IsAuthenticated]
+    throttle_scope = "likes"
 
     def post(self, request, post_id):
-        post = Post.objects.get(id=post_id)
+        post = Post.objects.select_related("user").get(id=post_id)
         user = request.user
 
-        if user in post.likes.all():
-            post.likes.remove(user)
-            return Response({"status": "unliked"})
-        else:
-            post.likes.add(user)
-            return Response({"status": "liked"})
+        with transaction.atomic():
+            like = Like.objects.filter(post=post, user=user).first()
+            if like is not None:
+                deleted, _ = like.delete()
+                if not deleted:
+                    # Unliked by a concurrent request, which did the bookkeeping
+                    return Response({"status": "unliked"})
+                trending.record_unlike(post, like.created)
+                changes.record(
+                    ChangeEvent.LIKE_REMOVED, post.user.user_id, user.pk, post.pk
+                )
+                inbox.withdraw(
+                    post.user.user_id, Notification.LIKE, user.pk, like.created, post.pk
+                )
+                return Response({"status": "unliked"})
+            else:
+                try:
+                    with transaction.atomic():
+                        like = Like.objects.create(post=post, user=user)
+                except IntegrityError:
+                    # Liked by a concurrent request, which did the bookkeeping
+                    return Response({"status": "liked"})
+                trending.record_like(post, like.created)
+                changes.record(
+                    ChangeEvent.LIKE_ADDED, post.user.user_id, user.pk, post.pk
+                )
+                inbox.notify(
+                    post.user.user_id, Notification.LIKE, user.pk, like.created, post.pk
+                )
+                return Response({"status": "liked"})
+
 
+class TrendingPostsAPIView(PostListingMixin, ListAPIView):
+    """
+    GET: Top posts by time-decayed likes and recency (?limit=, default 20, max 100)
+    """
+
+    serializer_class = TrendingPostSerializer
+    permission_classes = [IsAuthenticated]
+    default_limit = 20
+    max_limit = 100
+
+    def get_queryset(self):
+        # Stored scores rank the same as decayed ones: an index scan of `limit` rows
+        return Post.objects.order_by("-trending_score")
+
+    def filter_queryset(self, queryset):
+        try:
+            limit = int(self.request.query_params.get("limit", self.default_limit))
+        except ValueError:
+            limit = self.default_limit
+        limit = min(max(limit, 1), self.max_limit)
+        return super().filter_queryset(queryset)[:limit]
+
+
+class LikePagination(KeysetPagination):
+    # Ties on the like time are broken by post, which is unique per user
+    ordering = ("-created", "-post_id")
+
+
+class LikedPostsAPIView(PostListingMixin, ListAPIView):
+    """
+    GET: Posts you've liked, most recently liked first. With ?limit=
+    (default 20, max 100) or ?cursor=, one page {next, previous, results}
+    linked by cursors; otherwise all of them as a plain list.
+    """
 
-class LikedPostsAPIView(ListAPIView):
     serializer_class = PostSerializer
     permission_classes = [IsAuthenticated]
+    pagination_class = LikePagination
+
+    @property
+    def paginator(self):
+        # Clients written before the cursors still get the whole list
+        params = self.request.query_params
+        if "limit" not in params and "cursor" not in params:
+            return None
+        return super().paginator
 
     def get_queryset(self):
-        return self.request.user.liked_posts.all().order_by("-created")
+        return Post.objects.all()
+
+    def list(self, request, *args, **kwargs):
+        # From the (user, created, post) index
+        return self.list_by_post_id(
+            Like.objects.filter(user=request.user)
+            .order_by(*LikePagination.ordering)
+            .values("post_id", "created")
+        )
+
+
+class HashtagPagination(KeysetPagination):
+    # Ties on the post time are broken by post, which is unique per tag
+    ordering = ("-created", "-post_id")
 
 
-class FollowingFeedAPIView(ListAPIView):
+class HashtagPostsAPIView(PostListingMixin, ListAPIView):
+    """
+    GET: Posts with the hashtag <tag> (any case, with or without the "#"),
+    newest first, in pages of ?limit= (default 20, max 100) linked by
+    next/previous cursors
+    """
+
+    serializer_class = PostSerializer
+    permission_classes = [IsAuthenticated]
+    pagination_class = HashtagPagination
+
+    def get_queryset(self):
+        return Post.objects.all()
+
+    def list(self, request, *args, **kwargs):
+        # From the (tag, created, post) index
+        return self.list_by_post_id(
+            PostHashtag.objects.filter(
+                tag=hashtags.normalize(self.kwargs["tag"])
+            ).values("post_id", "created")
+        )
+
+
+class TopHashtagsAPIView(APIView):
+    """
+    GET: The hashtags used by the most posts of the last HASHTAG_TOP_HOURS
+    hours, with their post counts (?limit=, default 10, max 50)
+    """
+
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request):
+        try:
+            limit = int(request.query_params.get("limit", settings.HASHTAG_TOP_LIMIT))
+        except ValueError:
+            limit = settings.HASHTAG_TOP_LIMIT
+        limit = min(max(limit, 1), settings.HASHTAG_TOP_MAX)
+        return Response(hashtags.top(limit))
+
+
+class FollowingFeedAPIView(PostListingMixin, ListAPIView):
+    """
+    GET: Posts of the users you follow, newest first. With ?limit= (default 50,
+    max 100) or ?before=<id>, one page of posts older than that post. Built by
+    your profile's feed engine
+    """
+
+    serializer_class = PostSerializer
+    permission_classes = [IsAuthenticated]
+
+    def get_queryset(self):
+        return Post.objects.all()
+
+    def get_page_params(self):
+        """``(limit, before)``; a limit of None means the whole feed."""
+        params = self.request.query_params
+        if "limit" not in params and "before" not in params:
+            return None, None
+        try:
+            limit = int(params.get("limit", settings.FEED_PAGE_SIZE))
+        except ValueError:
+            limit = settings.FEED_PAGE_SIZE
+        limit = min(max(limit, 1), settings.FEED_PAGE_MAX)
+        before = None
+        if "before" in params:
+            before = (
+                Post.all_objects.filter(pk=params["before"])
+                .values_list("created", "id")
+                .first()
+                if params["before"].isdigit()
+                else None
+            )
+            if before is None:
+                raise ValidationError({"before": "Unknown post."})
+        return limit, before
+
+    def get_posts(self):
+        limit, before = self.get_page_params()
+        profile_ids = feed.followee_profile_ids(self.request.user)
+        engine = (
+            UserProfile.objects.filter(user=self.request.user)
+            .values_list("feed_engine", flat=True)
+            .first()
+        )
+        if engine != UserProfile.MERGE_FEED:
+            queryset = feed.sql_feed(profile_ids, before)
+            return list(self.filter_queryset(queryset)[:limit])
+        post_ids = feed.merged_feed(profile_ids, limit, before)
+        posts = self.filter_queryset(self.get_queryset()).in_bulk(post_ids)
+        return [posts[post_id] for post_id in post_ids if post_id in posts]
+
+    def list(self, request, *args, **kwargs):
+        posts = self.get_posts()
+        if self.is_compact():
+            return Response(self.get_compact_data(posts))
+        return Response(self.get_serializer(posts, many=True).data)
+
+
+class PostChangesAPIView(PostListingMixin, ListAPIView):
+    """
+    GET: What changed since the cursor ?since= (see post/changes.py): posts of
+    the users you follow and yours, created/updated (current state) or deleted,
+    deleted users, and likes and follows by or of you. Continue from the
+    returned ``cursor``, right away while ``has_more``. Without ?since= only
+    the current cursor is returned; 410 means the cursor expired and the
+    client has to reload
+    """
+
     serializer_class = PostSerializer
     permission_classes = [IsAuthenticated]
 
     def get_queryset(self):
-        following_users = self.request.user.following.values_list(
-            "following", flat=True
+        return Post.objects.all()
+
+    def list(self, request, *args, **kwargs):
+        since = request.query_params.get("since")
+        if since is None:
+            return Response({"cursor": changes.latest_cursor()})
+        if not since.isdigit():
+            raise ValidationError({"since": "Invalid cursor."})
+        try:
+            events, cursor, has_more = changes.changes_since(
+                request.user, int(since), settings.CHANGES_PAGE_SIZE
+            )
+        except changes.CursorExpired:
+            return Response(
+                {"detail": "Cursor expired, reload and sync from a new one."},
+                status=status.HTTP_410_GONE,
+            )
+        posts, deleted_users, likes, follows = changes.collapse(events)
+        current = self.filter_queryset(self.get_queryset()).in_bulk(
+            [post_id for post_id, exists in posts.items() if exists]
         )
-        return Post.objects.filter(user__user__in=following_users).order_by("-created")
+        page = [current[post_id] for post_id in posts if post_id in current]
+        data = {
+            "cursor": cursor,
+            "has_more": has_more,
+            "posts": self.get_serializer(page, many=True).data,
+            # Including posts that were deleted again, or hidden since
+            "deleted_posts": [post_id for post_id in posts if post_id not in current],
+            "deleted_users": sorted(deleted_users),
+            "likes": [
+                {"post": post_id, "user": user_id, "liked": liked}
+                for (post_id, user_id), liked in likes.items()
+            ],
+            "follows": [
+                {"follower": follower, "following": following, "followed": followed}
+                for (follower, following), followed in follows.items()
+            ],
+        }
+        if self.is_compact():
+            data.update(self.get_compact_data(page))
+        return Response(data)
 
 
-class UserPostsAPIView(ListAPIView):
+class UserPostsAPIView(PostListingMixin, ListAPIView):
     serializer_class = PostSerializer
 
     def get_queryset(self):
-        user = User.objects.get(id=self.kwargs["user_id"])
-        return user.profile.posts.all().order_by("-created")
+        profile = get_object_or_404(
+            UserProfile.objects.only("id"),
+            user_id=self.kwargs["user_id"],
+            user__deleted_at__isnull=True,
+        )
+        return Post.objects.filter(user=profile).order_by("-created")
@@ -0,0 +1,145 @@
+#!/usr/bin/env python
+"""
+Login storm benchmark.
+
+Hammers POST /backend/api/token/ from many threads while a probe thread keeps
+requesting a cheap endpoint, and reports login throughput (with how many were
+rejected with 503 by the password hashing pool) plus the probe latency before
+and during the storm.
+
+    python scripts/bench_login_storm.py --base-url http://localhost:8000 \\
+        --email user@example.com --password secret --threads 32 --duration 20
+
+The "login" throttle scope (THROTTLE_RATE_LOGIN, 10/min per client) would
+answer almost every login of the storm with 429 before it reaches the
+password hasher. Run the server under test with the login and anonymous
+limits raised, e.g.
+
+    THROTTLE_RATE_LOGIN=100000/s THROTTLE_RATE_ANON=100000/s gunicorn ...
+
+429s are reported on their own, and the run is flagged when they dominate.
+"""
+
+import argparse
+import json
+import statistics
+import sys
+import threading
+import time
+import urllib.error
+import urllib.request
+from collections import Counter
+
+
+def post_json(url, payload):
+    request = urllib.request.Request(
+        url,
+        data=json.dumps(payload).encode(),
+        headers={"Content-Type": "application/json"},
+        method="POST",
+    )
+    try:
+        with urllib.request.urlopen(request, timeout=30) as response:
+            response.read()
+            return response.status
+    except urllib.error.HTTPError as exc:
+        return exc.code
+    except OSError:
+        return "error"
+
+
+def timed_get(url):
+    started = time.perf_counter()
+    try:
+        with urllib.request.urlopen(url, timeout=30) as response:
+            response.read()
+    except (urllib.error.HTTPError, OSError):
+        pass
+    return (time.perf_counter() - started) * 1000
+
+
+def percentiles(samples):
+    if not samples:
+        return "no samples"
+    ordered = sorted(samples)
+
+    def pick(q):
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+    return (
+        f"p50={statistics.median(ordered):.1f}ms p95={pick(0.95):.1f}ms "
+        f"p99={pick(0.99):.1f}ms n={len(ordered)}"
+    )
+
+
+def probe(url, stop, samples, interval):
+    while not stop.is_set():
+        samples.append(timed_get(url))
+        time.sleep(interval)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--base-url", default="http://localhost:8000")
+    parser.add_argument("--email", required=True)
+    parser.add_argument("--password", required=True)
+    parser.add_argument("--threads", type=int, default=32)
+    parser.add_argument("--duration", type=float, default=20)
+    parser.add_argument("--probe-path", default="/health/")
+    parser.add_argument("--probe-interval", type=float, default=0.05)
+    args = parser.parse_args()
+
+    token_url = f"{args.base_url}/backend/api/token/"
+    probe_url = f"{args.base_url}{args.probe_path}"
+    credentials = {"email": args.email, "password": args.password}
+
+    baseline = [timed_get(probe_url) for _ in range(50)]
+    print(f"probe baseline:     {percentiles(baseline)}")
+
+    stop = threading.Event()
+    statuses = Counter()
+    lock = threading.Lock()
+
+    def storm():
+        while not stop.is_set():
+            result = post_json(token_url, credentials)
+            with lock:
+                statuses[result] += 1
+
+    during = []
+    workers = [threading.Thread(target=storm) for _ in range(args.threads)]
+    workers.append(
+        threading.Thread(
+            target=probe, args=(probe_url, stop, during, args.probe_interval)
+        )
+    )
+    started = time.perf_counter()
+    for worker in workers:
+        worker.start()
+    time.sleep(args.duration)
+    stop.set()
+    for worker in workers:
+        worker.join()
+    elapsed = time.perf_counter() - started
+
+    total = sum(statuses.values())
+    ok, rejected = statuses.pop(200, 0), statuses.pop(503, 0)
+    throttled = statuses.pop(429, 0)
+    print(
+        f"logins: {total} in {elapsed:.1f}s ({total / elapsed:.1f}/s), "
+        f"ok={ok} ({ok / elapsed:.1f}/s), rejected 503={rejected}, "
+        f"throttled 429={throttled}, other={dict(statuses)}"
+    )
+    print(f"probe during storm: {percentiles(during)}")
+    if throttled > total / 2:
+        print(
+            "Most logins were throttled, so this measured the rate limiter, not "
+            "password hashing: raise THROTTLE_RATE_LOGIN and THROTTLE_RATE_ANON "
+            "on the server (see the module docstring).",
+            file=sys.stderr,
+        )
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
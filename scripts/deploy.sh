@@ -157,6 +157,18 @@ docker compose -f docker-compose.prod.yml down --remove-orphans || true
 echo "📥 Pulling latest images..."
 docker pull $BACKEND_IMAGE || echo "⚠️  Failed to pull image, will use existing"
 
+# Media directory, bind-mounted into the containers and served by the host nginx
+echo "🖼️  Preparing media directory..."
+MEDIA_DIR=/srv/motion-api/media
+sudo mkdir -p "$MEDIA_DIR"
+OLD_MEDIA_VOLUME="${COMPOSE_PROJECT_NAME:-motion-api}_media_volume"
+if docker volume inspect "$OLD_MEDIA_VOLUME" >/dev/null 2>&1 && [ -z "$(ls -A "$MEDIA_DIR")" ]; then
+  # Uploads used to live in a named volume
+  docker run --rm -v "$OLD_MEDIA_VOLUME":/from -v "$MEDIA_DIR":/to alpine cp -a /from/. /to/
+fi
+sudo chown -R 1000:1000 "$MEDIA_DIR"
+sudo chmod 755 "$MEDIA_DIR"
+
 # Start services
 echo "🚀 Starting services..."
 if [ -z "$BACKEND_IMAGE" ]; then
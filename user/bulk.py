@@ -0,0 +1,159 @@
+"""
+Bulk user import for migrating accounts from another system.
+
+Passwords must already be hashed in a format one of PASSWORD_HASHERS
+understands (e.g. ``pbkdf2_sha256$...`` or ``bcrypt_sha256$...``), so no
+hashing happens during the import. Users and their profiles are inserted
+with ``bulk_create`` in batches, one transaction per batch, instead of one
+``create_user`` call (hash + 2 INSERTs) per account.
+"""
+
+from time import perf_counter
+
+from django.contrib.auth.hashers import UNUSABLE_PASSWORD_PREFIX, identify_hasher
+from django.core.exceptions import ValidationError
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+
+from motion import nplusone
+from user.models import User
+from user.signals import profile_signal_muted
+from user_profile.models import UserProfile
+
+DEFAULT_BATCH_SIZE = 1000
+# Checked with the model fields' own validators (length, username characters...)
+VALIDATED_FIELDS = ("email", "username", "first_name", "last_name", "date_joined")
+
+
+def _clean_row(row):
+    """Return the User field values for one input row or raise ValueError/TypeError."""
+    if not isinstance(row, dict):
+        raise TypeError("each row must be an object")
+    email = User.objects.normalize_email(str(row.get("email") or "").strip())
+    username = str(row.get("username") or "").strip()
+    password = str(row.get("password") or "")
+    if not email or "@" not in email:
+        raise ValueError("a valid email is required")
+    if not username:
+        raise ValueError("username is required")
+    if not password.startswith(UNUSABLE_PASSWORD_PREFIX):
+        try:
+            identify_hasher(password)
+        except ValueError:
+            raise ValueError("password must be a hash produced by a known hasher")
+    values = {
+        "email": email,
+        "username": username,
+        "password": password,
+        "first_name": str(row.get("first_name") or ""),
+        "last_name": str(row.get("last_name") or ""),
+        "date_joined": row.get("date_joined") or timezone.now(),
+    }
+    for name in VALIDATED_FIELDS:
+        try:
+            values[name] = User._meta.get_field(name).clean(values[name], None)
+        except ValidationError as exc:
+            raise ValueError(f"{name}: {' '.join(exc.messages)}")
+    if timezone.is_naive(values["date_joined"]):
+        values["date_joined"] = timezone.make_aware(values["date_joined"])
+    return values
+
+
+def _insert(users):
+    """Insert ``users`` and their profiles in one transaction."""
+    with transaction.atomic(), profile_signal_muted():
+        # bulk_create never sends post_save, so profiles are inserted here
+        User.objects.bulk_create(users)
+        if any(user.pk is None for user in users):
+            # Backends that cannot return ids from a bulk INSERT
+            ids = dict(
+                User.objects.filter(
+                    email__in=[user.email for user in users]
+                ).values_list("email", "id")
+            )
+            for user in users:
+                user.pk = ids[user.email]
+        UserProfile.objects.bulk_create(UserProfile(user=user) for user in users)
+
+
+def _import_batch(rows, offset, result):
+    cleaned = []
+    for index, row in enumerate(rows, start=offset):
+        try:
+            cleaned.append((index, _clean_row(row)))
+        except (TypeError, ValueError) as exc:
+            result["errors"].append({"row": index, "error": str(exc)})
+
+    emails = {values["email"] for _, values in cleaned}
+    usernames = {values["username"] for _, values in cleaned}
+    taken_emails = set(
+        # Deleted accounts keep their email/username until they are purged
+        User.all_objects.filter(email__in=emails).values_list("email", flat=True)
+    )
+    taken_usernames = set(
+        User.all_objects.filter(username__in=usernames).values_list(
+            "username", flat=True
+        )
+    )
+
+    users = []
+    for index, values in cleaned:
+        if values["email"] in taken_emails or values["username"] in taken_usernames:
+            result["skipped"] += 1
+            continue
+        # Also de-duplicate within the input itself
+        taken_emails.add(values["email"])
+        taken_usernames.add(values["username"])
+        users.append((index, User(**values)))
+    if not users:
+        return
+
+    try:
+        _insert([user for _, user in users])
+    except IntegrityError:
+        # Some were taken concurrently since the lookup: insert one at a time
+        for index, user in users:
+            user.pk = None
+            try:
+                _insert([user])
+            except IntegrityError:
+                result["errors"].append(
+                    {"row": index, "error": "email or username is already taken"}
+                )
+            else:
+                result["created"] += 1
+    else:
+        result["created"] += len(users)
+
+
+def import_users(rows, batch_size=DEFAULT_BATCH_SIZE, progress=None):
+    """
+    Import an iterable of dicts with ``email``, ``username``, ``password``
+    (already hashed) and optional ``first_name``, ``last_name``,
+    ``date_joined``. Existing emails/usernames are skipped, invalid rows are
+    reported in ``errors``. ``progress(result)`` is called after each batch.
+    """
+    result = {"created": 0, "skipped": 0, "errors": [], "seconds": 0.0}
+    started = perf_counter()
+    batch = []
+    offset = 0
+
+    def flush():
+        _import_batch(batch, offset, result)
+        nplusone.checkpoint()
+        result["seconds"] = perf_counter() - started
+        result["users_per_second"] = (
+            result["created"] / result["seconds"] if result["seconds"] else 0.0
+        )
+        if progress is not None:
+            progress(result)
+
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= batch_size:
+            flush()
+            offset += len(batch)
+            batch = []
+    if batch or offset == 0:
+        flush()
+    return result
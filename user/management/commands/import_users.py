@@ -0,0 +1,56 @@
+import csv
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from motion.nplusone import detect_n_plus_one
+from user.bulk import DEFAULT_BATCH_SIZE, import_users
+
+
+def read_rows(path):
+    """Stream rows from a .csv file (with header) or a JSON Lines file."""
+    with open(path, newline="") as handle:
+        if path.endswith(".csv"):
+            yield from csv.DictReader(handle)
+        else:
+            for line in handle:
+                if line.strip():
+                    yield json.loads(line)
+
+
+class Command(BaseCommand):
+    help = (
+        "Bulk import users with pre-hashed passwords from a CSV or JSON Lines file "
+        "(columns: email, username, password, first_name, last_name, date_joined)"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("path")
+        parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE)
+
+    @detect_n_plus_one("import_users")
+    def handle(self, *args, **options):
+        def progress(result):
+            self.stdout.write(
+                f"{result['created']} created, {result['skipped']} skipped, "
+                f"{len(result['errors'])} invalid "
+                f"({result['users_per_second']:.0f} users/s)"
+            )
+
+        try:
+            result = import_users(
+                read_rows(options["path"]),
+                batch_size=options["batch_size"],
+                progress=progress,
+            )
+        except OSError as exc:
+            raise CommandError(exc)
+
+        for error in result["errors"][:20]:
+            self.stderr.write(f"row {error['row']}: {error['error']}")
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Imported {result['created']} users in {result['seconds']:.1f}s "
+                f"({result['users_per_second']:.0f} users/s)"
+            )
+        )
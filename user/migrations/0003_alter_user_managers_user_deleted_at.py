@@ -0,0 +1,27 @@
+# Generated by Django 6.0 on 2026-10-19 10:05
+
+import django.contrib.auth.models
+import user.models
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("user", "0002_add_created_field"),
+    ]
+
+    operations = [
+        migrations.AlterModelManagers(
+            name="user",
+            managers=[
+                ("objects", user.models.ActiveUserManager()),
+                ("all_objects", django.contrib.auth.models.UserManager()),
+            ],
+        ),
+        migrations.AddField(
+            model_name="user",
+            name="deleted_at",
+            field=models.DateTimeField(blank=True, db_index=True, null=True),
+        ),
+    ]
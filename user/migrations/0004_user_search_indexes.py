@@ -0,0 +1,51 @@
+# Generated by Django 6.0 on 2026-10-19 19:00
+
+from django.db import migrations, models
+from django.db.models.functions import Lower
+
+# Columns searched by user/search.py
+COLUMNS = ["username", "first_name", "last_name", "email"]
+
+
+def add_search_indexes(apps, schema_editor):
+    """
+    pg_trgm GIN indexes on PostgreSQL (prefix and infix LIKE), B-tree indexes
+    on lower(column) elsewhere (prefix ranges); see user/search.py.
+    """
+    User = apps.get_model("user", "User")
+    if schema_editor.connection.vendor == "postgresql":
+        schema_editor.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+        for column in COLUMNS:
+            schema_editor.execute(
+                f"CREATE INDEX IF NOT EXISTS user_{column}_trgm_idx ON "
+                f"{schema_editor.quote_name(User._meta.db_table)} "
+                f"USING gin (lower({schema_editor.quote_name(column)}) gin_trgm_ops)"
+            )
+        return
+    for column in COLUMNS:
+        schema_editor.add_index(
+            User, models.Index(Lower(column), name=f"user_{column}_lower_idx")
+        )
+
+
+def remove_search_indexes(apps, schema_editor):
+    User = apps.get_model("user", "User")
+    for column in COLUMNS:
+        if schema_editor.connection.vendor == "postgresql":
+            schema_editor.execute(f"DROP INDEX IF EXISTS user_{column}_trgm_idx")
+        else:
+            schema_editor.remove_index(
+                User, models.Index(Lower(column), name=f"user_{column}_lower_idx")
+            )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("user", "0003_alter_user_managers_user_deleted_at"),
+    ]
+
+    operations = [
+        # The indexes differ per database, so they are not part of the model state
+        migrations.RunPython(add_search_indexes, remove_search_indexes),
+    ]
@@ -1,9 +1,16 @@
-from django.contrib.auth.models import AbstractUser
+from django.contrib.auth.models import AbstractUser, UserManager
 from django.db import models
 
 # Create your models here.
 
 
+class ActiveUserManager(UserManager):
+    """Hides accounts that were deleted and are waiting to be purged."""
+
+    def get_queryset(self):
+        return super().get_queryset().filter(deleted_at__isnull=True)
+
+
 class User(AbstractUser):
     # Field used for authentication
     USERNAME_FIELD = "email"
@@ -13,6 +20,11 @@ class User(AbstractUser):
 
     email = models.EmailField(unique=True)
     created = models.DateTimeField(auto_now_add=True)
+    # Set when the account is deleted; rows are purged in the background
+    deleted_at = models.DateTimeField(null=True, blank=True, db_index=True)
+
+    objects = ActiveUserManager()
+    all_objects = UserManager()
 
     def __str__(self):
         return self.email
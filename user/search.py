@@ -0,0 +1,91 @@
+"""
+User autocomplete (``GET /backend/api/users/search/?q=``).
+
+A query matches users whose username, first name, last name or email starts
+with it (case-insensitively), or whose first and last name start with its
+two parts ("jo sm"). On PostgreSQL it also matches usernames and names that
+merely contain it (3+ characters). Matches rank in this order:
+
+1. username prefix
+2. full name
+3. first or last name prefix
+4. email prefix
+5. contained
+
+Ties go to the user with more followers (the stored counter, see
+user_profile/counters.py).
+
+Every match kind is an index scan capped at USER_SEARCH_CANDIDATES rows,
+so a query costs the same however many users there are. The ranking is
+exact while a prefix matches fewer users than that. The indexes depend on
+the database (user/migrations/0004_user_search_indexes.py):
+
+- PostgreSQL: ``pg_trgm`` GIN indexes on ``lower(column)``, which serve both
+  ``LIKE 'q%'`` and ``LIKE '%q%'``. B-tree ranges over text are only
+  prefix-safe in the C collation.
+- Elsewhere (SQLite): B-tree indexes on ``lower(column)``, scanned as the
+  range ``q <= lower(column) < q'``, with q' being q with its last
+  character incremented.
+"""
+
+from django.conf import settings
+from django.db import connection
+from django.db.models.functions import Lower
+
+from user.models import User
+
+USERNAME, FULL_NAME, NAME, EMAIL, CONTAINS = range(5)
+
+
+def _prefix(column, query):
+    if connection.vendor == "postgresql":
+        return {f"{column}__startswith": query}
+    upper = query[:-1] + chr(ord(query[-1]) + 1)
+    return {f"{column}__gte": query, f"{column}__lt": upper}
+
+
+def _matches(query):
+    """``(rank, queryset)`` for each way a user can match ``query``."""
+    users = User.objects.annotate(
+        username_key=Lower("username"),
+        first_name_key=Lower("first_name"),
+        last_name_key=Lower("last_name"),
+        email_key=Lower("email"),
+    )
+    yield USERNAME, users.filter(**_prefix("username_key", query))
+    first, _, last = query.partition(" ")
+    if last.strip():
+        yield (
+            FULL_NAME,
+            users.filter(
+                **_prefix("first_name_key", first),
+                **_prefix("last_name_key", last.strip()),
+            ),
+        )
+    else:
+        yield NAME, users.filter(**_prefix("first_name_key", query))
+        yield NAME, users.filter(**_prefix("last_name_key", query))
+    yield EMAIL, users.filter(**_prefix("email_key", query))
+    if connection.vendor == "postgresql" and len(query) >= 3:
+        for column in ("username_key", "first_name_key", "last_name_key"):
+            yield CONTAINS, users.filter(**{f"{column}__contains": query})
+
+
+def search(query, limit):
+    """Ids of the ``limit`` best matches for ``query``, best first."""
+    query = " ".join(query.lower().split())
+    if len(query) < settings.USER_SEARCH_MIN_LENGTH:
+        return []
+    best = {}
+    for rank, matches in _matches(query):
+        # Kinds come best first: once enough users rank higher, the rest cannot place
+        if len(best) >= limit and max(best.values())[0] < rank:
+            break
+        rows = matches.values_list("id", "profile__followers_count")[
+            : settings.USER_SEARCH_CANDIDATES
+        ]
+        for user_id, followers in rows:
+            key = (rank, -(followers or 0), user_id)
+            if user_id not in best or key < best[user_id]:
+                best[user_id] = key
+    return [key[2] for key in sorted(best.values())[:limit]]
@@ -1,8 +1,11 @@
-from rest_framework.serializers import ModelSerializer, CharField
 from django.contrib.auth.password_validation import validate_password
 from rest_framework import serializers
+from rest_framework.serializers import CharField, ModelSerializer
+from rest_framework.validators import UniqueValidator
 
+from motion import hashing
 from user.models import User
+from user_profile.serializers import UserProfileSerializer
 
 
 class UserSerializer(ModelSerializer):
@@ -10,6 +13,23 @@ class UserSerializer(ModelSerializer):
     Serializer for listing users (read-only operations)
     """
 
+    # Stored on the profile, which user listings already join
+    followers_count = serializers.IntegerField(
+        source="profile.followers_count", read_only=True
+    )
+    following_count = serializers.IntegerField(
+        source="profile.following_count", read_only=True
+    )
+    posts_count = serializers.IntegerField(source="profile.posts_count", read_only=True)
+
+    # ?expand=profile embeds the profile instead of its id (see motion/sparse.py)
+    expandable_fields = {"profile": UserProfileSerializer}
+    sparse_requires = {
+        "followers_count": ["profile__followers_count"],
+        "following_count": ["profile__following_count"],
+        "posts_count": ["profile__posts_count"],
+    }
+
     class Meta:
         model = User
         fields = [
@@ -18,6 +38,9 @@ class UserSerializer(ModelSerializer):
             "email",
             "first_name",
             "last_name",
+            "followers_count",
+            "following_count",
+            "posts_count",
             "profile",
         ]
         read_only_fields = ["id", "created"]
@@ -57,6 +80,14 @@ class UserCreateSerializer(ModelSerializer):
         extra_kwargs = {
             "first_name": {"required": False},
             "last_name": {"required": False},
+            # Deleted accounts keep their email/username until they are purged
+            "email": {"validators": [UniqueValidator(User.all_objects.all())]},
+            "username": {
+                "validators": [
+                    *User._meta.get_field("username").validators,
+                    UniqueValidator(User.all_objects.all()),
+                ]
+            },
         }
 
     def validate(self, attrs):
@@ -77,13 +108,14 @@ class UserCreateSerializer(ModelSerializer):
         # Remove password2 as it's not needed for user creation
         validated_data.pop("password2")
 
-        # Create user with hashed password using create_user method
-        user = User.objects.create_user(
+        # Hash on the bounded hashing pool (503 when it is saturated)
+        user = User(
             username=validated_data["username"],
-            email=validated_data["email"],
-            password=validated_data["password"],
+            email=User.objects.normalize_email(validated_data["email"]),
             first_name=validated_data.get("first_name", ""),
             last_name=validated_data.get("last_name", ""),
         )
+        user.password = hashing.make_password(validated_data["password"])
+        user.save()
 
         return user
@@ -1,12 +1,30 @@
+from contextlib import contextmanager
+from contextvars import ContextVar
+
 from django.conf import settings
 from django.db.models.signals import post_save
 from django.dispatch import receiver
 
 from user_profile.models import UserProfile
 
+_profile_signal_muted = ContextVar("user_profile_signal_muted", default=False)
+
+
+@contextmanager
+def profile_signal_muted():
+    """
+    Skip automatic profile creation for users saved inside this block, for
+    callers that create the profiles themselves (e.g. user.bulk.import_users).
+    """
+    token = _profile_signal_muted.set(True)
+    try:
+        yield
+    finally:
+        _profile_signal_muted.reset(token)
+
 
 @receiver(post_save, sender=settings.AUTH_USER_MODEL)
 def create_user_profile(sender, instance, created, **kwargs):
-    if created:
+    if created and not _profile_signal_muted.get():
         # Create author profile
         UserProfile.objects.create(user=instance)
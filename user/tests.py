@@ -1,3 +1,231 @@
-from django.test import TestCase
+from importlib import import_module
+from unittest import mock, skipIf
 
-# Create your tests here.
+from django.apps import apps
+from django.contrib.auth.hashers import make_password
+from django.db import connection
+from django.db.migrations.executor import MigrationExecutor
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+
+from user import bulk, search
+from user.bulk import import_users
+from user.models import User
+from user_profile.models import UserProfile
+
+search_indexes = import_module("user.migrations.0004_user_search_indexes")
+
+
+class BulkImportTests(TestCase):
+    password = make_password("x")
+
+    def row(self, name, **values):
+        return {
+            "email": f"{name}@example.com",
+            "username": name,
+            "password": self.password,
+            **values,
+        }
+
+    def test_invalid_rows_are_reported_per_row(self):
+        result = import_users(
+            [
+                "not a row",
+                self.row("baddate", date_joined="yesterday"),
+                self.row("longname", first_name="x" * 200),
+                self.row("badname", username="bad name!"),
+                self.row("good", date_joined="2024-01-02T03:04:05"),
+            ]
+        )
+        self.assertEqual(result["created"], 1)
+        self.assertEqual([error["row"] for error in result["errors"]], [0, 1, 2, 3])
+        self.assertTrue(result["errors"][1]["error"].startswith("date_joined:"))
+        self.assertTrue(result["errors"][2]["error"].startswith("first_name:"))
+        self.assertTrue(result["errors"][3]["error"].startswith("username:"))
+        self.assertEqual(User.objects.get(username="good").date_joined.year, 2024)
+
+    def test_concurrently_taken_email_is_reported_per_row(self):
+        User.objects.create_user(
+            username="taken", email="taken@example.com", password="x"
+        )
+        # As if the account was inserted after the batch looked up taken emails
+        with mock.patch.object(
+            bulk.User.all_objects, "filter", return_value=User.objects.none()
+        ):
+            result = import_users([self.row("taken"), self.row("free")])
+        self.assertEqual(result["created"], 1)
+        self.assertEqual(
+            result["errors"],
+            [{"row": 0, "error": "email or username is already taken"}],
+        )
+        self.assertTrue(User.objects.filter(username="free").exists())
+
+
+class SparseFieldsetTests(TestCase):
+    def setUp(self):
+        self.users = [self.make_user(f"user{i}") for i in range(2)]
+        self.client = APIClient()
+        self.client.force_authenticate(self.users[0])
+
+    def make_user(self, name):
+        return User.objects.create_user(
+            username=name, email=f"{name}@example.com", password="x"
+        )
+
+    def list_users(self, query):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(f"/backend/api/users/?{query}")
+        self.assertEqual(response.status_code, 200)
+        return response.json(), len(queries)
+
+    def test_nested_fields_take_a_fixed_number_of_queries(self):
+        paths = {
+            "fields=username": {"username": "user0"},
+            "fields=followers_count": {"followers_count": 0},
+            "fields=profile": {"profile": self.users[0].profile.pk},
+            "fields=profile.posts_count": {"profile": {"posts_count": 0}},
+            "fields=profile.user": {
+                "profile": {
+                    "user": {
+                        "id": self.users[0].pk,
+                        "username": "user0",
+                        "email": "user0@example.com",
+                        "first_name": "",
+                        "last_name": "",
+                    }
+                }
+            },
+            "fields=profile.user.username": {
+                "profile": {"user": {"username": "user0"}}
+            },
+            "fields=id,profile.job,profile.user.email": {
+                "id": self.users[0].pk,
+                "profile": {"job": "", "user": {"email": "user0@example.com"}},
+            },
+            "expand=profile&fields=profile.user.id": {
+                "profile": {"user": {"id": self.users[0].pk}}
+            },
+        }
+        few = {query: self.list_users(query) for query in paths}
+        for i in range(3):
+            self.make_user(f"more{i}")
+        for query, first in paths.items():
+            with self.subTest(query=query):
+                rows, queries = few[query]
+                self.assertEqual(rows[0], first)
+                rows, more_queries = self.list_users(query)
+                self.assertEqual(len(rows), 5)
+                self.assertEqual(queries, more_queries)
+
+
+class UserSearchTests(TestCase):
+    def make_user(self, username, followers=0, **fields):
+        user = User.objects.create_user(
+            username=username,
+            email=fields.pop("email", f"{username}@example.com"),
+            password="x",
+            **fields,
+        )
+        UserProfile.objects.filter(user=user).update(followers_count=followers)
+        return user.pk
+
+    def test_matches_rank_by_kind_then_followers(self):
+        username = self.make_user("Sammy")
+        first_name = self.make_user("bob", followers=5, first_name="Sam")
+        last_name = self.make_user("carl", followers=9, last_name="Samson")
+        email = self.make_user("dan", followers=20, email="sam.d@example.com")
+        contained = self.make_user("busam")
+        self.make_user("eve", first_name="Eve")
+        expected = [username, last_name, first_name, email]
+        if connection.vendor == "postgresql":
+            expected.append(contained)
+        self.assertEqual(search.search("SAM", 10), expected)
+
+    def test_two_part_queries_match_first_and_last_name(self):
+        first_name = self.make_user("jo", followers=9, first_name="Sam")
+        full_name = self.make_user("carl", first_name="Sam", last_name="Smith")
+        self.make_user("bob", first_name="Bob", last_name="Smith")
+        self.assertEqual(search.search("sam  sm", 10), [full_name])
+        self.assertEqual(search.search("sam", 10), [first_name, full_name])
+
+    @skipIf(connection.vendor == "postgresql", "PostgreSQL matches with LIKE")
+    def test_prefix_is_a_range_up_to_the_next_string(self):
+        self.assertEqual(
+            search._prefix("username_key", "az"),
+            {"username_key__gte": "az", "username_key__lt": "a{"},
+        )
+        inside = [self.make_user(name) for name in ("az", "AZB", "az_z", "az~")]
+        for name in ("ay", "a{", "b", "a"):
+            self.make_user(name)
+        self.assertEqual(sorted(search.search("az", 10)), sorted(inside))
+
+    def test_short_queries_match_nothing(self):
+        self.make_user("ab")
+        self.assertEqual(search.search(" a  ", 10), [])
+        with override_settings(USER_SEARCH_MIN_LENGTH=1):
+            self.assertEqual(len(search.search(" a  ", 10)), 1)
+
+    def test_limit_keeps_the_best_matches(self):
+        users = [self.make_user(f"user{i}", followers=i) for i in range(5)]
+        self.assertEqual(search.search("user", 3), users[:1:-1])
+
+    @override_settings(USER_SEARCH_MAX_LIMIT=3)
+    def test_view_clamps_the_limit(self):
+        users = [self.make_user(f"user{i}", followers=i) for i in range(5)]
+        client = APIClient()
+        client.force_authenticate(User.objects.get(pk=users[0]))
+        for limit, count in (("1", 1), ("0", 1), ("100", 3), ("many", 3)):
+            with self.subTest(limit=limit):
+                response = client.get(
+                    "/backend/api/users/search/", {"q": "user", "limit": limit}
+                )
+                self.assertEqual(len(response.data), count)
+
+
+class SearchIndexMigrationTests(TransactionTestCase):
+    def index_names(self):
+        with connection.cursor() as cursor:
+            constraints = connection.introspection.get_constraints(
+                cursor, User._meta.db_table
+            )
+        suffix = "trgm" if connection.vendor == "postgresql" else "lower"
+        return {
+            name
+            for name in constraints
+            if name.startswith("user_") and name.endswith(f"_{suffix}_idx")
+        }
+
+    def migrate(self, target):
+        MigrationExecutor(connection).migrate([("user", target)])
+
+    def test_indexes_are_added_and_removed(self):
+        self.assertEqual(len(self.index_names()), 4)
+        self.addCleanup(self.migrate, "0004_user_search_indexes")
+        self.migrate("0003_alter_user_managers_user_deleted_at")
+        self.assertEqual(self.index_names(), set())
+        self.migrate("0004_user_search_indexes")
+        self.assertEqual(len(self.index_names()), 4)
+
+    def test_postgresql_statements(self):
+        # Checked without a server: the real migration only runs on the test database
+        editor = mock.Mock(spec=["connection", "execute", "quote_name"])
+        editor.connection.vendor = "postgresql"
+        editor.quote_name = connection.ops.quote_name
+        search_indexes.add_search_indexes(apps, editor)
+        search_indexes.remove_search_indexes(apps, editor)
+        statements = [call.args[0] for call in editor.execute.call_args_list]
+        table = connection.ops.quote_name(User._meta.db_table)
+        self.assertEqual(statements[0], "CREATE EXTENSION IF NOT EXISTS pg_trgm")
+        self.assertEqual(
+            statements[1:],
+            [
+                f"CREATE INDEX IF NOT EXISTS user_{column}_trgm_idx ON {table} "
+                f"USING gin (lower({connection.ops.quote_name(column)}) gin_trgm_ops)"
+                for column in search_indexes.COLUMNS
+            ]
+            + [
+                f"DROP INDEX IF EXISTS user_{column}_trgm_idx"
+                for column in search_indexes.COLUMNS
+            ],
+        )
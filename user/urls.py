@@ -1,8 +1,15 @@
 from django.urls import path
 
-from user.views import ListCreateUserView, RetrieveUpdateDestroyUserView
+from user.views import (
+    BulkImportUsersView,
+    ListCreateUserView,
+    RetrieveUpdateDestroyUserView,
+    UserSearchAPIView,
+)
 
 urlpatterns = [
     path("", ListCreateUserView.as_view(), name="user-list-create"),
+    path("bulk-import/", BulkImportUsersView.as_view(), name="user-bulk-import"),
+    path("search/", UserSearchAPIView.as_view(), name="user-search"),
     path("<int:pk>/", RetrieveUpdateDestroyUserView.as_view(), name="user-detail"),
 ]
@@ -1,12 +1,32 @@
-from rest_framework.generics import ListCreateAPIView, RetrieveUpdateDestroyAPIView
+from django.conf import settings
+from rest_framework import status
+from rest_framework.exceptions import ValidationError
+from rest_framework.generics import (
+    ListAPIView,
+    ListCreateAPIView,
+    RetrieveUpdateDestroyAPIView,
+)
 from rest_framework.permissions import AllowAny, IsAuthenticated
+from rest_framework.response import Response
+from rest_framework.views import APIView
 
 from motion.permissions import IsAdmin, IsOwnerOrAdmin
+from motion.sparse import SparseFieldsetsMixin
+from motion.views import BackgroundDestroyMixin
+from user import search
+from user.bulk import import_users
 from user.models import User
-from user.serializers import UserSerializer, UserCreateSerializer
+from user.serializers import UserCreateSerializer, UserSerializer
 
 
-class ListCreateUserView(ListCreateAPIView):
+class UserListingMixin(SparseFieldsetsMixin):
+    """User endpoints: full output by default, ?fields= / ?expand= to trim it."""
+
+    def get_full_queryset(self, queryset):
+        return queryset.select_related("profile")
+
+
+class ListCreateUserView(UserListingMixin, ListCreateAPIView):
     """
     GET: List all users (admins only)
     POST: Create new user (public access for registration)
@@ -27,11 +47,37 @@ class ListCreateUserView(ListCreateAPIView):
         return [IsAuthenticated()]
 
 
-class RetrieveUpdateDestroyUserView(RetrieveUpdateDestroyAPIView):
+class UserSearchAPIView(UserListingMixin, ListAPIView):
+    """
+    GET: Autocomplete users by username, name or email prefix (?q=), best
+    matches first, then by follower count; ?limit= up to USER_SEARCH_MAX_LIMIT
+    (default 10)
+    """
+
+    queryset = User.objects.all()
+    serializer_class = UserSerializer
+    permission_classes = [IsAuthenticated]
+
+    def list(self, request, *args, **kwargs):
+        params = request.query_params
+        try:
+            limit = int(params.get("limit", settings.USER_SEARCH_LIMIT))
+        except ValueError:
+            limit = settings.USER_SEARCH_LIMIT
+        limit = min(max(limit, 1), settings.USER_SEARCH_MAX_LIMIT)
+        user_ids = search.search(params.get("q", ""), limit)
+        users = self.filter_queryset(self.get_queryset()).in_bulk(user_ids)
+        page = [users[user_id] for user_id in user_ids if user_id in users]
+        return Response(self.get_serializer(page, many=True).data)
+
+
+class RetrieveUpdateDestroyUserView(
+    BackgroundDestroyMixin, UserListingMixin, RetrieveUpdateDestroyAPIView
+):
     """
     GET: View user profile (everyone can view)
     PUT/PATCH: Update user profile (owner only)
-    DELETE: Delete user (owner only)
+    DELETE: Delete user (owner only), purged in the background (202)
     """
 
     queryset = User.objects.all()
@@ -42,3 +88,29 @@ class RetrieveUpdateDestroyUserView(RetrieveUpdateDestroyAPIView):
         # if self.request.method == "GET":
         #     return [AllowAny()]
         return [IsOwnerOrAdmin()]
+
+
+class BulkImportUsersView(APIView):
+    """
+    POST: Import users with pre-hashed passwords in bulk (admins only)
+    Body: {"users": [{"email", "username", "password", ...}], "batch_size": 1000}
+    """
+
+    permission_classes = [IsAdmin]
+    max_users = 10000
+
+    def post(self, request):
+        users = request.data.get("users")
+        if not isinstance(users, list):
+            raise ValidationError({"users": "Expected a list of users."})
+        if len(users) > self.max_users:
+            raise ValidationError(
+                {"users": f"At most {self.max_users} users per request."}
+            )
+        try:
+            batch_size = int(request.data.get("batch_size", 1000))
+        except (TypeError, ValueError):
+            raise ValidationError({"batch_size": "Expected an integer."})
+
+        result = import_users(users, batch_size=max(batch_size, 1))
+        return Response(result, status=status.HTTP_201_CREATED)
@@ -0,0 +1,118 @@
+"""
+Stored social counters on UserProfile.
+
+``followers_count``, ``following_count`` and ``posts_count`` are adjusted
+with ``F()`` updates in the same transaction as the change they count (the
+follow toggle, post creation, tombstoning a post or an account), so list
+endpoints render them without any COUNT query. Deleted accounts and posts
+stop counting when they are tombstoned, not when they are purged.
+``unread_notifications`` is kept up by notification/inbox.py.
+
+``reconcile()`` (``manage.py reconcile_counters``) recomputes the counters
+and repairs any that drifted.
+"""
+
+from django.db.models import Count, F, OuterRef, Q, Subquery
+from django.db.models.functions import Coalesce
+
+from follow.models import Follow
+from motion import nplusone
+from notification.models import Notification
+from post.models import Post
+from user_profile.models import UserProfile
+
+COUNTERS = (
+    "followers_count",
+    "following_count",
+    "posts_count",
+    "unread_notifications",
+)
+
+
+def adjust(profiles, delta, *fields):
+    """Add ``delta`` to ``fields`` of every profile in ``profiles`` (one UPDATE)."""
+    profiles.update(**{field: F(field) + delta for field in fields})
+
+
+def record_follow(follower_id, following_id, delta):
+    """Count a follow (``delta=1``) or an unfollow (``delta=-1``)."""
+    adjust(UserProfile.objects.filter(user_id=follower_id), delta, "following_count")
+    adjust(UserProfile.objects.filter(user_id=following_id), delta, "followers_count")
+
+
+def record_user_deleted(user):
+    """Stop counting the follows and posts of a tombstoned account."""
+    UserProfile.objects.filter(user=user).update(posts_count=0)
+    adjust(
+        UserProfile.objects.filter(user__followers__follower=user),
+        -1,
+        "followers_count",
+    )
+    adjust(
+        UserProfile.objects.filter(user__following__following=user),
+        -1,
+        "following_count",
+    )
+
+
+def _count(queryset, group_by):
+    counts = queryset.values(group_by).annotate(count=Count("*")).values("count")
+    return Coalesce(Subquery(counts), 0)
+
+
+def actual_counts():
+    """Expressions for the true value of each counter of a UserProfile row."""
+    return {
+        "followers_count": _count(
+            Follow.objects.filter(
+                following=OuterRef("user_id"), follower__deleted_at__isnull=True
+            ),
+            "following",
+        ),
+        "following_count": _count(
+            Follow.objects.filter(
+                follower=OuterRef("user_id"), following__deleted_at__isnull=True
+            ),
+            "follower",
+        ),
+        # The default manager already hides deleted posts and authors
+        "posts_count": _count(Post.objects.filter(user=OuterRef("pk")), "user"),
+        "unread_notifications": _count(
+            Notification.objects.filter(
+                recipient=OuterRef("user_id"), read_at__isnull=True
+            ),
+            "recipient",
+        ),
+    }
+
+
+def reconcile(batch_size=1000, progress=None):
+    """Repair drifted counters, ``batch_size`` profiles at a time; returns the count."""
+    actual = actual_counts()
+    drifted = Q()
+    for field in COUNTERS:
+        drifted |= ~Q(**{field: F(f"actual_{field}")})
+    repaired = 0
+    last_id = 0
+    while True:
+        ids = list(
+            UserProfile.objects.filter(pk__gt=last_id)
+            .order_by("pk")
+            .values_list("pk", flat=True)[:batch_size]
+        )
+        if not ids:
+            return repaired
+        last_id = ids[-1]
+        wrong = list(
+            UserProfile.objects.filter(pk__in=ids)
+            .annotate(**{f"actual_{field}": actual[field] for field in COUNTERS})
+            .filter(drifted)
+            .values_list("pk", flat=True)
+        )
+        if wrong:
+            # Recomputed in the UPDATE itself, so the row is set from one snapshot
+            UserProfile.objects.filter(pk__in=wrong).update(**actual)
+            repaired += len(wrong)
+        nplusone.checkpoint()
+        if progress:
+            progress(last_id, repaired)
@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+
+from motion.nplusone import detect_n_plus_one
+from user_profile.counters import reconcile
+
+
+class Command(BaseCommand):
+    help = "Recompute the stored counters of profiles (see user_profile/counters.py)"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=1000)
+
+    @detect_n_plus_one("reconcile_counters")
+    def handle(self, *args, **options):
+        def progress(last_id, repaired):
+            self.stdout.write(f"Checked profiles up to #{last_id}, {repaired} repaired")
+
+        repaired = reconcile(options["batch_size"], progress)
+        self.stdout.write(self.style.SUCCESS(f"Repaired {repaired} profile(s)"))
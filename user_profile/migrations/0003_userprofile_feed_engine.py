@@ -0,0 +1,28 @@
+# Generated by Django 6.0 on 2026-10-19 16:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        (
+            "user_profile",
+            "0002_alter_userprofile_about_me_alter_userprofile_avatar_and_more",
+        ),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="userprofile",
+            name="feed_engine",
+            field=models.CharField(
+                choices=[
+                    ("sql", "Single query over followed users' posts"),
+                    ("merge", "Merge of cached per-author recent posts"),
+                ],
+                default="sql",
+                max_length=10,
+            ),
+        ),
+    ]
@@ -0,0 +1,87 @@
+# Generated by Django 6.0 on 2026-10-19 17:00
+
+from django.db import migrations, models, transaction
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+BATCH_SIZE = 5000
+
+
+def _count(queryset, group_by):
+    counts = queryset.values(group_by).annotate(count=Count("*")).values("count")
+    return Coalesce(Subquery(counts), 0)
+
+
+def backfill_counters(apps, schema_editor):
+    """
+    Count existing follows and posts, as user_profile/counters.py does (rows of
+    deleted accounts and deleted posts do not count), one transaction per batch.
+    """
+    UserProfile = apps.get_model("user_profile", "UserProfile")
+    Follow = apps.get_model("follow", "Follow")
+    Post = apps.get_model("post", "Post")
+    counts = {
+        "followers_count": _count(
+            Follow.objects.filter(
+                following=OuterRef("user_id"), follower__deleted_at__isnull=True
+            ),
+            "following",
+        ),
+        "following_count": _count(
+            Follow.objects.filter(
+                follower=OuterRef("user_id"), following__deleted_at__isnull=True
+            ),
+            "follower",
+        ),
+        "posts_count": _count(
+            Post.objects.filter(
+                user=OuterRef("pk"),
+                deleted_at__isnull=True,
+                user__user__deleted_at__isnull=True,
+            ),
+            "user",
+        ),
+    }
+    last_id = 0
+    while True:
+        ids = list(
+            UserProfile.objects.filter(pk__gt=last_id)
+            .order_by("pk")
+            .values_list("pk", flat=True)[:BATCH_SIZE]
+        )
+        if not ids:
+            break
+        with transaction.atomic():
+            UserProfile.objects.filter(pk__in=ids).update(**counts)
+        last_id = ids[-1]
+
+
+class Migration(migrations.Migration):
+    # Batches commit on their own
+    atomic = False
+
+    dependencies = [
+        ("user_profile", "0003_userprofile_feed_engine"),
+        ("follow", "0001_initial"),
+        ("post", "0005_post_post_author_recent_idx"),
+        ("user", "0003_alter_user_managers_user_deleted_at"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="userprofile",
+            name="followers_count",
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name="userprofile",
+            name="following_count",
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name="userprofile",
+            name="posts_count",
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(backfill_counters, migrations.RunPython.noop),
+    ]
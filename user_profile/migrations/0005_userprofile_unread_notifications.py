@@ -0,0 +1,18 @@
+# Generated by Django 6.0 on 2026-10-19 21:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("user_profile", "0004_userprofile_counters"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="userprofile",
+            name="unread_notifications",
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+    ]
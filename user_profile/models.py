@@ -5,6 +5,14 @@ from django.db import models
 
 
 class UserProfile(models.Model):
+    # How the following feed is built, see post/feed.py
+    SQL_FEED = "sql"
+    MERGE_FEED = "merge"
+    FEED_ENGINE_CHOICES = [
+        (SQL_FEED, "Single query over followed users' posts"),
+        (MERGE_FEED, "Merge of cached per-author recent posts"),
+    ]
+
     user = models.OneToOneField(
         to=settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name="profile"
     )
@@ -15,6 +23,15 @@ class UserProfile(models.Model):
     about_me = models.TextField(blank=True, default="")
     user_hashtags = models.JSONField(default=list, blank=True)
     updated = models.DateTimeField(auto_now=True)
+    # Kept up by user_profile/counters.py
+    followers_count = models.PositiveIntegerField(default=0, editable=False)
+    following_count = models.PositiveIntegerField(default=0, editable=False)
+    posts_count = models.PositiveIntegerField(default=0, editable=False)
+    # Unread notifications, kept up by notification/inbox.py
+    unread_notifications = models.PositiveIntegerField(default=0, editable=False)
+    feed_engine = models.CharField(
+        max_length=10, choices=FEED_ENGINE_CHOICES, default=SQL_FEED
+    )
 
     def __str__(self):
         return f"{self.user.email}'s profile"
@@ -1,6 +1,7 @@
 from rest_framework.serializers import ModelSerializer
-from user_profile.models import UserProfile
+
 from user.models import User
+from user_profile.models import UserProfile
 
 
 class NestedUserSerializer(ModelSerializer):
@@ -31,6 +32,9 @@ class UserProfileSerializer(ModelSerializer):
             "phone_number",
             "about_me",
             "user_hashtags",
+            "followers_count",
+            "following_count",
+            "posts_count",
             "updated",
             "user",
         ]
@@ -1,3 +1,54 @@
+from io import StringIO
+
+from django.core.management import call_command
 from django.test import TestCase
+from rest_framework.test import APIClient
+
+from post.models import Post
+from user.models import User
+from user_profile.counters import reconcile
+from user_profile.models import UserProfile
+
+
+def make_user(name):
+    return User.objects.create_user(
+        username=name, email=f"{name}@example.com", password="x"
+    )
+
+
+class CounterTests(TestCase):
+    def setUp(self):
+        self.alice = make_user("alice")
+        self.bob = make_user("bob")
+        Post.objects.create(user=self.alice.profile, content="hello")
+        client = APIClient()
+        client.force_authenticate(self.bob)
+        client.post(f"/backend/api/followers/toggle-follow/{self.alice.pk}/")
+
+    def counts(self, user):
+        return UserProfile.objects.filter(user=user).values_list(
+            "followers_count", "following_count", "posts_count", "unread_notifications"
+        )[0]
+
+    def test_counters_follow_the_changes(self):
+        self.assertEqual(self.counts(self.alice), (1, 0, 1, 1))
+        self.assertEqual(self.counts(self.bob), (0, 1, 0, 0))
+
+    def test_reconcile_repairs_drifted_counters(self):
+        UserProfile.objects.filter(user=self.alice).update(
+            followers_count=7, posts_count=0, unread_notifications=3
+        )
+        batches = []
+        self.assertEqual(
+            reconcile(batch_size=1, progress=lambda *args: batches.append(args)), 1
+        )
+        self.assertEqual(self.counts(self.alice), (1, 0, 1, 1))
+        self.assertEqual(len(batches), 2)
+        self.assertEqual(reconcile(), 0)
 
-# Create your tests here.
+    def test_reconcile_counters_command(self):
+        UserProfile.objects.filter(user=self.bob).update(following_count=0)
+        out = StringIO()
+        call_command("reconcile_counters", stdout=out)
+        self.assertIn("Repaired 1 profile(s)", out.getvalue())
+        self.assertEqual(self.counts(self.bob), (0, 1, 0, 0))